@@ -1,83 +1,252 @@
-import requests
+import argparse
+import asyncio
 import csv
+import hashlib
+import json
+import logging
 import os
+import time
+import aiohttp
+import pandas as pd
 
-def obtener_datos_inegi(id_indicador, area_geografica="00", recientes="false", idioma="es", fuente_datos="BISE", version="2.0", formato="json", token="YOUR_TOKEN_HERE"):
+logger = logging.getLogger(__name__)
+
+URL_API_INEGI = "https://www.inegi.org.mx/app/api/indicadores/desarrolladores/jsonxml/INDICATOR"
+ID_INDICADORES = "6207048662,6207048663,6207048664,6207048665,6207048666,6207048667,6207048668,6207048669,6207048670,6207048671"
+COLUMNAS = ["ESTADO", "INDICADOR", "PERIODO", "VALOR", "UNIDAD", "CLAVE_GEOGRAFICA"]
+
+# Caché local de respuestas, conexiones simultáneas y reintentos
+DIRECTORIO_CACHE = os.path.join("data", "raw", "enigh", "api", "cache")
+TTL_CACHE = 24 * 60 * 60  # segundos
+MAX_CONCURRENCIA = 8
+REINTENTOS = 4
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Sincronización incremental: último periodo visto por (estado, indicador) y tabla columnar
+ARCHIVO_ESTADO_SYNC = os.path.join("data", "raw", "enigh", "api", "sync_state.json")
+ARCHIVO_TABLA = os.path.join("data", "raw", "enigh", "api", "enigh_api.parquet")
+LLAVE_TABLA = ["ESTADO", "INDICADOR", "PERIODO"]
+
+def construir_url(id_indicador, area_geografica="00", recientes=False, idioma="es", fuente_datos="BISE", version="2.0", formato="json", token="YOUR_TOKEN_HERE", url_base=URL_API_INEGI):
     recientes_str = "true" if recientes else "false"
-    url = f"https://www.inegi.org.mx/app/api/indicadores/desarrolladores/jsonxml/INDICATOR/{id_indicador}/{idioma}/{area_geografica}/{recientes_str}/{fuente_datos}/{version}/{token}?type={formato}"
-    
+    return f"{url_base}/{id_indicador}/{idioma}/{area_geografica}/{recientes_str}/{fuente_datos}/{version}/{token}?type={formato}"
+
+def ruta_cache(id_indicador, area_geografica, version, recientes=False, directorio_cache=DIRECTORIO_CACHE):
+    # La llave no incluye el token: la misma consulta comparte caché entre usuarios
+    llave = f"{id_indicador}|{area_geografica}|{version}|{bool(recientes)}"
+    return os.path.join(directorio_cache, hashlib.sha256(llave.encode()).hexdigest() + ".json")
+
+def leer_cache(ruta, ttl=TTL_CACHE):
+    if not os.path.exists(ruta) or time.time() - os.path.getmtime(ruta) > ttl:
+        return None
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.HTTPError as errh:
-        print(f"Error HTTP: {errh}")
-    except requests.exceptions.RequestException as err:
-        print(f"Error en la solicitud: {err}")
-    return None
-
-def obtener_datos_todos_indicadores_por_estado(estado, token):
-    id_indicadores = "6207048662,6207048663,6207048664,6207048665,6207048666,6207048667,6207048668,6207048669,6207048670,6207048671"
-    
-    datos = obtener_datos_inegi(id_indicadores, area_geografica=estado, token=token)
-    
-    if datos is None:
-        print(f"No se pudieron obtener datos para el estado {estado}")
-        return []
-    
-    return datos.get("Series", [])
-
-def guardar_datos_en_csv(datos, archivo_salida):
-    columnas = ["ESTADO", "INDICADOR", "PERIODO", "VALOR", "UNIDAD", "CLAVE_GEOGRAFICA"]
-    
+        with open(ruta, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def escribir_cache(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta_temporal = f"{ruta}.tmp"
+    with open(ruta_temporal, mode='w', encoding='utf-8') as file:
+        json.dump(datos, file)
+    os.replace(ruta_temporal, ruta)
+
+class ClienteINEGI:
+    """Cliente asíncrono del API de indicadores con límite de concurrencia, reintentos y caché."""
+
+    def __init__(self, token, max_concurrencia=MAX_CONCURRENCIA, reintentos=REINTENTOS, url_base=URL_API_INEGI,
+                 directorio_cache=DIRECTORIO_CACHE, ttl=TTL_CACHE, espera_base=1):
+        self.token = token
+        self.reintentos = reintentos
+        self.espera_base = espera_base  # segundos del primer reintento; se duplica en cada intento
+        self.url_base = url_base
+        self.directorio_cache = directorio_cache
+        self.ttl = ttl
+        self.max_concurrencia = max_concurrencia
+        self.semaforo = asyncio.Semaphore(max_concurrencia)
+        self.pausa_hasta = 0.0  # compartida: un 429 detiene a todas las solicitudes
+        self.session = None
+
+    async def __aenter__(self):
+        conector = aiohttp.TCPConnector(limit=self.max_concurrencia)
+        self.session = aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=60))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _esperar_limite(self):
+        espera = self.pausa_hasta - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    def _tiempo_espera(self, response, intento):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        return self.espera_base * 2 ** intento
+
+    async def obtener_datos_inegi(self, id_indicador, area_geografica="00", recientes=False, idioma="es", fuente_datos="BISE", version="2.0", formato="json"):
+        ruta = ruta_cache(id_indicador, area_geografica, version, recientes, self.directorio_cache)
+        datos = leer_cache(ruta, self.ttl)
+        if datos is not None:
+            return datos
+
+        url = construir_url(id_indicador, area_geografica, recientes, idioma, fuente_datos, version, formato, self.token, self.url_base)
+        for intento in range(self.reintentos):
+            async with self.semaforo:
+                await self._esperar_limite()
+                try:
+                    async with self.session.get(url) as response:
+                        if response.status in ESTADOS_REINTENTABLES:
+                            espera = self._tiempo_espera(response, intento)
+                            if response.status == 429:
+                                self.pausa_hasta = max(self.pausa_hasta, time.monotonic() + espera)
+                            logger.warning("Respuesta %s para %s, reintentando en %s s", response.status, area_geografica, espera)
+                        else:
+                            response.raise_for_status()
+                            datos = await response.json(content_type=None)
+                            escribir_cache(ruta, datos)
+                            return datos
+                except aiohttp.ClientResponseError as errh:
+                    logger.error("Error HTTP para %s: %s", area_geografica, errh)
+                    return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    espera = self.espera_base * 2 ** intento
+                    logger.warning("Error en la solicitud para %s: %r, reintentando en %s s", area_geografica, err, espera)
+            if intento < self.reintentos - 1:
+                await asyncio.sleep(espera)
+        logger.error("No se pudieron obtener datos para %s tras %s intentos", area_geografica, self.reintentos)
+        return None
+
+    async def obtener_datos_todos_indicadores_por_estado(self, estado, id_indicadores=ID_INDICADORES, recientes=False):
+        datos = await self.obtener_datos_inegi(id_indicadores, area_geografica=estado, recientes=recientes)
+
+        if datos is None:
+            logger.error("No se pudieron obtener datos para el estado %s", estado)
+            return []
+
+        return datos.get("Series", [])
+
+    async def obtener_datos_estados(self, estados, id_indicadores=ID_INDICADORES, recientes=False):
+        series = await asyncio.gather(*[
+            self.obtener_datos_todos_indicadores_por_estado(estado, id_indicadores, recientes) for estado in estados
+        ])
+        return list(zip(estados, series))
+
+def filas_series(estado, series):
+    for serie in series:
+        indicador = serie.get("INDICADOR")
+        unidad = serie.get("UNIT")
+        area_geografica = serie.get("OBSERVATIONS", [{}])[0].get("COBER_GEO", "N/A")
+
+        for observacion in serie.get("OBSERVATIONS", []):
+            periodo = observacion.get("TIME_PERIOD")
+            valor = observacion.get("OBS_VALUE")
+            yield [estado, indicador, periodo, valor, unidad, area_geografica]
+
+def guardar_datos_en_csv(filas, archivo_salida):
     try:
+        os.makedirs(os.path.dirname(archivo_salida), exist_ok=True)
         with open(archivo_salida, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
-            writer.writerow(columnas)
-            
-            for serie in datos:
-                indicador = serie.get("INDICADOR")
-                unidad = serie.get("UNIT")
-                area_geografica = serie.get("OBSERVATIONS", [{}])[0].get("COBER_GEO", "N/A")
-                
-                for observacion in serie.get("OBSERVATIONS", []):
-                    periodo = observacion.get("TIME_PERIOD")
-                    valor = observacion.get("OBS_VALUE")
-                    writer.writerow([area_geografica, indicador, periodo, valor, unidad, area_geografica])
-        
-        print(f"Datos guardados correctamente en {archivo_salida}")
+            writer.writerow(COLUMNAS)
+            writer.writerows(filas)
+
+        logger.info("Datos guardados correctamente en %s", archivo_salida)
     except Exception as e:
-        print(f"Error al guardar el archivo CSV: {e}")
+        logger.error("Error al guardar el archivo CSV: %s", e)
+
+async def descargar_estados(estados, token, archivo_salida):
+    async with ClienteINEGI(token) as cliente:
+        resultados = await cliente.obtener_datos_estados(estados)
+
+    for estado, series in resultados:
+        if not series:
+            logger.warning("No se recibieron datos para el estado %s", estado)
+
+    guardar_datos_en_csv((fila for estado, series in resultados for fila in filas_series(estado, series)), archivo_salida)
+
+def leer_estado_sync(archivo_estado=ARCHIVO_ESTADO_SYNC):
+    if not os.path.exists(archivo_estado):
+        return {}
+    with open(archivo_estado, encoding='utf-8') as file:
+        return json.load(file)
+
+def guardar_estado_sync(estado_sync, archivo_estado=ARCHIVO_ESTADO_SYNC):
+    os.makedirs(os.path.dirname(archivo_estado), exist_ok=True)
+    escribir_cache(archivo_estado, estado_sync)
+
+def leer_tabla(archivo_tabla=ARCHIVO_TABLA):
+    if not os.path.exists(archivo_tabla):
+        return pd.DataFrame(columns=COLUMNAS)
+    return pd.read_parquet(archivo_tabla)
+
+def filtrar_nuevas(nuevas, estado_sync, tabla):
+    """Observaciones posteriores al último periodo visto, o de ese periodo si INEGI revisó su valor."""
+    vistos = pd.DataFrame([(estado, indicador, periodo) for estado, periodos in estado_sync.items()
+                           for indicador, periodo in periodos.items()],
+                          columns=["ESTADO", "INDICADOR", "VISTO"], dtype=str)
+    nuevas = nuevas.merge(vistos, on=["ESTADO", "INDICADOR"], how='left')
+    nuevas = nuevas[nuevas["VISTO"].isna() | (nuevas["PERIODO"] >= nuevas["VISTO"])].drop(columns="VISTO")
+
+    # Las filas idénticas a las de la tabla no son cambios
+    guardadas = tabla[COLUMNAS].astype(str).drop_duplicates()
+    comparadas = nuevas.astype(str).merge(guardadas, on=COLUMNAS, how='left', indicator=True)
+    return nuevas[(comparadas["_merge"] == "left_only").to_numpy()]
+
+def actualizar_tabla(nuevas, archivo_tabla=ARCHIVO_TABLA, tabla=None):
+    # Upsert por (estado, indicador, periodo): las observaciones nuevas reemplazan a las anteriores
+    tabla = leer_tabla(archivo_tabla) if tabla is None else tabla
+    if not tabla.empty:
+        nuevas = pd.concat([tabla, nuevas], ignore_index=True)
+    tabla = nuevas.drop_duplicates(subset=LLAVE_TABLA, keep='last').sort_values(LLAVE_TABLA).reset_index(drop=True)
+    os.makedirs(os.path.dirname(archivo_tabla), exist_ok=True)
+    tabla.to_parquet(archivo_tabla, index=False)
+    return tabla
+
+async def sincronizar_estados(estados, token, id_indicadores=ID_INDICADORES, archivo_tabla=ARCHIVO_TABLA, archivo_estado=ARCHIVO_ESTADO_SYNC):
+    estado_sync = leer_estado_sync(archivo_estado)
+    indicadores = id_indicadores.split(",")
+
+    # Solo se piden observaciones recientes para los estados con todos sus indicadores ya sincronizados
+    completos = [estado for estado in estados if all(i in estado_sync.get(estado, {}) for i in indicadores)]
+    pendientes = [estado for estado in estados if estado not in completos]
+
+    async with ClienteINEGI(token) as cliente:
+        resultados = await cliente.obtener_datos_estados(completos, id_indicadores, recientes=True)
+        resultados += await cliente.obtener_datos_estados(pendientes, id_indicadores, recientes=False)
+
+    filas = [fila for estado, series in resultados for fila in filas_series(estado, series)]
+    nuevas = pd.DataFrame(filas, columns=COLUMNAS).astype({"ESTADO": str, "INDICADOR": str, "PERIODO": str})
+
+    # Descarta periodos ya vistos y sin cambios antes de tocar la tabla
+    tabla = leer_tabla(archivo_tabla)
+    nuevas = filtrar_nuevas(nuevas, estado_sync, tabla)
+    logger.info("%s observaciones nuevas o revisadas (%s estados incrementales, %s completos)", len(nuevas), len(completos), len(pendientes))
+
+    if not nuevas.empty:
+        actualizar_tabla(nuevas, archivo_tabla, tabla)
+        for (estado, indicador), periodo in nuevas.groupby(["ESTADO", "INDICADOR"])["PERIODO"].max().items():
+            estado_sync.setdefault(estado, {})[indicador] = periodo
+        guardar_estado_sync(estado_sync, archivo_estado)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Descarga de indicadores ENIGH del API de INEGI")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Solo pide periodos nuevos y los agrega a la tabla columnar")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
     # Claves de los estados con dos dígitos
     estados = [f"{i:02d}00" for i in range(1, 33)]  # Genera claves de 01 a 32
     token = "TU TOKEN AQUI"
-    archivo_salida = os.path.join("data", "raw", "enigh", "api", "enigh_api.csv")
-    
-    os.makedirs(os.path.dirname(archivo_salida), exist_ok=True)
-    
-    with open(archivo_salida, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        columnas = ["ESTADO", "INDICADOR", "PERIODO", "VALOR", "UNIDAD", "CLAVE_GEOGRAFICA"]
-        writer.writerow(columnas)
-        
-        for estado in estados:
-            print(f"Obteniendo datos para el estado {estado}...")
-            datos_estado = obtener_datos_todos_indicadores_por_estado(estado, token)
-            
-            if not datos_estado:
-                print(f"No se recibieron datos para el estado {estado}")
-                continue
-            
-            for serie in datos_estado:
-                indicador = serie.get("INDICADOR")
-                unidad = serie.get("UNIT")
-                area_geografica = serie.get("OBSERVATIONS", [{}])[0].get("COBER_GEO", "N/A")
-                
-                for observacion in serie.get("OBSERVATIONS", []):
-                    periodo = observacion.get("TIME_PERIOD")
-                    valor = observacion.get("OBS_VALUE")
-                    writer.writerow([estado, indicador, periodo, valor, unidad, area_geografica])
-    
-    print(f"Datos de todos los estados guardados en '{archivo_salida}'")
+
+    if args.incremental:
+        asyncio.run(sincronizar_estados(estados, token))
+        logger.info("Tabla de indicadores actualizada en '%s'", ARCHIVO_TABLA)
+    else:
+        archivo_salida = os.path.join("data", "raw", "enigh", "api", "enigh_api.csv")
+        asyncio.run(descargar_estados(estados, token, archivo_salida))
+        logger.info("Datos de todos los estados guardados en '%s'", archivo_salida)
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.instrumentation import summarize_stages
+
+# Pipeline scripts timed on the synthetic data, in pipeline order. Their stages cover the hot paths:
+# ENCO monthly merge (clean_enco), census load (clean_censo), ENIGH deciles/Gini (merge_enigh_gini),
+# ENCO response shares (merge_enco_shares), municipal pivot (merge_pivot) and clustering (cluster)
+BENCHMARK_SCRIPTS = [
+    "modules/dataset_modules/data_clean_enco.py",
+    "modules/dataset_modules/data_clean_enigh.py",
+    "modules/dataset_modules/data_clean_censo.py",
+    "modules/dataset_modules/data_merge_enco_enigh.py",
+    "modules/dataset_modules/data_cluster.py"
+]
+
+RESULTS_FOLDER = os.path.join(project_root, "benchmarks", "results")
+DEFAULT_SCALES = [1, 10]
+
+def current_commit():
+    """Short hash of the checked-out commit, marked when the tree has local changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=project_root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_scale(scale, seed, workspace, zips=False):
+    """Generate the synthetic data of one scale in workspace and run the pipeline scripts on it."""
+    subprocess.run([sys.executable, os.path.join(project_root, "benchmarks", "synthetic_data.py"),
+                    workspace, "--scale", str(scale), "--seed", str(seed)] + (["--zip"] if zips else []), check=True)
+
+    run_id = f"benchmark_{scale}x"
+    # A cache inside the workspace, so every benchmark computes and the project cache is left alone
+    env = dict(os.environ, INEQMX_RUN_ID=run_id, MPLBACKEND="Agg",
+               INEQMX_CACHE_DIR=os.path.join(workspace, "data", "interim", "cache"))
+    for script in BENCHMARK_SCRIPTS:
+        print(f">>> [{scale}x] {script}")
+        subprocess.run([sys.executable, os.path.join(project_root, script)], cwd=workspace, env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+
+    with open(os.path.join(workspace, "logs", "runs", run_id, "stages.jsonl")) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return summarize_stages(records)
+
+def load_previous_results(commit):
+    """Latest stored results of a different commit, or None."""
+    if not os.path.isdir(RESULTS_FOLDER):
+        return None
+    previous = []
+    for name in os.listdir(RESULTS_FOLDER):
+        with open(os.path.join(RESULTS_FOLDER, name)) as f:
+            results = json.load(f)
+        if results["commit"] != commit:
+            previous.append(results)
+    return max(previous, key=lambda results: results["date"]) if previous else None
+
+def format_comparison(results, previous):
+    """Wall time and peak memory of every stage and scale, next to the previous commit."""
+    lines = [f"Benchmarks at {results['commit']}" + (f" (compared with {previous['commit']})" if previous else "")]
+    header = f"{'stage':<22}{'scale':>6}{'wall s':>9}{'prev s':>9}{'Δ wall':>8}{'peak MB':>9}{'prev MB':>9}"
+    lines += [header, "-" * len(header)]
+    for scale, stages in results["scales"].items():
+        previous_stages = (previous or {}).get("scales", {}).get(scale, {})
+        for name, stage in stages.items():
+            before = previous_stages.get(name)
+            if before:
+                change = f"{(stage['wall_s'] - before['wall_s']) / before['wall_s'] * 100:+.0f}%" if before['wall_s'] else ""
+                previous_columns = f"{before['wall_s']:>9.2f}{change:>8}", f"{before['peak_rss_mb']:>9.0f}"
+            else:
+                previous_columns = f"{'':>17}", f"{'':>9}"
+            lines.append(f"{name:<22}{scale + 'x':>6}{stage['wall_s']:>9.2f}{previous_columns[0]}"
+                         f"{stage['peak_rss_mb']:>9.0f}{previous_columns[1]}")
+    return "\n".join(lines)
+
+def run_benchmarks(scales=DEFAULT_SCALES, seed=42, keep=False, zips=False):
+    """Run every scale in a temporary workspace and store the results under the current commit."""
+    commit = current_commit() + ("-zip" if zips else "")
+    results = {"commit": commit, "date": datetime.now().isoformat(timespec='seconds'), "seed": seed, "scales": {}}
+    for scale in scales:
+        workspace = tempfile.mkdtemp(prefix=f"ineqmx_benchmark_{scale}x_")
+        try:
+            results["scales"][str(scale)] = run_scale(scale, seed, workspace, zips)
+        finally:
+            if keep:
+                print(f"Workspace kept at {workspace}")
+            else:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    previous = load_previous_results(commit)
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    with open(os.path.join(RESULTS_FOLDER, f"{commit}.json"), 'w') as f:
+        json.dump(results, f, indent=2)
+    print(format_comparison(results, previous))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the pipeline hot paths on synthetic data, fully offline.")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Comma-separated row multipliers, e.g. 1,10,100")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the generated workspaces for inspection")
+    parser.add_argument("--zip", action="store_true", help="Read the raw files from ZIP archives instead of extracted")
+    args = parser.parse_args()
+
+    run_benchmarks([int(scale) for scale in args.scales.split(",")], args.seed, args.keep, args.zip)
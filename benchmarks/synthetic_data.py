@@ -0,0 +1,164 @@
+import os
+import sys
+import shutil
+import zipfile
+import argparse
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+# Rows generated at scale 1; every size grows linearly with the scale
+ENCO_HOGARES_POR_MES = 500
+ENIGH_HOGARES_POR_ANIO = 5000
+CENSO_LOCALIDADES_POR_MUNICIPIO = 50
+
+# Fixed geography, so group counts (states, municipalities) do not change with the scale
+N_ENTIDADES = 32
+N_MUNICIPIOS = 10
+
+# Highest answer code of each ENCO question (the merge expects every code as a column)
+RESPUESTAS_POR_PREGUNTA = {'p1': 6, 'p2': 6, 'p3': 6, 'p4': 6, 'p5': 6, 'p6': 6, 'p7': 4, 'p8': 4, 'p9': 3,
+                           'p10': 4, 'p11': 6, 'p12': 7, 'p13': 6, 'p14': 4, 'p15': 4}
+ENIGH_INGRESOS = ["ingtrab", "trabajo", "negocio", "otros_trab", "rentas", "utilidad", "arrenda", "transfer",
+                  "jubilacion", "becas", "donativos", "remesas", "bene_gob", "transf_hog", "trans_inst",
+                  "estim_alqu", "otros_ing"]
+
+def generar_enco_mes(rng, anio, mes, n_hogares):
+    """Synthetic cs, viv and cb tables of one ENCO month, sharing the household keys."""
+    llaves = pd.DataFrame({
+        'FOL': [f"{anio % 100:02d}{mes:02d}{i:06d}" for i in range(n_hogares)],
+        'ENT': rng.integers(1, N_ENTIDADES + 1, n_hogares),
+        'CON': rng.integers(1, 99999, n_hogares),
+        'V_SEL': rng.integers(1, 6, n_hogares),
+        'N_HOG': 1,
+        'H_MUD': 0
+    })
+
+    viv = llaves.assign(
+        MPIO=rng.integers(1, N_MUNICIPIOS + 1, n_hogares),
+        AGEB=[f"{x:03d}{y}" for x, y in zip(rng.integers(0, 999, n_hogares), rng.integers(0, 10, n_hogares))],
+        FCH_DEF=[f"{dia:02d}/{mes:02d}/{anio}" for dia in rng.integers(1, 29, n_hogares)]
+    )
+
+    # One to three informants per household
+    personas = rng.integers(1, 4, n_hogares)
+    cs = llaves.loc[llaves.index.repeat(personas)].reset_index(drop=True)
+    cs['I_PER'] = np.concatenate([np.arange(1, n + 1) for n in personas])
+    cs['ING'] = rng.integers(1, 8, len(cs)).astype(float)
+
+    cb = llaves.copy()
+    for pregunta, maxima in RESPUESTAS_POR_PREGUNTA.items():
+        cb[pregunta.upper()] = rng.integers(1, maxima + 1, n_hogares)
+    return {'cs': cs, 'viv': viv, 'cb': cb}
+
+def generar_enigh_anio(rng, anio, n_hogares):
+    """Synthetic ENIGH concentradohogar table of one year."""
+    ing_cor = np.round(rng.lognormal(10.5, 0.8, n_hogares), 2)
+    datos = {
+        'folioviv': np.arange(n_hogares) + anio * 10**6,
+        'foliohog': 1,
+        'ubica_geo': rng.integers(1, N_ENTIDADES + 1, n_hogares) * 1000 + rng.integers(1, N_MUNICIPIOS + 1, n_hogares),
+        'ing_cor': ing_cor,
+        'factor': rng.integers(50, 500, n_hogares),
+        'upm': rng.integers(1, 10**5, n_hogares),
+        'est_dis': rng.integers(1, 900, n_hogares),
+        'tam_loc': rng.integers(1, 5, n_hogares),
+        'est_socio': rng.integers(1, 5, n_hogares),
+        'clase_hog': rng.integers(1, 6, n_hogares),
+        'sexo_jefe': rng.integers(1, 3, n_hogares),
+        'edad_jefe': rng.integers(18, 91, n_hogares)
+    }
+    for columna in ENIGH_INGRESOS:
+        datos[columna] = np.round(ing_cor * rng.uniform(0, 0.3, n_hogares), 2)
+    hombres = rng.integers(0, 5, n_hogares)
+    mujeres = rng.integers(1, 5, n_hogares)
+    menores = rng.integers(0, 3, n_hogares)
+    datos.update({'hombres': hombres, 'mujeres': mujeres, 'tot_integ': hombres + mujeres,
+                  'menores': np.minimum(menores, hombres + mujeres), 'mayores': np.zeros(n_hogares, dtype=int)})
+    return pd.DataFrame(datos)
+
+def generar_censo(rng, localidades_por_municipio):
+    """Synthetic ITER table: national, state and municipal totals followed by the localities."""
+    filas = [(0, 0, 0)]
+    for ent in range(1, N_ENTIDADES + 1):
+        filas.append((ent, 0, 0))
+        for mun in range(1, N_MUNICIPIOS + 1):
+            filas.append((ent, mun, 0))
+            filas.extend((ent, mun, loc) for loc in range(1, localidades_por_municipio + 1))
+    censo = pd.DataFrame(filas, columns=['ENTIDAD', 'MUN', 'LOC'])
+    n = len(censo)
+    censo.insert(1, 'NOM_ENT', "Entidad " + censo['ENTIDAD'].astype(str))
+    censo.insert(3, 'NOM_MUN', "Municipio " + censo['MUN'].astype(str))
+    censo.insert(5, 'NOM_LOC', "Localidad " + censo['LOC'].astype(str))
+    censo['LONGITUD'] = rng.uniform(-117, -86, n).round(6).astype(str)
+    censo['LATITUD'] = rng.uniform(14, 32, n).round(6).astype(str)
+    censo['ALTITUD'] = rng.integers(0, 3000, n).astype(str)
+    censo['POBTOT'] = rng.integers(10, 10**6, n)
+    censo['REL_H_M'] = rng.uniform(85, 110, n).round(2).astype(str)
+    return censo
+
+def escribir_csv(df, ruta, **kwargs):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    df.to_csv(ruta, index=False, **kwargs)
+
+def empaquetar_zips(carpeta):
+    """Replace every subfolder of a raw folder by a ZIP archive with the member paths extractall() would write."""
+    for nombre in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre)
+        if not os.path.isdir(ruta):
+            continue
+        with zipfile.ZipFile(ruta + ".zip", 'w', zipfile.ZIP_DEFLATED) as archivo:
+            for raiz, _, archivos in os.walk(ruta):
+                for nombre_archivo in archivos:
+                    completo = os.path.join(raiz, nombre_archivo)
+                    archivo.write(completo, os.path.relpath(completo, carpeta))
+        shutil.rmtree(ruta)
+
+def generar_workspace(output, scale=1, seed=42, zips=False):
+    """Write seeded raw ENCO, ENIGH and census files under output/data, in the layout the cleaners read."""
+    os.makedirs(output, exist_ok=True)
+    os.chdir(output)
+
+    # The cleaners resolve their raw paths relative to the working directory when imported
+    from modules.config import data_paths, years
+    from modules.dataset_modules.data_clean_enco import ruta_esperada
+    from modules.dataset_modules.data_clean_enigh import file_paths_by_year
+
+    rng = np.random.default_rng(seed)
+    for anio, info in years.items():
+        for mes in range(1, 13):
+            # Same months missing as in the real downloads
+            if info.get("exceptions", {}).get(f"{mes:02d}", "") is None:
+                continue
+            for tipo, df in generar_enco_mes(rng, anio, mes, ENCO_HOGARES_POR_MES * scale).items():
+                escribir_csv(df, ruta_esperada(anio, mes, tipo))
+
+    for anio, ruta in file_paths_by_year.items():
+        escribir_csv(generar_enigh_anio(rng, anio, ENIGH_HOGARES_POR_ANIO * scale), ruta)
+
+    ruta_censo = os.path.join(data_paths['censo']['raw'], "iter_00_cpv2020", "conjunto_de_datos",
+                              "conjunto_de_datos_iter_00CSV20.csv")
+    escribir_csv(generar_censo(rng, CENSO_LOCALIDADES_POR_MUNICIPIO * scale), ruta_censo, encoding='latin-1')
+
+    # Same raw folders as a download with RAW_ZIP_MODE = "zip"
+    if zips:
+        for carpeta in [data_paths['enco'][anio]['raw'] for anio in years] + \
+                       [data_paths['enigh'][anio]['raw'] for anio in file_paths_by_year] + [data_paths['censo']['raw']]:
+            empaquetar_zips(carpeta)
+
+    # Output folders the scripts expect to exist (kept in the repository with .gitkeep files)
+    for carpeta in [("processed", "enco"), ("processed", "enigh"), ("metadata",), ("external", "dashboard", "cluster")]:
+        os.makedirs(os.path.join("data", *carpeta), exist_ok=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw ENCO, ENIGH and census data offline.")
+    parser.add_argument("output", help="Workspace directory; data/ is created inside it")
+    parser.add_argument("--scale", type=int, default=1, help="Row multiplier (1, 10, 100, ...)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--zip", action="store_true", help="Keep the raw files inside ZIP archives, as downloaded")
+    args = parser.parse_args()
+
+    generar_workspace(os.path.abspath(args.output), args.scale, args.seed, args.zip)
@@ -0,0 +1,167 @@
+import os
+import sys
+import gc
+import time
+import runpy
+import argparse
+from datetime import datetime
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+# Only the standard library is imported here: pandas, geopandas, scipy, sklearn, matplotlib and
+# ydata_profiling are imported by the stage scripts when a command runs them, so --help and
+# argument errors answer at interpreter start-up speed.
+
+SCRIPTS = {
+    "download": "modules/dataset_modules/data_downloader.py",
+    "enco": "modules/dataset_modules/data_clean_enco.py",
+    "enigh": "modules/dataset_modules/data_clean_enigh.py",
+    "shp": "modules/dataset_modules/data_clean_shp.py",
+    "censo": "modules/dataset_modules/data_clean_censo.py",
+    "merge": "modules/dataset_modules/data_merge_enco_enigh.py",
+    "cluster": "modules/dataset_modules/data_cluster.py",
+    "vis": "modules/scripts/generate_data_vis.py",
+    "maps": "modules/scripts/generate_maps.py",
+    "report": "modules/instrumentation.py"
+}
+
+# How the command line is started: from the repository root, where the stages find data/
+# (it is not installed as a console script)
+PROG = "python -m modules.cli"
+
+# Datasets of the clean command, in the order transform_data runs them
+CLEAN_DATASETS = ["enco", "enigh", "shp", "censo"]
+
+def run_script(script, args=()):
+    """Run a pipeline script in this process, as `python script args` would from the working directory.
+
+    Libraries the script imports stay loaded, so the next chained stage does not pay for them again.
+    A script that exits with status 0 ends its stage, not the chain.
+    """
+    path = os.path.join(project_root, script)
+    saved_argv = sys.argv
+    sys.argv = [path] + list(args)
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise
+    finally:
+        sys.argv = saved_argv
+        # The script's DataFrames go with its namespace before the next stage starts
+        gc.collect()
+
+def _download(parser):
+    parser.add_argument("--refresh-catalog", action="store_true",
+                        help="Discover the ENCO releases again even if the cached catalog is fresh")
+    return lambda args: run_script(SCRIPTS["download"], ["--refresh-catalog"] if args.refresh_catalog else [])
+
+def _clean(parser):
+    parser.add_argument("datasets", nargs="*", metavar="dataset", help=f"Any of {CLEAN_DATASETS} (default: all)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="ENCO: process only the months whose raw files are new or changed")
+    parser.add_argument("--rebuild", action="store_true", help="ENCO: with --incremental, reprocess every month")
+
+    def run(args):
+        for dataset in args.datasets or CLEAN_DATASETS:
+            options = ["--incremental"] * args.incremental + ["--rebuild"] * args.rebuild if dataset == "enco" else []
+            run_script(SCRIPTS[dataset], options)
+    return run
+
+def _merge(parser):
+    return lambda args: run_script(SCRIPTS["merge"])
+
+def _cluster(parser):
+    return lambda args: run_script(SCRIPTS["cluster"])
+
+def _vis(parser):
+    parser.add_argument("reports", nargs="*", help="Reports to generate (default: all)")
+    parser.add_argument("--mode", choices=["minimal", "sampled", "full"], help="Profiling depth (default: sampled)")
+    parser.add_argument("--force", action="store_true", help="Regenerate reports even if their input is unchanged")
+    return lambda args: run_script(SCRIPTS["vis"], args.reports + (["--mode", args.mode] if args.mode else [])
+                                   + ["--force"] * args.force)
+
+def _maps(parser):
+    parser.add_argument("maps", nargs="*", help="Maps to generate, e.g. ent mun (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rewrite the metric files even if they are up to date")
+    return lambda args: run_script(SCRIPTS["maps"], args.maps + ["--force"] * args.force)
+
+def _report(parser):
+    parser.add_argument("run_id", nargs="?", help="Run to report (default: this run, else the latest one)")
+    parser.add_argument("--compare", help="Run to compare with (default: the run before it)")
+    return lambda args: run_script(SCRIPTS["report"], ([args.run_id] if args.run_id else [])
+                                   + (["--compare", args.compare] if args.compare else []))
+
+# Commands in pipeline order: (help, function adding the options and returning the runner)
+COMMANDS = {
+    "download": ("Download the raw ENCO, ENIGH, census and SHP data", _download),
+    "clean": ("Clean the raw data into tidy files (enco, enigh, shp, censo)", _clean),
+    "merge": ("Compute the ENIGH and ENCO results and merge them for the dashboard", _merge),
+    "cluster": ("Cluster the municipalities", _cluster),
+    "vis": ("Generate the data profiling reports", _vis),
+    "maps": ("Generate the interactive Gini maps", _maps),
+    "report": ("Summarize the stage timings and memory of a run", _report)
+}
+
+def split_commands(argv):
+    """Global options and one (command, arguments) pair per command, in the order given."""
+    global_args, commands = [], []
+    for token in argv:
+        if token in COMMANDS:
+            commands.append((token, []))
+        elif commands:
+            commands[-1][1].append(token)
+        else:
+            global_args.append(token)
+    return global_args, commands
+
+def build_parser():
+    commands = "\n".join(f"  {name:<10}{help}" for name, (help, _) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog=PROG, formatter_class=argparse.RawDescriptionHelpFormatter,
+        usage=f"{PROG} [options] command [command options] [command [command options] ...]",
+        description="Run the stages of the inequality pipeline.",
+        epilog=f"commands:\n{commands}\n\n"
+               "Commands can be chained and run in order in one process, sharing the loaded libraries:\n"
+               f"  {PROG} --max-memory 4G download clean merge cluster report\n"
+               f"Use `{PROG} <command> --help` for the options of a command.")
+    parser.add_argument("--max-memory", help="Memory budget of the heavy stages, e.g. 4G")
+    parser.add_argument("--run-id", help="Run id the stages record their logs and measurements under "
+                                         "(default: INEQMX_RUN_ID, else the start time)")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    global_args, commands = split_commands(sys.argv[1:] if argv is None else argv)
+    args = parser.parse_args(global_args)
+    if not commands:
+        parser.error(f"no command given (choose from {', '.join(COMMANDS)})")
+
+    # Every command line is checked before the first stage starts
+    stages = []
+    for name, command_args in commands:
+        help, configure = COMMANDS[name]
+        command_parser = argparse.ArgumentParser(prog=f"{PROG} {name}", description=help)
+        runner = configure(command_parser)
+        stages.append((name, runner, command_parser.parse_args(command_args)))
+        unknown = set(getattr(stages[-1][2], "datasets", [])) - set(CLEAN_DATASETS)
+        if unknown:
+            command_parser.error(f"unknown datasets: {sorted(unknown)}")
+
+    # Every stage records its measurements under the same run id
+    if args.run_id:
+        os.environ["INEQMX_RUN_ID"] = args.run_id
+    os.environ.setdefault("INEQMX_RUN_ID", datetime.now().strftime('%Y%m%d_%H%M%S'))
+    if args.max_memory:
+        os.environ["INEQMX_MAX_MEMORY"] = args.max_memory
+
+    for name, runner, command_args in stages:
+        print(f">>> {name}...")
+        started = time.perf_counter()
+        runner(command_args)
+        print(f">>> {name} finished in {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import os
 BASE_RAW_DATA_PATH = os.path.abspath("data/raw")
 BASE_INTERIM_DATA_PATH = os.path.abspath("data/interim")
 BASE_PROCESSED_DATA_PATH = os.path.abspath("data/processed")
+BASE_EXTERNAL_DATA_PATH = os.path.abspath("data/external")
 
 # Paths for storing raw and interim data, organized by dataset and year
 data_paths = {
@@ -28,10 +29,31 @@ data_paths = {
     "shp": {
         "raw": os.path.join(BASE_RAW_DATA_PATH, "shp"),
         "interim": os.path.join(BASE_INTERIM_DATA_PATH, "shp"),
-        "processed": os.path.join(BASE_PROCESSED_DATA_PATH, "shp")
+        "processed": os.path.join(BASE_PROCESSED_DATA_PATH, "shp"),
+        "web": os.path.join(BASE_PROCESSED_DATA_PATH, "shp", "web")
+    },
+    "dashboard": os.path.join(BASE_EXTERNAL_DATA_PATH, "dashboard"),
+    "geo": {
+        "processed": os.path.join(BASE_PROCESSED_DATA_PATH, "geo")
     }
 }
 
+# Simplification tolerances for the SHP layers, in layer CRS units (meters for MGN 2020)
+SHP_SIMPLIFY_TOLERANCES = {"high": 100, "medium": 500, "low": 2000}
+
+# Maximum number of vertices a web map layer may carry before a coarser level is used
+SHP_WEB_MAX_VERTICES = {"ent": 150000, "mun": 500000}
+
+# Rows per GeoParquet row group for the processed SHP layers (small groups keep state reads selective)
+SHP_PARQUET_ROW_GROUP_SIZE = 64
+
+# Geometries per chunk for the parallel SHP validity check, and whether invalid polygons are repaired
+SHP_VALIDATION_CHUNK_SIZE = 250
+SHP_REPAIR_GEOMETRIES = True
+
+# Also write the processed SHP layers as FlatGeobuf with a packed Hilbert R-tree index
+SHP_WRITE_FLATGEOBUF = False
+
 # Patterns and exceptions for ENCO file naming by year and month
 years = {
     2018: {
@@ -57,6 +79,104 @@ years = {
     }
 }
 
+# Build the state layer by dissolving the municipal layer instead of downloading the ENT archive
+# (off by default: the official ENT layer is downloaded and used)
+SHP_DERIVE_ENT_FROM_MUN = False
+
+# State names as published in the MGN 2020 NOMGEO column, used for the derived state layer
+nombres_entidades = {
+    "01": "Aguascalientes", "02": "Baja California", "03": "Baja California Sur", "04": "Campeche",
+    "05": "Coahuila de Zaragoza", "06": "Colima", "07": "Chiapas", "08": "Chihuahua",
+    "09": "Ciudad de México", "10": "Durango", "11": "Guanajuato", "12": "Guerrero",
+    "13": "Hidalgo", "14": "Jalisco", "15": "México", "16": "Michoacán de Ocampo",
+    "17": "Morelos", "18": "Nayarit", "19": "Nuevo León", "20": "Oaxaca",
+    "21": "Puebla", "22": "Querétaro", "23": "Quintana Roo", "24": "San Luis Potosí",
+    "25": "Sinaloa", "26": "Sonora", "27": "Tabasco", "28": "Tamaulipas",
+    "29": "Tlaxcala", "30": "Veracruz de Ignacio de la Llave", "31": "Yucatán", "32": "Zacatecas"
+}
+
+# State codes and names as used in the ENCO/ENIGH results
+estados = {
+    1: 'AGUASCALIENTES', 2: 'BAJA CALIFORNIA', 3: 'BAJA CALIFORNIA SUR', 4: 'CAMPECHE',
+    5: 'COAHUILA DE ZARAGOZA', 6: 'COLIMA', 7: 'CHIAPAS', 8: 'CHIHUAHUA', 9: 'DISTRITO FEDERAL',
+    10: 'DURANGO', 11: 'GUANAJUATO', 12: 'GUERRERO', 13: 'HIDALGO', 14: 'JALISCO', 15: 'MEXICO',
+    16: 'MICHOACAN DE OCAMPO', 17: 'MORELOS', 18: 'NAYARIT', 19: 'NUEVO LEON', 20: 'OAXACA',
+    21: 'PUEBLA', 22: 'QUERETARO DE ARTEAGA', 23: 'QUINTANA ROO', 24: 'SAN LUIS POTOSI', 25: 'SINALOA',
+    26: 'SONORA', 27: 'TABASCO', 28: 'TAMAULIPAS', 29: 'TLAXCALA', 30: 'VERACRUZ DE IGNACIO DE LA LLAVE',
+    31: 'YUCATAN', 32: 'ZACATECAS', 33: 'ENTIDAD FEDERATIVA NO ESPECIFICADA'
+}
+
+# Inverse mapping from state name to state code
+codigos_estados = {nombre: codigo for codigo, nombre in estados.items()}
+
+# Geographic region of each state, by state name
+region_mapping = {
+    "AGUASCALIENTES": "Centro",
+    "BAJA CALIFORNIA": "Noroeste",
+    "BAJA CALIFORNIA SUR": "Noroeste",
+    "CAMPECHE": "Sureste",
+    "CHIAPAS": "Sureste",
+    "CHIHUAHUA": "Norte",
+    "COAHUILA DE ZARAGOZA": "Norte",
+    "COLIMA": "Centro-Occidente",
+    "DISTRITO FEDERAL": "Centro",
+    "DURANGO": "Norte",
+    "GUANAJUATO": "Centro",
+    "GUERRERO": "Sur",
+    "HIDALGO": "Centro",
+    "JALISCO": "Centro-Occidente",
+    "MEXICO": "Centro",
+    "MICHOACAN DE OCAMPO": "Centro-Occidente",
+    "MORELOS": "Centro",
+    "NAYARIT": "Centro-Occidente",
+    "NUEVO LEON": "Norte",
+    "OAXACA": "Sur",
+    "PUEBLA": "Centro",
+    "QUERETARO DE ARTEAGA": "Centro",
+    "QUINTANA ROO": "Sureste",
+    "SAN LUIS POTOSI": "Centro",
+    "SINALOA": "Noroeste",
+    "SONORA": "Noroeste",
+    "TABASCO": "Sureste",
+    "TAMAULIPAS": "Norte",
+    "TLAXCALA": "Centro",
+    "VERACRUZ DE IGNACIO DE LA LLAVE": "Sureste",
+    "YUCATAN": "Sureste",
+    "ZACATECAS": "Norte"
+}
+
+# Equal-area CRS used to compute the precomputed area columns of the SHP layers
+SHP_AREA_CRS = "EPSG:6933"
+
+# Weighted income quantiles and Atkinson inequality-aversion parameters added to the ENIGH results
+INEQUALITY_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+ATKINSON_EPSILONS = [0.5, 1, 2]
+
+# Bootstrap replicates for the standard errors of the Gini and Theil T (0 disables them), and the
+# process-pool workers they run on for large inputs (None: one per CPU)
+INEQUALITY_BOOTSTRAP_REPLICATES = 0
+INEQUALITY_WORKERS = None
+
+# Disk cache of the memoized pipeline functions (modules/memo.py). It sits in the project's data folder
+# whatever the working directory, so the scripts and the notebooks share it; INEQMX_CACHE_DIR moves it
+MEMO_CACHE_PATH = os.environ.get("INEQMX_CACHE_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "interim", "cache"))
+
+# Least recently used entries are evicted once the cache grows beyond this size
+MEMO_MAX_BYTES = 2 * 2**30
+
+# Stage outputs are written to a staging folder and published as one version per run under this folder
+# (modules/publish.py); the live files are copies of the files of the current version
+PUBLISH_VERSIONS_PATH = os.path.abspath("data/versions")
+
+# Earlier versions of every stage kept for rollback
+PUBLISH_KEEP_VERSIONS = 3
+
+# One JSON manifest per stage with the size, rows, schema and SHA-256 of its inputs and outputs
+# (modules/manifest.py), and the threads hashing the files not already hashed by an earlier manifest
+MANIFEST_PATH = os.path.abspath("data/metadata/manifests")
+MANIFEST_HASH_WORKERS = 4
+
 # Base URLs for datasets
 BASE_URL_ENCO = "https://www.inegi.org.mx/contenidos/programas/enco/datosabiertos/{year}/{filename}.zip"
 BASE_URL_ENIGH = "https://www.inegi.org.mx/contenidos/programas/enigh/nc"
@@ -81,7 +201,36 @@ urls = {
         2022: f"{BASE_URL_ENIGH}/2022/datosabiertos/conjunto_de_datos_enigh_ns_2022_csv.zip"
     },
     "censo": [f"{BASE_URL_CENSO}"],
-    "shp": [f"{BASE_URL_SHP}/2020_1_00_{i}.zip" for i in ["ENT", "MUN"]]
+    "shp": [f"{BASE_URL_SHP}/2020_1_00_{i}.zip" for i in (["MUN"] if SHP_DERIVE_ENT_FROM_MUN else ["ENT", "MUN"])]
+}
+
+# Years probed for published ENCO releases (modules/releases.py); add years here, e.g. range(2018, 2025),
+# to download releases beyond the processed ones
+ENCO_DISCOVERY_YEARS = list(years)
+
+# File names a monthly ENCO release may have, tried in order after the known name in `years`
+# ({month}: 01-12, {yy}: two-digit year, {month_name}: Spanish month name)
+ENCO_RELEASE_CANDIDATES = [
+    "conjunto_de_datos_enco_{year}_{month}_csv",
+    "conjunto_de_datos_enco{month}{yy}_csv",
+    "enco_{month_name}_{year}_csv"
+]
+
+# Concurrent HEAD probes, and how long a discovered catalog is reused before probing again
+ENCO_DISCOVERY_WORKERS = 16
+ENCO_CATALOG_TTL_HOURS = 24
+ENCO_CATALOG_PATH = os.path.join(BASE_RAW_DATA_PATH, "enco", "catalog.json")
+
+# How downloaded archives are stored in the raw folders:
+# "zip" keeps the archive and the cleaners stream the members they need from it (modules/raw_files.py),
+# "members" extracts only the RAW_ZIP_MEMBERS of the dataset and "extract" extracts every member
+RAW_ZIP_MODE = "zip"
+
+# Members the cleaners read, as case-insensitive glob patterns on the member path
+RAW_ZIP_MEMBERS = {
+    "enco": ["*cs_enco*.csv", "*viv_enco*.csv", "*cb_enco*.csv"],
+    "enigh": ["*concentradohogar*.csv"],
+    "censo": ["*conjunto_de_datos/*.csv"]
 }
 
 # Path for logs folder
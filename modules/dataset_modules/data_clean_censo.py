@@ -2,25 +2,26 @@ import os
 import sys
 import pandas as pd
 import logging
-from datetime import datetime
 
 # Add the project root directory to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 sys.path.append(project_root)
 
 # Import configurations
-from modules.config import data_paths, LOGS_FOLDER
-
-# Ensure interim data path and logs directory exist
+from modules.config import data_paths
+from modules.instrumentation import Stage, record_read, record_write
+from modules.logging_config import setup_logging
+from modules.memo import memoize
+from modules.publish import Publication, staged
+from modules.raw_files import list_raw_dir, raw_size, open_raw
+
+# Ensure interim data path exists
 interim_data_path_censo = data_paths["censo"]["interim"]
 processed_data_path_censo = data_paths["censo"]["processed"]
 os.makedirs(interim_data_path_censo, exist_ok=True)
-os.makedirs(LOGS_FOLDER, exist_ok=True)
 
-# Setup logging configuration
-log_filename = os.path.join(LOGS_FOLDER, f"data_censo_transform_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(filename=log_filename, level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
+# Logs go to the run folder once the entry point calls setup_logging
+logger = logging.getLogger(__name__)
 
 # Columns to select
 REQUIRED_COLUMNS = [
@@ -37,48 +38,50 @@ def load_raw_censo(file_path):
    
     try:
         df_censo = pd.DataFrame()
-        logging.info(f"Loading raw CENSO data from {file_path}...")
+        logger.info("Loading raw CENSO data from %s...", file_path)
 
-        # Get all CSV files in the directory
-        csv_files = [f for f in os.listdir(file_path) if f.endswith('.csv')]
+        # Get all CSV files in the directory, extracted or inside the downloaded archive
+        csv_files = [f for f in list_raw_dir(file_path) if f.endswith('.csv')]
 
         if not csv_files:
-            logging.warning(f"No CSV files found in {file_path}")
+            logger.warning("No CSV files found in %s", file_path)
             return None
 
         # Iterate over each CSV file and load it
         for csv_file in csv_files:
             file_path_full = os.path.join(file_path, csv_file)
-            logging.info(f"Loading {csv_file}...")
+            logger.info("Loading %s...", csv_file)
             # Load CSV into DataFrame
             try:
-                df_censo = pd.read_csv(file_path_full, encoding='latin-1', dtype={8: str})
+                with open_raw(file_path_full) as f:
+                    df_censo = pd.read_csv(f, encoding='latin-1', dtype={8: str})
+                record_read(file_path_full, rows=len(df_censo), nbytes=raw_size(file_path_full), schema=df_censo.dtypes)
                 # Fix encoding issues on the first column header
                 df_censo.columns = ['ENTIDAD' if col == 'ï»¿ENTIDAD' else col for col in df_censo.columns]
-                logging.info(f"Loaded {csv_file} successfully, current shape: {df_censo.shape}")
+                logger.info("Loaded %s successfully, current shape: %s", csv_file, df_censo.shape)
             except Exception as e:
-                logging.error(f"Error loading {csv_file}: {e}")
+                logger.error("Error loading %s: %s", csv_file, e)
 
-        logging.info(f"All CENSO files loaded successfully. Final shape: {df_censo.shape}")
+        logger.info("All CENSO files loaded successfully. Final shape: %s", df_censo.shape)
         return df_censo
     except Exception as e:
-        logging.error(f"Error loading data from {file_path}: {e}")
+        logger.error("Error loading data from %s: %s", file_path, e)
         return None
 
 def validate_data(data):
     """Validate the CENSO dataset to ensure it is tidy."""
     try:
-        logging.info("Validating CENSO data...")
+        logger.info("Validating CENSO data...")
 
         # Check if required columns are present
         missing_columns = [col for col in REQUIRED_COLUMNS if col not in data.columns]
         if missing_columns:
-            logging.error(f"Missing columns: {missing_columns}")
+            logger.error("Missing columns: %s", missing_columns)
             return False
 
         # 2. Check for missing values in key columns
         if data[REQUIRED_ALL_COLUMNS].isnull().any().any():
-            logging.warning("Missing values detected in key columns.")
+            logger.warning("Missing values detected in key columns.")
             # Optional: Decide whether to drop or fill missing values
             data = data.dropna(subset=REQUIRED_ALL_COLUMNS) # In this case, drop
 
@@ -112,39 +115,40 @@ def validate_data(data):
 
         # Log detailed information about the validation result
         if not cond_ent:
-            logging.error("Validation failed: 'ENTIDAD' column has invalid values.")
+            logger.error("Validation failed: 'ENTIDAD' column has invalid values.")
         if not cond_mun:
-            logging.error("Validation failed: 'MUN' column has invalid values.")
+            logger.error("Validation failed: 'MUN' column has invalid values.")
         if not cond_loc:
-            logging.error("Validation failed: 'LOC' column has invalid values.")
+            logger.error("Validation failed: 'LOC' column has invalid values.")
         if not cond_pob_tot:
-            logging.error("Validation failed: 'POBTOT' column has invalid values.")
+            logger.error("Validation failed: 'POBTOT' column has invalid values.")
         if not cond_rel_h_m:
-            logging.error("Validation failed: 'REL_H_M' column has invalid values.")
+            logger.error("Validation failed: 'REL_H_M' column has invalid values.")
 
         # Check if all conditions are met
         all_valid = cond_ent and cond_mun and cond_loc and cond_pob_tot and cond_rel_h_m
 
         if all_valid:
-            logging.info("Data validation passed.")
+            logger.info("Data validation passed.")
             return True
         else:
-            logging.error("Data validation failed.")
+            logger.error("Data validation failed.")
             return False
     except Exception as e:
-        logging.error(f"Error during validation: {e}")
+        logger.error("Error during validation: %s", e)
         return False
 
 
+@memoize()
 def transform_censo_data(data):
     """Select necessary columns and create tidy dataset."""
     try:
-        logging.info("Transforming CENSO data...")
+        logger.info("Transforming CENSO data...")
 
         # Check if all required columns exist in the data
         missing_columns = [col for col in REQUIRED_COLUMNS if col not in data.columns]
         if missing_columns:
-            logging.error(f"Missing columns: {missing_columns}")
+            logger.error("Missing columns: %s", missing_columns)
             return None
 
         # Select necessary columns
@@ -167,70 +171,52 @@ def transform_censo_data(data):
         #data_censo['rel_h_m'] = data_censo['rel_h_m'].astype(float)
         tidy_data_censo=data_censo[['cvegeo','pob_tot','rel_h_m']] # desired order 
 
-        logging.info(f"Transformed data shape: {tidy_data_censo.shape}")
+        logger.info("Transformed data shape: %s", tidy_data_censo.shape)
         return tidy_data_censo
     except KeyError as e:
-        logging.error(f"Error transforming data: {e}")
+        logger.error("Error transforming data: %s", e)
         return None
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
         return None
 
 def save_tidy_data_censo(data, output_path):
     """Save the transformed tidy data."""
     try:
         # Add a log to verify the save path
-        logging.info(f"Attempting to save tidy data to {output_path}")
-        
+        logger.info("Attempting to save tidy data to %s", output_path)
+        output_path = staged(output_path)
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         data.to_csv(output_path, index=False)
-        logging.info(f"Saved tidy data to {output_path}")
-    except Exception as e:
-        logging.error(f"Error saving tidy data: {e}")
-
-def create_metadata(output_path, raw_data_path):
-    """Create metadata for the processed data."""
-    try:
-        metadata_file = os.path.abspath(os.path.join("data", "metadata", "censo_transform_metadata.txt"))
-        logging.info(f"Attempting to create metadata file at {metadata_file}")
-        
-        os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
-        with open(metadata_file, 'w') as f:
-            f.write("Metadata for CENSO Data Transformation\n")
-            f.write(f"Source: {raw_data_path}\n")
-            f.write(f"Transformation date: {datetime.now()}\n")
-            f.write(f"Tidy data saved at: {output_path}\n")
-            f.write(f"Selected columns: {', '.join(REQUIRED_COLUMNS)}\n")
-        logging.info(f"Metadata generated at {metadata_file}")
+        record_write(output_path, rows=len(data), schema=data.dtypes)
+        logger.info("Saved tidy data to %s", output_path)
     except Exception as e:
-        logging.error(f"Error creating metadata: {e}")
+        logger.error("Error saving tidy data: %s", e)
 
 if __name__ == "__main__":
-    raw_file_path = os.path.join(data_paths['censo']['raw'], "iter_00_cpv2020",'conjunto_de_datos')
-    output_file_path_ent = os.path.join(processed_data_path_censo, "censo_ent_tidy_data.csv")
-    output_file_path_mun = os.path.join(processed_data_path_censo, "censo_mun_tidy_data.csv")
-    output_file_path = os.path.join(processed_data_path_censo, "censo_tidy_data.csv")
-
-    # Load raw data
-    raw_data = load_raw_censo(raw_file_path)
-
-    if raw_data is not None:
-        # Validate data
-        if validate_data(raw_data):
-            # Transform data
-            tidy_data = transform_censo_data(raw_data)
-            tidy_data_ent= tidy_data[tidy_data['cvegeo'].str.len() == 2].copy()
-            tidy_data_mun= tidy_data[tidy_data['cvegeo'].str.len() == 5].copy()
-            if tidy_data_ent is not None:
-            #     # Save tidy data
-                save_tidy_data_censo(tidy_data_ent, output_file_path_ent)
-            #     # Create metadata
-                create_metadata(output_file_path_ent, raw_file_path)
-
-            if tidy_data_mun is not None:
-            #     # Save tidy data
-                save_tidy_data_censo(tidy_data_mun, output_file_path_mun)
-            #     # Create metadata
-                create_metadata(output_file_path_mun, raw_file_path)
-
-    logging.info("CENSO data transformation process completed.")
+    setup_logging("clean_censo")
+    with Stage("clean_censo"), Publication("clean_censo"):
+        raw_file_path = os.path.join(data_paths['censo']['raw'], "iter_00_cpv2020",'conjunto_de_datos')
+        output_file_path_ent = os.path.join(processed_data_path_censo, "censo_ent_tidy_data.csv")
+        output_file_path_mun = os.path.join(processed_data_path_censo, "censo_mun_tidy_data.csv")
+        output_file_path = os.path.join(processed_data_path_censo, "censo_tidy_data.csv")
+
+        # Load raw data
+        raw_data = load_raw_censo(raw_file_path)
+
+        if raw_data is not None:
+            # Validate data
+            if validate_data(raw_data):
+                # Transform data
+                tidy_data = transform_censo_data(raw_data)
+                tidy_data_ent= tidy_data[tidy_data['cvegeo'].str.len() == 2].copy()
+                tidy_data_mun= tidy_data[tidy_data['cvegeo'].str.len() == 5].copy()
+                if tidy_data_ent is not None:
+                #     # Save tidy data
+                    save_tidy_data_censo(tidy_data_ent, output_file_path_ent)
+
+                if tidy_data_mun is not None:
+                #     # Save tidy data
+                    save_tidy_data_censo(tidy_data_mun, output_file_path_mun)
+
+        logger.info("CENSO data transformation process completed.")
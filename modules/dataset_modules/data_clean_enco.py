@@ -1,19 +1,28 @@
 import os
 import sys
+import argparse
+import tempfile
+import pickle
 import pandas as pd
 import numpy as np
-from datetime import datetime
 import logging
 
 # Setup paths and logging
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 sys.path.append(project_root)
-from modules.config import data_paths, years, LOGS_FOLDER, BASE_PROCESSED_DATA_PATH
+from modules.config import data_paths, years, BASE_INTERIM_DATA_PATH, BASE_PROCESSED_DATA_PATH
+from modules.instrumentation import Stage, record_read, record_write, memory_budget, set_memory_budget
+from modules.logging_config import setup_logging, lazy
+from modules.raw_files import raw_exists, raw_size, open_raw, raw_signature, raw_sha256
+from modules.publish import Publication, staged, on_commit
 
 processed_enco_path = os.path.join(BASE_PROCESSED_DATA_PATH, "enco")
-os.makedirs(LOGS_FOLDER, exist_ok=True)
-log_filename = os.path.join(LOGS_FOLDER, f"data_enco_transform_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(filename=log_filename, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
+
+# Incremental mode: merged months are kept as partitions, with the fingerprint of the raw files they came from
+estado_particiones_path = os.path.join(BASE_INTERIM_DATA_PATH, "enco", "particiones.pkl")
+# Bump when the monthly processing changes, so the next incremental run rebuilds every partition
+VERSION_PARTICIONES = 1
+logger = logging.getLogger(__name__)
 
 # Define column mappings
 columnas_comunes = ['fol', 'ent', 'con', 'v_sel', 'n_hog', 'h_mud']
@@ -26,7 +35,8 @@ for year in years:
     os.makedirs(os.path.join(data_paths["enco"][year]["interim"], str(year)), exist_ok=True)
 
 # Function to construct file paths dynamically
-def construir_ruta(anio, mes, tipo):
+def ruta_esperada(anio, mes, tipo):
+    """Path where the raw ENCO file of a year, month and type is expected (it may not exist)."""
     base_folder = data_paths['enco'][anio]['raw']
     mes_str = f'{mes:02d}'
     if anio == 2018:
@@ -43,11 +53,14 @@ def construir_ruta(anio, mes, tipo):
         folder_path = os.path.join(base_folder, f"conjunto_de_datos_{tipo}_enco_{anio}_{mes_str}", "conjunto_de_datos")
         file_name = f'conjunto_de_datos_{tipo}_enco_{anio}_{mes_str}.csv'
 
-    file_path = os.path.join(folder_path, file_name)
-    if not os.path.exists(file_path):
+    return os.path.join(folder_path, file_name)
+
+def construir_ruta(anio, mes, tipo):
+    file_path = ruta_esperada(anio, mes, tipo)
+    if not raw_exists(file_path):
         file_path = file_path.replace('.csv', '.CSV')
-        if not os.path.exists(file_path):
-            logging.warning(f"File not found for year {anio}, month {mes}, type {tipo}. Tried path: {file_path}")
+        if not raw_exists(file_path):
+            logger.warning("File not found for year %s, month %s, type %s. Tried path: %s", anio, mes, tipo, file_path)
             return None
     return file_path
 
@@ -55,7 +68,10 @@ def construir_ruta(anio, mes, tipo):
 def cargar_datos(anio, mes, tipo, columnas_relevantes):
     file_path = construir_ruta(anio, mes, tipo)
     if file_path:
-        df = pd.read_csv(file_path)
+        # Streamed from the downloaded archive when the file was not extracted
+        with open_raw(file_path) as f:
+            df = pd.read_csv(f)
+        record_read(file_path, rows=len(df), nbytes=raw_size(file_path), schema=df.dtypes)
         df.columns = df.columns.str.lower()
         return df.loc[:, [col for col in columnas_relevantes if col in df.columns]]
     return pd.DataFrame()
@@ -63,61 +79,440 @@ def cargar_datos(anio, mes, tipo, columnas_relevantes):
 # Validate and clean data
 def validar_datos(df):
     if df.isnull().values.any():
-        logging.warning("Null values detected in dataset.")
+        logger.warning("Null values detected in dataset.")
     for columna, tipo in {'fol': str, 'ent': int, 'con': int, 'v_sel': int, 'n_hog': int, 'h_mud': int, 'ageb': str, 'fch_def': str, 'i_per': float, 'ing': float}.items():
         if columna in df and not df[columna].map(lambda x: isinstance(x, tipo)).all():
-            logging.warning(f"Column {columna} has values that don't match type {tipo}.")
+            logger.warning("Column %s has values that don't match type %s.", columna, tipo)
     if 'ing' in df and (df['ing'] < 0).any():
-        logging.warning("Negative values detected in 'ing'.")
+        logger.warning("Negative values detected in 'ing'.")
     if 'fch_def' in df.columns:
         try:
             pd.to_datetime(df['fch_def'], format='%d-%m-%Y')
         except ValueError:
-            logging.warning("Incorrect date format detected in 'fch_def' column.")    
+            logger.warning("Incorrect date format detected in 'fch_def' column.")    
     return df
 
 # Data quality analysis
-def analizar_calidad_datos(df):
+def porcentaje_faltantes(df):
     missing_percent = df.isnull().mean() * 100
-    logging.info("Percentage of missing values per column:")
-    logging.info(missing_percent[missing_percent > 0])
+    return missing_percent[missing_percent > 0]
+
+def analizar_calidad_datos(df):
+    # Per-column dump, only computed when the run logs at DEBUG level
+    logger.debug("Percentage of missing values per column:\n%s", lazy(porcentaje_faltantes, df))
+    return df
+
+# Pack the six household key columns of the tables of a month into one int64 key per row.
+# Narrow integer columns are packed as offsets from their minimum; the others (fol strings, columns
+# with missing values) are factorized over the three tables together, so equal keys get equal codes.
+# Returns None if the packed key does not fit in 63 bits.
+def empaquetar_llaves(tablas):
+    llaves = {tipo: np.zeros(len(df), dtype=np.int64) for tipo, df in tablas.items()}
+    bits_totales = 0
+    for columna in columnas_comunes:
+        valores = [df[columna] for df in tablas.values()]
+        enteros = all(v.dtype.kind in 'iu' for v in valores)
+        minimo = min(v.min() for v in valores) if enteros else 0
+        maximo = max(v.max() for v in valores) if enteros else 0
+        if enteros and maximo - minimo < sum(map(len, valores)):
+            bits = max(1, int(maximo - minimo).bit_length())
+            codigos = [v.to_numpy(np.int64) - minimo for v in valores]
+        else:
+            # Missing values get a code of their own: pd.merge also matches NaN keys with each other
+            todos, unicos = pd.factorize(pd.concat(valores, ignore_index=True), use_na_sentinel=False)
+            bits = max(1, (len(unicos) - 1).bit_length())
+            codigos = np.split(todos, np.cumsum([len(v) for v in valores])[:-1])
+        bits_totales += bits
+        if bits_totales > 63:
+            return None
+        for tipo, codigo in zip(tablas, codigos):
+            llaves[tipo] = (llaves[tipo] << bits) | codigo
+    return llaves
+
+# Households repeated in viv or cb multiply the cs rows of the merge: report them before it happens.
+# Returns whether both tables have one row per household.
+def revisar_duplicados(anio, mes, llaves):
+    if pd.Index(llaves['viv']).is_unique and pd.Index(llaves['cb']).is_unique:
+        return True
+    hogares = pd.Series(llaves['cs'])
+    filas = pd.Series(1, index=hogares.index)
+    esperadas = pd.Series(True, index=hogares.index)
+    for tipo in ['viv', 'cb']:
+        conteo = pd.Series(llaves[tipo]).value_counts()
+        repetidos = conteo[conteo > 1]
+        if not repetidos.empty:
+            logger.warning("ENCO %s-%02d: %s households repeated in %s (%s extra rows)", anio, mes,
+                           len(repetidos), tipo, int(repetidos.sum() - len(repetidos)))
+        por_fila = hogares.map(conteo).fillna(0).astype(np.int64)
+        filas *= por_fila
+        esperadas &= por_fila > 0
+    if filas.sum() > esperadas.sum():
+        logger.warning("ENCO %s-%02d: many-to-many merge gives %s rows instead of %s", anio, mes,
+                       int(filas.sum()), int(esperadas.sum()))
+    return False
+
+# Merge the cs, viv and cb tables of one month
+def combinar_mes(anio, mes):
+    cs_df = cargar_datos(anio, mes, 'cs', cs_cols)
+    viv_df = cargar_datos(anio, mes, 'viv', viv_cols)
+    cb_df = cargar_datos(anio, mes, 'cb', cb_cols)
+    if cs_df.empty or viv_df.empty or cb_df.empty:
+        return None
+    llaves = empaquetar_llaves({'cs': cs_df, 'viv': viv_df, 'cb': cb_df})
+    if llaves is None:
+        logger.warning("ENCO %s-%02d: household key does not fit in 64 bits; merging on the key columns", anio, mes)
+        merged_df = pd.merge(pd.merge(cs_df, viv_df, on=columnas_comunes, how='inner'), cb_df, on=columnas_comunes, how='inner')
+        return validar_datos(merged_df)
+
+    # The key columns are kept from cs only
+    viv_df = viv_df.drop(columns=columnas_comunes)
+    cb_df = cb_df.drop(columns=columnas_comunes)
+    if revisar_duplicados(anio, mes, llaves):
+        # One row per household in viv and cb: hash lookup of every cs row in both tables
+        pos_viv = pd.Index(llaves['viv']).get_indexer(llaves['cs'])
+        pos_cb = pd.Index(llaves['cb']).get_indexer(llaves['cs'])
+        encontrados = (pos_viv >= 0) & (pos_cb >= 0)
+        merged_df = pd.concat([cs_df[encontrados].reset_index(drop=True),
+                               viv_df.take(pos_viv[encontrados]).reset_index(drop=True),
+                               cb_df.take(pos_cb[encontrados]).reset_index(drop=True)], axis=1)
+    else:
+        # Repeated households: a regular merge on the packed key keeps the rows the key columns would give
+        merged_df = (cs_df.assign(hogar=llaves['cs'])
+                     .merge(viv_df.assign(hogar=llaves['viv']), on='hogar', how='inner')
+                     .merge(cb_df.assign(hogar=llaves['cb']), on='hogar', how='inner')
+                     .drop(columns='hogar'))
+    return validar_datos(merged_df)
+
+# Normalize the interview date and derive the survey year from it
+def agregar_fechas(df):
+    df['fch_def'] = pd.to_datetime(df['fch_def'], format='mixed', errors='coerce').dt.strftime('%d/%m/%Y')
+    df['year'] = pd.to_datetime(df['fch_def'], errors='coerce', format='mixed').dt.year
     return df
 
+def agrupar_datos(df):
+    return df.groupby(['ent', 'mpio', 'year']).sum(numeric_only=True).reset_index()
+
 # Process and filter data across all months and types
 def procesar_datos():
+    if memory_budget():
+        return procesar_datos_por_partes()
+
     df_all_years = pd.DataFrame()
     
     for anio in years:
         df_final = pd.DataFrame()
-        cs_datos = [cargar_datos(anio, mes, 'cs', cs_cols) for mes in range(1, 13)]
-        viv_datos = [cargar_datos(anio, mes, 'viv', viv_cols) for mes in range(1, 13)]
-        cb_datos = [cargar_datos(anio, mes, 'cb', cb_cols) for mes in range(1, 13)]
-
-        for cs_df, viv_df, cb_df in zip(cs_datos, viv_datos, cb_datos):
-            if not cs_df.empty and not viv_df.empty and not cb_df.empty:
-                merged_df = pd.merge(pd.merge(cs_df, viv_df, on=columnas_comunes, how='inner'), cb_df, on=columnas_comunes, how='inner')
-                merged_df = validar_datos(merged_df)
+        for mes in range(1, 13):
+            merged_df = combinar_mes(anio, mes)
+            if merged_df is not None:
                 df_final = pd.concat([df_final, merged_df], ignore_index=True)
         
         interim_output_path = os.path.join(data_paths["enco"][anio]["interim"], f"enco_interim_{anio}.csv")
         df_final = analizar_calidad_datos(df_final)
-        df_final.to_csv(interim_output_path, index=False)
-        logging.info(f"Processed data for {anio} saved at {interim_output_path}")
+        df_final.to_csv(staged(interim_output_path), index=False)
+        record_write(staged(interim_output_path), rows=len(df_final), schema=df_final.dtypes)
+        logger.info("Processed data for %s saved at %s", anio, interim_output_path)
 
         df_all_years = pd.concat([df_all_years, df_final], ignore_index=True)
 
-    df_all_years['fch_def'] = pd.to_datetime(df_all_years['fch_def'], format='mixed', errors='coerce').dt.strftime('%d/%m/%Y')
-    df_all_years['year'] = pd.to_datetime(df_all_years['fch_def'], errors='coerce', format='mixed').dt.year
+    df_all_years = agregar_fechas(df_all_years)
 
     processed_output_path = os.path.join(processed_enco_path, "enco_processed_tidy.csv")
-    df_all_years.to_csv(processed_output_path, index=False)
-    logging.info(f"Combined processed data for all years saved at {processed_output_path}")
+    df_all_years.to_csv(staged(processed_output_path), index=False)
+    record_write(staged(processed_output_path), rows=len(df_all_years), schema=df_all_years.dtypes)
+    logger.info("Combined processed data for all years saved at %s", processed_output_path)
+
+    df_grouped = agrupar_datos(df_all_years)
+    grouped_output_path = os.path.join(processed_enco_path, "enco_grouped.csv")
+    df_grouped.to_csv(staged(grouped_output_path), index=False)
+    record_write(staged(grouped_output_path), rows=len(df_grouped), schema=df_grouped.dtypes)
+    logger.info("Grouped data by state and year saved at %s", grouped_output_path)
+
+# One row with the dtype of every column, null only where the whole column is null.
+# Concatenating these rows gives the dtypes pd.concat would give to the full parts.
+def muestra_tipos(df):
+    filas = {col: df[col].first_valid_index() for col in df.columns}
+    return pd.DataFrame({
+        col: df[col].loc[[df.index[0] if fila is None else fila]].reset_index(drop=True)
+        for col, fila in filas.items()
+    })
+
+def esquema(muestras):
+    return pd.concat(muestras, ignore_index=True).dtypes
+
+def aplicar_esquema(df, tipos):
+    return df.reindex(columns=tipos.index).astype(tipos.to_dict())
+
+def escribir_partes(rutas, output_path, esquemas):
+    """Append spilled parts to a CSV file, cast through the dtypes the in-memory concat would have used."""
+    output_path = staged(output_path)
+    filas = 0
+    for i, ruta in enumerate(rutas):
+        df = pd.read_pickle(ruta)
+        for tipos in esquemas:
+            df = aplicar_esquema(df, tipos)
+        df.to_csv(output_path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+        filas += len(df)
+    if not rutas:
+        pd.DataFrame().to_csv(output_path, index=False)
+    record_write(output_path, rows=filas)
+    return filas
+
+def procesar_datos_por_partes():
+    """Produce the same files as procesar_datos holding one month in memory at a time.
+
+    Merged months are spilled to disk, dtypes are resolved from one sample row per month
+    and the grouped table is built state by state, so the outputs match the in-memory mode.
+    """
+    os.makedirs(BASE_INTERIM_DATA_PATH, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="enco_spill_", dir=BASE_INTERIM_DATA_PATH) as spill:
+        partes = []  # (spill file, dtypes of its year) of every month, in order
+        muestras_anios = []
+        for anio in years:
+            rutas_anio, muestras = [], []
+            for mes in range(1, 13):
+                merged_df = combinar_mes(anio, mes)
+                if merged_df is None or merged_df.empty:
+                    continue
+                analizar_calidad_datos(merged_df)
+                ruta = os.path.join(spill, f"{anio}_{mes:02d}.pkl")
+                merged_df.to_pickle(ruta)
+                rutas_anio.append(ruta)
+                muestras.append(muestra_tipos(merged_df))
+                del merged_df
+
+            interim_output_path = os.path.join(data_paths["enco"][anio]["interim"], f"enco_interim_{anio}.csv")
+            tipos_anio = esquema(muestras) if muestras else None
+            escribir_partes(rutas_anio, interim_output_path, [tipos_anio] if muestras else [])
+            logger.info("Processed data for %s saved at %s", anio, interim_output_path)
+            partes += [(ruta, tipos_anio) for ruta in rutas_anio]
+            if muestras:
+                muestras_anios.append(muestra_tipos(pd.concat(muestras, ignore_index=True)))
+
+        # Dates are derived after the cast to the dtypes of the concatenation of every year
+        tipos_total = esquema(muestras_anios) if muestras_anios else None
+        muestras = []
+        for ruta, tipos_anio in partes:
+            df = agregar_fechas(aplicar_esquema(aplicar_esquema(pd.read_pickle(ruta), tipos_anio), tipos_total))
+            df.to_pickle(ruta)
+            muestras.append(muestra_tipos(df))
 
-    df_grouped = df_all_years.groupby(['ent', 'mpio', 'year']).sum(numeric_only=True).reset_index()
+        processed_output_path = os.path.join(processed_enco_path, "enco_processed_tidy.csv")
+        tipos_final = [esquema(muestras)] if muestras else []
+        filas = escribir_partes([ruta for ruta, _ in partes], processed_output_path, tipos_final)
+        logger.info("Combined processed data for all years saved at %s (%s rows)", processed_output_path, filas)
+
+        # Spill every part again by state, so each group of the final sum sees its rows in the same order
+        partes_ent = {}
+        for i, (ruta, _) in enumerate(partes):
+            df = aplicar_esquema(pd.read_pickle(ruta), tipos_final[0])
+            for ent, parte in df.groupby('ent', sort=False):
+                ruta_ent = os.path.join(spill, f"ent_{ent}_{i:04d}.pkl")
+                parte.to_pickle(ruta_ent)
+                partes_ent.setdefault(ent, []).append(ruta_ent)
+
+        grupos = [agrupar_datos(pd.concat([pd.read_pickle(ruta) for ruta in partes_ent[ent]], ignore_index=True))
+                  for ent in sorted(partes_ent)]
+        df_grouped = pd.concat(grupos, ignore_index=True)
+        grouped_output_path = os.path.join(processed_enco_path, "enco_grouped.csv")
+        df_grouped.to_csv(staged(grouped_output_path), index=False)
+        record_write(staged(grouped_output_path), rows=len(df_grouped), schema=df_grouped.dtypes)
+        logger.info("Grouped data by state and year saved at %s", grouped_output_path)
+
+def ruta_particion(anio, mes):
+    return os.path.join(data_paths["enco"][anio]["interim"], "particiones", f"{mes:02d}.pkl")
+
+def huella_mes(anio, mes, anterior=None):
+    """Fingerprint of the cs, viv and cb raw files of a month, or None if one of them is missing.
+
+    The SHA-256 of the files is only recomputed when their size or modification time changed.
+    """
+    firmas = []
+    for tipo in ['cs', 'viv', 'cb']:
+        file_path = construir_ruta(anio, mes, tipo)
+        if file_path is None:
+            return None
+        firmas.append(raw_signature(file_path))
+    if anterior and anterior["firmas"] == firmas:
+        return anterior
+    hashes = [raw_sha256(construir_ruta(anio, mes, tipo)) for tipo in ['cs', 'viv', 'cb']]
+    return {"firmas": firmas, "sha256": hashes}
+
+def cargar_estado(reconstruir=False):
+    """State of the incremental mode; empty when missing, forced, or written by another version."""
+    vacio = {"version": VERSION_PARTICIONES, "pandas": pd.__version__, "particiones": {},
+             "tipos_final": None, "agregado": None, "salida": None, "agrupada": None}
+    if reconstruir or not os.path.exists(estado_particiones_path):
+        return vacio
+    try:
+        estado = pd.read_pickle(estado_particiones_path)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+        logger.warning("Unreadable partition state %s (%s); rebuilding every month", estado_particiones_path, e)
+        return vacio
+    if estado.get("version") != VERSION_PARTICIONES or estado.get("pandas") != pd.__version__:
+        logger.info("Partition state written by another version; rebuilding every month")
+        return vacio
+    return estado
+
+def guardar_estado(estado):
+    temporary_path = f"{estado_particiones_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as f:
+        pickle.dump(estado, f)
+    os.replace(temporary_path, estado_particiones_path)
+
+def firma_salida(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def leer_particion(clave, tipos_anio, tipos_total, tipos_final=None):
+    """Stored month cast like the in-memory concatenation, with the derived dates."""
+    df = pd.read_pickle(ruta_particion(*clave))
+    df = agregar_fechas(aplicar_esquema(aplicar_esquema(df, tipos_anio), tipos_total))
+    return df if tipos_final is None else aplicar_esquema(df, tipos_final)
+
+def aporte_particion(df):
+    """Contribution of a month to enco_grouped: its group sums plus the row count of every group."""
+    return df.assign(_filas=1).groupby(['ent', 'mpio', 'year']).sum(numeric_only=True)
+
+def combinar_aportes(agregado, sumar, restar):
+    """Running enco_grouped after removing the old contributions of changed months and adding the new ones."""
+    tipos = (sumar[0] if sumar else agregado).dtypes
+    for aporte in sumar:
+        agregado = aporte if agregado is None else agregado.add(aporte, fill_value=0)
+    for aporte in restar:
+        agregado = agregado.sub(aporte, fill_value=0)
+    # Groups left without rows disappear, as they would from a groupby over the full table
+    agregado = agregado[agregado['_filas'] > 0]
+    return agregado.astype(tipos.to_dict()).sort_index()
+
+def procesar_incremental(reconstruir=False):
+    """Produce the outputs of procesar_datos processing only the months whose raw files are new or changed.
+
+    Unchanged months are read from their partitions instead of the raw files, enco_processed_tidy.csv
+    is appended to when only later months were added, and enco_grouped.csv is updated by subtracting
+    the previous contribution of every changed month and adding the new one. Months whose raw files
+    were removed (e.g. by the clean_data task) keep their partition.
+    """
+    estado = cargar_estado(reconstruir)
+    particiones = estado["particiones"]
+    cambiadas, previas = [], []
+    for anio in years:
+        for mes in range(1, 13):
+            clave = (anio, mes)
+            anterior = particiones.get(clave)
+            huella = huella_mes(anio, mes, anterior and anterior["huella"])
+            if huella is None:
+                continue
+            if anterior and anterior["huella"]["sha256"] == huella["sha256"] and os.path.exists(ruta_particion(anio, mes)):
+                anterior["huella"] = huella
+                continue
+            merged_df = combinar_mes(anio, mes)
+            if merged_df is None or merged_df.empty:
+                continue
+            analizar_calidad_datos(merged_df)
+            os.makedirs(os.path.dirname(ruta_particion(anio, mes)), exist_ok=True)
+            merged_df.to_pickle(ruta_particion(anio, mes))
+            if anterior:
+                previas.append(anterior)
+            particiones[clave] = {"huella": huella, "filas": len(merged_df), "muestra": muestra_tipos(merged_df),
+                                  "firma": None}
+            cambiadas.append(clave)
+            logger.info("ENCO %s-%02d: %s rows from new or changed raw files", anio, mes, len(merged_df))
+            del merged_df
+
+    processed_output_path = os.path.join(processed_enco_path, "enco_processed_tidy.csv")
     grouped_output_path = os.path.join(processed_enco_path, "enco_grouped.csv")
-    df_grouped.to_csv(grouped_output_path, index=False)
-    logging.info(f"Grouped data by state and year saved at {grouped_output_path}")
+    # The live outputs must still be the files the last run published: after a rollback, or a
+    # publication that never committed, they are rewritten from the partitions
+    publicadas = (firma_salida(processed_output_path) is not None
+                  and estado.get("salida") == firma_salida(processed_output_path)
+                  and estado.get("agrupada") == firma_salida(grouped_output_path))
+    if not cambiadas and estado["agregado"] is not None and publicadas:
+        guardar_estado(estado)
+        logger.info("No new or changed ENCO months; outputs are up to date")
+        return
+
+    claves = sorted(particiones)
+    if not claves:
+        logger.warning("No ENCO month could be processed; outputs were not written")
+        return
+
+    # Dtypes of the concatenations, from one sample row per month (as in procesar_datos_por_partes)
+    anios = sorted({anio for anio, _ in claves})
+    muestras_anio = {anio: [particiones[clave]["muestra"] for clave in claves if clave[0] == anio] for anio in anios}
+    tipos_anio = {anio: esquema(muestras) for anio, muestras in muestras_anio.items()}
+    tipos_total = esquema([muestra_tipos(pd.concat(muestras_anio[anio], ignore_index=True)) for anio in anios])
+
+    # Dates of a month only need to be derived again when the dtypes it is cast through changed
+    refechadas = set()
+    for clave in claves:
+        firma = repr((tipos_anio[clave[0]].to_dict(), tipos_total.to_dict()))
+        if particiones[clave]["firma"] != firma:
+            df = leer_particion(clave, tipos_anio[clave[0]], tipos_total)
+            particiones[clave].update(firma=firma, muestra_fechas=muestra_tipos(df))
+            refechadas.add(clave)
+    tipos_final = esquema([particiones[clave]["muestra_fechas"] for clave in claves])
+    mismo_esquema = estado["tipos_final"] is not None and tipos_final.equals(estado["tipos_final"])
+
+    for anio in anios:
+        interim_output_path = os.path.join(data_paths["enco"][anio]["interim"], f"enco_interim_{anio}.csv")
+        if any(clave[0] == anio for clave in cambiadas) or not os.path.exists(interim_output_path):
+            escribir_partes([ruta_particion(*clave) for clave in claves if clave[0] == anio],
+                            interim_output_path, [tipos_anio[anio]])
+            logger.info("Processed data for %s saved at %s", anio, interim_output_path)
+
+    # Only later months were added and nothing else changed: append them to the combined table,
+    # provided it is still the file the last incremental run wrote
+    anteriores = [clave for clave in claves if clave not in cambiadas]
+    anexar = (mismo_esquema and not previas and refechadas == set(cambiadas)
+              and estado.get("salida") == firma_salida(processed_output_path)
+              and (not anteriores or min(cambiadas) > max(anteriores)))
+    # Appending starts from a copy of the published table, which stays untouched until the run commits
+    salida = staged(processed_output_path, existing=anexar)
+    filas = 0
+    for i, clave in enumerate(cambiadas if anexar else claves):
+        df = leer_particion(clave, tipos_anio[clave[0]], tipos_total, tipos_final)
+        if clave in cambiadas or clave in refechadas or not mismo_esquema:
+            particiones[clave]["aporte"] = aporte_particion(df)
+        escribir = 'a' if anexar or i > 0 else 'w'
+        df.to_csv(salida, index=False, mode=escribir, header=escribir == 'w')
+        filas += len(df)
+    record_write(salida, rows=filas)
+    logger.info("Combined processed data %s at %s (%s rows)", "appended" if anexar else "rewritten",
+                processed_output_path, filas)
+
+    # Subtract and add month contributions, unless the dtypes changed the contributions of unchanged months
+    if estado["agregado"] is not None and mismo_esquema and refechadas <= set(cambiadas):
+        agregado = combinar_aportes(estado["agregado"], [particiones[clave]["aporte"] for clave in cambiadas],
+                                    [anterior["aporte"] for anterior in previas])
+    else:
+        agregado = combinar_aportes(None, [particiones[clave]["aporte"] for clave in claves], [])
+    df_grouped = agregado.drop(columns='_filas').reset_index()
+    df_grouped.to_csv(staged(grouped_output_path), index=False)
+    record_write(staged(grouped_output_path), rows=len(df_grouped), schema=df_grouped.dtypes)
+    logger.info("Grouped data by state and year saved at %s", grouped_output_path)
+
+    # The published files are copies of these, with the same size and modification time. The state
+    # describes them, so it is only saved once they are live
+    estado.update(tipos_final=tipos_final, agregado=agregado, salida=firma_salida(salida),
+                  agrupada=firma_salida(staged(grouped_output_path)))
+    on_commit(lambda: guardar_estado(estado))
+    logger.info("Incremental ENCO update: %s of %s months processed", len(cambiadas), len(claves))
 
 if __name__ == "__main__":
-    procesar_datos()
-    print(f"Data processing completed. Logs available at {log_filename}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Merge and clean the monthly ENCO files of every year.")
+    parser.add_argument("--max-memory", help="Memory budget, e.g. 4G; process month by month with spill to disk")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Process only the months whose raw files are new or changed since the last run")
+    parser.add_argument("--rebuild", action="store_true", help="With --incremental, reprocess every month")
+    args = parser.parse_args()
+    set_memory_budget(args.max_memory)
+
+    log_path = setup_logging("clean_enco")
+    with Stage("clean_enco"), Publication("clean_enco"):
+        if args.incremental:
+            procesar_incremental(args.rebuild)
+        else:
+            procesar_datos()
+    print(f"Data processing completed. Logs available at {log_path}")
\ No newline at end of file
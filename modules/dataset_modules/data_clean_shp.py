@@ -1,10 +1,14 @@
 import os
 import sys
+import json
+import glob
+import hashlib
 import pandas as pd
 import logging
+import numpy as np
 import geopandas as gpd
-from datetime import datetime
-from shapely.geometry import Polygon, MultiPolygon
+import shapely
+from concurrent.futures import ProcessPoolExecutor
 #import fiona  used to file.to file
 
 # Add the project root directory to the Python path
@@ -12,29 +16,38 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")
 sys.path.append(project_root)
 
 # Import configurations
-from modules.config import data_paths, LOGS_FOLDER
+from modules.config import (data_paths, SHP_SIMPLIFY_TOLERANCES, SHP_WEB_MAX_VERTICES,
+                            SHP_PARQUET_ROW_GROUP_SIZE, SHP_WRITE_FLATGEOBUF,
+                            SHP_VALIDATION_CHUNK_SIZE, SHP_REPAIR_GEOMETRIES,
+                            SHP_DERIVE_ENT_FROM_MUN, SHP_AREA_CRS, nombres_entidades)
+from modules.instrumentation import Stage, record_read, record_write
+from modules.logging_config import setup_logging, lazy
+from modules.memo import memoize
+from modules.publish import Publication, staged
 
-# Ensure interim data path and logs directory exist
+# Ensure interim data path exists
 interim_data_path_shp = data_paths["shp"]["interim"]
 processed_data_path_shp = data_paths["shp"]["processed"]
+web_data_path_shp = data_paths["shp"]["web"]
+web_index_path_shp = os.path.join(web_data_path_shp, "shp_levels.json")
 os.makedirs(interim_data_path_shp, exist_ok=True)
-os.makedirs(LOGS_FOLDER, exist_ok=True)
 
-# Setup logging configuration
-log_filename = os.path.join(LOGS_FOLDER, f"data_shp_transform_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(filename=log_filename, level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
+# Shapely geometry type ids accepted in the SHP layers
+POLYGON_TYPE_IDS = [3, 6]  # Polygon, MultiPolygon
 
-def load_raw_shp(file_path):
-    """Load raw SHP data from a directory containing multiple SHP files."""
+# Logs go to the run folder once the entry point calls setup_logging
+logger = logging.getLogger(__name__)
+
+def load_raw_shp(file_path, load_ent=True):
+    """Load raw SHP data from a directory containing multiple SHP files (skipping ENT if not needed)."""
     try:
-        logging.info(f"Loading raw SHP data from {file_path}...")
+        logger.info("Loading raw SHP data from %s...", file_path)
 
         # Get all SHP files in the directory
         shp_files = [f for f in os.listdir(file_path) if f.endswith('.shp')]
 
         if not shp_files:
-            logging.warning(f"No SHP files found in {file_path}")
+            logger.warning("No SHP files found in %s", file_path)
             return None, None
 
         shp_ent, shp_mun = None, None
@@ -42,34 +55,42 @@ def load_raw_shp(file_path):
         # Iterate over each SHP file and load it
         for shp_file in shp_files:
             file_path_full = os.path.join(file_path, shp_file)
-            logging.info(f"Loading {shp_file}...")
+            if shp_file.endswith('ENT.shp') and not load_ent:
+                logger.info("Skipping %s, the state layer is derived from the municipal layer.", shp_file)
+                continue
+            logger.info("Loading %s...", shp_file)
+            # A shapefile is the .shp plus its sidecar files (.dbf, .shx, .prj, ...)
+            shp_bytes = sum(os.path.getsize(f) for f in glob.glob(os.path.splitext(file_path_full)[0] + '.*'))
 
             # Load SHP into DataFrame
             try:
                 if shp_file.endswith('ENT.shp'):
                     shp_ent = gpd.read_file(file_path_full)
-                    logging.info(f"Loaded {shp_file} successfully, shape: {shp_ent.shape}")
+                    record_read(file_path_full, rows=len(shp_ent), nbytes=shp_bytes, schema=shp_ent.dtypes)
+                    logger.info("Loaded %s successfully, shape: %s", shp_file, shp_ent.shape)
                 else:
                     shp_mun = gpd.read_file(file_path_full)
-                    logging.info(f"Loaded {shp_file} successfully, shape: {shp_mun.shape}")
+                    record_read(file_path_full, rows=len(shp_mun), nbytes=shp_bytes, schema=shp_mun.dtypes)
+                    logger.info("Loaded %s successfully, shape: %s", shp_file, shp_mun.shape)
             except Exception as e:
-                logging.error(f"Error loading {shp_file}: {e}")
+                logger.error("Error loading %s: %s", shp_file, e)
         
         return shp_ent, shp_mun
     except Exception as e:
-        logging.error(f"Error loading data from {file_path}: {e}")
+        logger.error("Error loading data from %s: %s", file_path, e)
         return None, None
 
+@memoize()
 def transform_shp_data(data):
     """Select necessary columns and create tidy dataset."""
     try:
-        logging.info("Transforming SHP data...")
+        logger.info("Transforming SHP data...")
         REQUIRED_COLUMNS = ['CVEGEO', 'NOMGEO', 'geometry']
         
         # Check if all required columns exist in the data
         missing_columns = [col for col in REQUIRED_COLUMNS if col not in data.columns]
         if missing_columns:
-            logging.error(f"Missing columns: {missing_columns}")
+            logger.error("Missing columns: %s", missing_columns)
             return None
 
         # Select necessary columns
@@ -78,19 +99,74 @@ def transform_shp_data(data):
         # Rename columns
         tidy_data_shp.rename(columns={"CVEGEO": 'cvegeo', 'NOMGEO': 'nom_geo'}, inplace=True) # we keep as is 'geometry'
 
-        logging.info(f"Transformed data shape: {tidy_data_shp.shape}")
+        logger.info("Transformed data shape: %s", tidy_data_shp.shape)
         return tidy_data_shp
     except KeyError as e:
-        logging.error(f"Error transforming data: {e}")
+        logger.error("Error transforming data: %s", e)
         return None
     except Exception as e:
-        logging.error(f"An unexpected error occurred: {e}")
+        logger.error("An unexpected error occurred: %s", e)
+        return None
+
+def hash_geodataframe(data):
+    """Hash the attributes, geometries and CRS of a GeoDataFrame."""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(data.drop(columns='geometry'), index=False).values.tobytes())
+    for wkb in shapely.to_wkb(data.geometry.values):
+        digest.update(wkb)
+    digest.update(str(data.crs).encode())
+    return digest.hexdigest()
+
+def derive_ent_from_mun(data, cache_dir=interim_data_path_shp):
+    """Build the raw state layer by dissolving the municipal layer by CVE_ENT, cached by input hash."""
+    try:
+        cache_path = os.path.join(cache_dir, f"shp_ent_dissolved_{hash_geodataframe(data)[:16]}.parquet")
+        if os.path.exists(cache_path):
+            logger.info("Loading dissolved state layer from cache %s", cache_path)
+            return gpd.read_parquet(cache_path)
+
+        logger.info("Dissolving municipal layer by CVE_ENT...")
+        try:
+            # MGN municipalities tile each state without overlaps, so the fast coverage union applies
+            shp_ent = data[['CVE_ENT', 'geometry']].dissolve(by='CVE_ENT', method='coverage')
+        except Exception as e:
+            logger.warning("Coverage dissolve failed (%s), falling back to unary union.", e)
+            shp_ent = data[['CVE_ENT', 'geometry']].dissolve(by='CVE_ENT')
+        shp_ent = shp_ent.reset_index()
+        shp_ent['CVEGEO'] = shp_ent['CVE_ENT']
+        shp_ent['NOMGEO'] = shp_ent['CVE_ENT'].map(nombres_entidades)
+        shp_ent = shp_ent[['CVEGEO', 'CVE_ENT', 'NOMGEO', 'geometry']]
+
+        # Replace any cache entry built from a previous version of the municipal layer
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale_path in glob.glob(os.path.join(cache_dir, "shp_ent_dissolved_*.parquet")):
+            os.remove(stale_path)
+        shp_ent.to_parquet(cache_path)
+        logger.info("Dissolved state layer shape: %s, cached at %s", shp_ent.shape, cache_path)
+        return shp_ent
+    except Exception as e:
+        logger.error("Error deriving state layer: %s", e)
+        return None
+
+@memoize()
+def add_geometry_attributes(data):
+    """Add centroid (WGS84), equal-area km² and bounding box (layer CRS) columns."""
+    try:
+        data = data.copy()
+        centroids = data.geometry.centroid.to_crs(epsg=4326)
+        data['centroid_lon'] = centroids.x.values
+        data['centroid_lat'] = centroids.y.values
+        data['area_km2'] = data.geometry.to_crs(SHP_AREA_CRS).area.values / 1e6
+        data[['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy']] = shapely.bounds(data.geometry.values)
+        return data
+    except Exception as e:
+        logger.error("Error computing geometry attributes: %s", e)
         return None
 
 def validate_data(data):
     """Validate the SHP dataset to ensure it is tidy."""
     try:
-        logging.info("Validating SHP data...")
+        logger.info("Validating SHP data...")
 
         if data.shape[1] == 5:
             cond_cvegeo = (data['CVEGEO'].apply(lambda x: isinstance(x, str)) &
@@ -110,22 +186,22 @@ def validate_data(data):
         cond_nom_geo = data['NOMGEO'].apply(lambda x: isinstance(x, str)).all()
 
         # Condición geo: columna geo debe ser del tipo geométrico Polygon o MultiPolygon
-        cond_geo = data['geometry'].apply(lambda x: isinstance(x, (Polygon, MultiPolygon))).all()
+        cond_geo = np.isin(shapely.get_type_id(data.geometry.values), POLYGON_TYPE_IDS).all()
 
         # Condición 5: Verificamos si hay valores NaN y en qué columnas están
         cond_nan = len(data.columns[data.isnull().any()].tolist())==0
 
         # Log detailed information about the validation result
         if not cond_type:
-           logging.error("Validation failed: file did not load as a geodataframe.")
+           logger.error("Validation failed: file did not load as a geodataframe.")
         if not cond_ent:
-            logging.error("Validation failed: 'CVE_ENT' column has invalid values.")
+            logger.error("Validation failed: 'CVE_ENT' column has invalid values.")
         if not cond_nom_geo:
-            logging.error("Validation failed: 'NOMGEO' column has invalid values.")
+            logger.error("Validation failed: 'NOMGEO' column has invalid values.")
         if not cond_geo:
-            logging.error("Validation failed: 'geometry' column has invalid values.")
+            logger.error("Validation failed: 'geometry' column has invalid values.")
         if not cond_nan:
-            logging.error("Validation failed: Missing columns with NaN values.")
+            logger.error("Validation failed: Missing columns with NaN values.")
 
         # Verificamos si todas las filas cumplen con todas las condiciones
         cumple_todas_condiciones = all([
@@ -137,60 +213,252 @@ def validate_data(data):
             cond_nan
         ]) 
         if cumple_todas_condiciones:
-            logging.info(f"Validation passed.")
+            logger.info("Validation passed.")
             return True
         else:
-            logging.warning(f"Validation failed.")
+            logger.warning("Validation failed.")
             return False
     except Exception as e:
-        logging.error(f"Error during validation: {e}")
+        logger.error("Error during validation: %s", e)
         return False
 
+def _polygonal(geometries):
+    """Keep only the polygonal parts of repaired geometries (make_valid may return collections)."""
+    geometries = np.asarray(geometries, dtype=object)
+    for i in np.flatnonzero(~np.isin(shapely.get_type_id(geometries), POLYGON_TYPE_IDS)):
+        parts = shapely.get_parts(geometries[i])
+        geometries[i] = shapely.union_all(parts[np.isin(shapely.get_type_id(parts), POLYGON_TYPE_IDS)])
+    return geometries
+
+def _check_geometry_chunk(wkb, repair):
+    """Check the validity of a chunk of WKB geometries, repairing the invalid ones if requested."""
+    geometries = shapely.from_wkb(wkb)
+    valid = shapely.is_valid(geometries)
+    reasons = shapely.is_valid_reason(geometries[~valid])
+    repaired = None
+    if repair and not valid.all():
+        repaired = shapely.to_wkb(_polygonal(shapely.make_valid(geometries[~valid])))
+    return valid, reasons, repaired
+
+def validate_geometries(data, repair=SHP_REPAIR_GEOMETRIES, chunk_size=SHP_VALIDATION_CHUNK_SIZE, max_workers=None):
+    """Check geometry validity in parallel chunks, report invalid polygons and optionally repair them."""
+    try:
+        logger.info("Checking geometry validity of %s features...", len(data))
+
+        # WKB arrays pickle much faster than shapely objects when sent to the workers
+        wkb = shapely.to_wkb(data.geometry.values)
+        chunks = [wkb[start:start + chunk_size] for start in range(0, len(wkb), chunk_size)]
+        if len(chunks) > 1 and max_workers != 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_check_geometry_chunk, chunks, [repair] * len(chunks)))
+        else:
+            results = [_check_geometry_chunk(chunk, repair) for chunk in chunks]
+
+        valid = np.concatenate([result[0] for result in results])
+        reasons = np.concatenate([result[1] for result in results])
+        invalid_report = pd.DataFrame({'CVEGEO': data.loc[~valid, 'CVEGEO'].values, 'reason': reasons})
+
+        if invalid_report.empty:
+            logger.info("All geometries are valid.")
+            return data, invalid_report
+
+        logger.warning("%s invalid geometries found: %s", len(invalid_report),
+                       ', '.join(invalid_report['CVEGEO'].head(20)))
+        for cvegeo, reason in invalid_report.head(20).itertuples(index=False):
+            logger.warning("Invalid geometry %s: %s", cvegeo, reason)
+
+        if repair:
+            repaired = shapely.from_wkb(np.concatenate([result[2] for result in results if result[2] is not None]))
+            data = data.copy()
+            data.loc[~valid, 'geometry'] = repaired
+            logger.info("Repaired %s invalid geometries with make_valid.", len(repaired))
+        return data, invalid_report
+    except Exception as e:
+        logger.error("Error validating geometries: %s", e)
+        return data, None
+
 def save_tidy_data_shp(data, output_path):
-    """Save the transformed tidy data."""
+    """Save the transformed tidy data as GeoParquet, FlatGeobuf or shapefile depending on the extension."""
     try:
+        output_path = staged(output_path)
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        data.to_file(output_path)
-        logging.info(f"Saved tidy data to {output_path}")
+        if output_path.endswith('.parquet'):
+            # Sorting by cvegeo keeps each state in a few contiguous row groups, and the bbox
+            # covering column lets readers skip row groups outside the requested extent
+            data = data.sort_values('cvegeo').reset_index(drop=True)
+            data.to_parquet(output_path, index=False, write_covering_bbox=True,
+                            row_group_size=SHP_PARQUET_ROW_GROUP_SIZE)
+        elif output_path.endswith('.fgb'):
+            data.to_file(output_path, driver="FlatGeobuf", SPATIAL_INDEX="YES")
+        else:
+            data.to_file(output_path)
+        record_write(output_path, rows=len(data), schema=data.dtypes)
+        logger.info("Saved tidy data to %s", output_path)
     except Exception as e:
-        logging.error(f"Error saving tidy data: {e}")
+        logger.error("Error saving tidy data: %s", e)
 
-def create_metadata(output_path, raw_data_path):
-    """Create metadata for the processed data."""
+def load_tidy_data_shp(file_path, columns=None, bbox=None, cve_ent=None):
+    """Load a processed SHP layer, reading only the requested columns, extent and state."""
     try:
-        metadata_file = os.path.abspath(os.path.join("data", "metadata", "shp_transform_metadata.txt"))
-        with open(metadata_file, 'w') as f:
-            f.write("Metadata for SHP Data Transformation\n")
-            f.write(f"Source: {raw_data_path}\n")
-            f.write(f"Transformation date: {datetime.now()}\n")
-            f.write(f"Tidy data saved at: {output_path}\n")
-        logging.info(f"Metadata generated at {metadata_file}")
+        if columns is not None and 'geometry' not in columns:
+            columns = list(columns) + ['geometry']
+        if cve_ent is not None:
+            cve_ent = f"{int(cve_ent):02d}"
+
+        if file_path.endswith('.parquet'):
+            # cvegeo starts with the state key, so a state is a contiguous cvegeo range
+            filters = None
+            if cve_ent is not None:
+                filters = [("cvegeo", ">=", cve_ent), ("cvegeo", "<", f"{int(cve_ent) + 1:02d}")]
+            data = gpd.read_parquet(file_path, columns=columns, bbox=bbox, filters=filters)
+        else:
+            where = f"cvegeo LIKE '{cve_ent}%'" if cve_ent is not None else None
+            data = gpd.read_file(file_path, columns=columns, bbox=bbox, where=where)
+
+        logger.info("Loaded %s, shape: %s", file_path, data.shape)
+        return data
+    except Exception as e:
+        logger.error("Error loading tidy data from %s: %s", file_path, e)
+        return None
+
+def count_vertices(data):
+    """Count the total number of vertices in the geometry column."""
+    return int(shapely.get_num_coordinates(data.geometry.values).sum())
+
+def simplify_shp_data(data, tolerances=SHP_SIMPLIFY_TOLERANCES):
+    """Build topology-preserving simplified versions of a tidy SHP layer, one per tolerance.
+
+    The polygons are simplified as a coverage (shapely >= 2.1), so neighbours keep sharing their
+    boundaries. Simplifying each polygon on its own opens gaps and slivers between neighbouring
+    municipalities, so without coverage_simplify no simplified level is built.
+    """
+    levels = {}
+    if not hasattr(shapely, "coverage_simplify"):
+        # A warning, not an error: the full level alone is still a complete output to publish
+        logger.warning("shapely %s has no coverage_simplify (needs 2.1 or later); only the full web level is built",
+                       shapely.__version__)
+        return levels
+    try:
+        for level, tolerance in tolerances.items():
+            simplified = data.copy()
+            simplified['geometry'] = shapely.coverage_simplify(data.geometry.values, tolerance)
+            levels[level] = simplified
+            logger.info("Simplified level '%s' (tolerance %s): %s vertices", level, tolerance,
+                        lazy(count_vertices, simplified))
+        return levels
+    except Exception as e:
+        logger.error("Error simplifying SHP data: %s", e)
+        return levels
+
+def export_web_layer(data, output_path, precision=5):
+    """Export a layer as GeoJSON in WGS84 with reduced coordinate precision for web maps."""
+    try:
+        output_path = staged(output_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        web_data = data.to_crs(epsg=4326)
+        web_data.to_file(output_path, driver="GeoJSON", RFC7946="YES", COORDINATE_PRECISION=precision)
+        record_write(output_path, rows=len(web_data), schema=web_data.dtypes)
+        logger.info("Saved web layer to %s (%s bytes)", output_path, os.path.getsize(output_path))
+        return True
     except Exception as e:
-        logging.error(f"Error creating metadata: {e}")
+        logger.error("Error exporting web layer: %s", e)
+        return False
+
+def build_web_levels(data, layer, output_dir=web_data_path_shp, tolerances=SHP_SIMPLIFY_TOLERANCES):
+    """Simplify a tidy layer, export every level for the web and return its vertex counts."""
+    # Web layers only carry the key and name; metrics are joined on cvegeo by the maps
+    data = data[['cvegeo', 'nom_geo', 'geometry']]
+    levels = {"full": data}
+    levels.update(simplify_shp_data(data, tolerances))
+
+    index = {}
+    for level, level_data in levels.items():
+        output_path = os.path.join(output_dir, f"shp_{layer}_{level}.geojson")
+        if export_web_layer(level_data, output_path):
+            index[level] = {
+                "tolerance": tolerances.get(level, 0),
+                "vertices": count_vertices(level_data),
+                "path": os.path.basename(output_path),
+                "bytes": os.path.getsize(staged(output_path))
+            }
+    return index
+
+def save_web_index(index, output_path=web_index_path_shp):
+    """Save the vertex counts and file names of every web level."""
+    try:
+        output_path = staged(output_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        record_write(output_path)
+        logger.info("Saved web level index to %s", output_path)
+    except Exception as e:
+        logger.error("Error saving web level index: %s", e)
+
+def select_web_layer(layer, max_vertices=None, index_path=web_index_path_shp):
+    """Return the path of the most detailed web level of a layer that fits the vertex budget."""
+    if max_vertices is None:
+        max_vertices = SHP_WEB_MAX_VERTICES[layer]
+    with open(index_path) as f:
+        levels = json.load(f)[layer]
+
+    # Levels from most to least detailed; fall back to the coarsest one if none fits
+    ordered = sorted(levels.values(), key=lambda level: level["vertices"], reverse=True)
+    selected = next((level for level in ordered if level["vertices"] <= max_vertices), ordered[-1])
+    return os.path.join(os.path.dirname(index_path), selected["path"])
 
 if __name__ == "__main__":
-    output_file_path_ent = os.path.join(processed_data_path_shp, "shp_ent_tidy_data.shp")
-    output_file_path_mun = os.path.join(processed_data_path_shp, "shp_mun_tidy_data.shp")
-    raw_path = data_paths['shp']['raw']
+    setup_logging("clean_shp")
+    with Stage("clean_shp"), Publication("clean_shp"):
+        output_file_path_ent = os.path.join(processed_data_path_shp, "shp_ent_tidy_data.parquet")
+        output_file_path_mun = os.path.join(processed_data_path_shp, "shp_mun_tidy_data.parquet")
+        raw_path = data_paths['shp']['raw']
     
-    # Load raw data
-    raw_data_ent, raw_data_mun = load_raw_shp(raw_path)
+        # Load raw data
+        raw_data_ent, raw_data_mun = load_raw_shp(raw_path, load_ent=not SHP_DERIVE_ENT_FROM_MUN)
     
-    tidy_data_ent = None
-    tidy_data_mun = None
+        tidy_data_ent = None
+        tidy_data_mun = None
+        web_index = {}
 
-    if raw_data_ent is not None and validate_data(raw_data_ent):
-        tidy_data_ent = transform_shp_data(raw_data_ent)
+        # Check (and repair) geometry validity before any other validation or geometry operation
+        for layer, raw_data in [("ent", raw_data_ent), ("mun", raw_data_mun)]:
+            if raw_data is None:
+                continue
+            raw_data, invalid_report = validate_geometries(raw_data)
+            if invalid_report is not None and not invalid_report.empty:
+                invalid_report.to_csv(os.path.join(interim_data_path_shp, f"shp_{layer}_invalid_geometries.csv"), index=False)
+            if layer == "ent":
+                raw_data_ent = raw_data
+            else:
+                raw_data_mun = raw_data
+
+        if SHP_DERIVE_ENT_FROM_MUN and raw_data_mun is not None:
+            raw_data_ent = derive_ent_from_mun(raw_data_mun)
+
+        if raw_data_ent is not None and validate_data(raw_data_ent):
+            tidy_data_ent = transform_shp_data(raw_data_ent)
+            if tidy_data_ent is not None:
+                tidy_data_ent = add_geometry_attributes(tidy_data_ent)
     
-    if tidy_data_ent is not None:
-        save_tidy_data_shp(tidy_data_ent, output_file_path_ent)
-        create_metadata(output_file_path_ent, raw_path)
+        if tidy_data_ent is not None:
+            save_tidy_data_shp(tidy_data_ent, output_file_path_ent)
+            if SHP_WRITE_FLATGEOBUF:
+                save_tidy_data_shp(tidy_data_ent, output_file_path_ent.replace('.parquet', '.fgb'))
+            web_index["ent"] = build_web_levels(tidy_data_ent, "ent")
     
-    if raw_data_mun is not None and validate_data(raw_data_mun):
-        tidy_data_mun = transform_shp_data(raw_data_mun)
+        if raw_data_mun is not None and validate_data(raw_data_mun):
+            tidy_data_mun = transform_shp_data(raw_data_mun)
+            if tidy_data_mun is not None:
+                tidy_data_mun = add_geometry_attributes(tidy_data_mun)
     
-    if tidy_data_ent is not None:
-        save_tidy_data_shp(tidy_data_mun, output_file_path_mun)
-        create_metadata(output_file_path_mun, raw_path)
+        if tidy_data_mun is not None:
+            save_tidy_data_shp(tidy_data_mun, output_file_path_mun)
+            if SHP_WRITE_FLATGEOBUF:
+                save_tidy_data_shp(tidy_data_mun, output_file_path_mun.replace('.parquet', '.fgb'))
+            web_index["mun"] = build_web_levels(tidy_data_mun, "mun")
+
+        if web_index:
+            save_web_index(web_index)
 
-    logging.info("SHP data transformation process completed.")
+        logger.info("SHP data transformation process completed.")
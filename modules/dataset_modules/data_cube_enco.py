@@ -0,0 +1,112 @@
+import os
+import sys
+import pandas as pd
+import logging
+from functools import lru_cache
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(project_root)
+
+# Import configurations
+from modules.config import BASE_PROCESSED_DATA_PATH, estados, region_mapping
+from modules.instrumentation import Stage, record_read, record_write
+from modules.logging_config import setup_logging
+
+processed_enco_path = os.path.join(BASE_PROCESSED_DATA_PATH, "enco")
+cube_path = os.path.join(processed_enco_path, "enco_cube.parquet")
+
+# Logs go to the run folder once the entry point calls setup_logging
+logger = logging.getLogger(__name__)
+
+# Cube dimensions and measures
+DIMENSIONS = ['year', 'month', 'ent', 'mpio', 'region', 'question', 'response']
+MEASURES = ['n', 'peso']
+preguntas = [f'p{i}' for i in range(1, 16)]  # P1, P2, ..., P15
+
+def build_cube(df, weight_col=None):
+    """Aggregate ENCO microdata into weighted counts over the cube dimensions."""
+    try:
+        logger.info("Building ENCO cube from data shape: %s", df.shape)
+        fechas = pd.to_datetime(df['fch_def'], format='%d/%m/%Y', errors='coerce')
+        base = pd.DataFrame({
+            'year': df['year'],
+            'month': fechas.dt.month,
+            'ent': df['ent'],
+            'mpio': df['mpio'],
+            'region': df['ent'].map(estados).map(region_mapping).fillna('Sin region'),
+            # Without an expansion factor every interview weighs 1 and peso equals n
+            'peso': df[weight_col] if weight_col else 1.0
+        })
+
+        dims = ['year', 'month', 'ent', 'mpio', 'region']
+        partes = []
+        for pregunta in preguntas:
+            # Same treatment as the dashboard shares: missing answers are counted as response 0
+            base['response'] = df[pregunta].fillna(0).astype(int)
+            parte = base.groupby(dims + ['response'], dropna=False).agg(n=('peso', 'size'), peso=('peso', 'sum'))
+            parte = parte.reset_index()
+            parte['question'] = pregunta
+            partes.append(parte)
+
+        cube = pd.concat(partes, ignore_index=True)[DIMENSIONS + MEASURES]
+        cube['question'] = pd.Categorical(cube['question'], categories=preguntas)
+        cube['region'] = cube['region'].astype('category')
+        cube = cube.sort_values(['question', 'year', 'ent', 'mpio']).reset_index(drop=True)
+        logger.info("ENCO cube shape: %s", cube.shape)
+        return cube
+    except Exception as e:
+        logger.error("Error building ENCO cube: %s", e)
+        return None
+
+def save_cube(cube, output_path=cube_path):
+    """Save the cube as Parquet, written aside and renamed so readers never see a partial file."""
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        temporary_path = f"{output_path}.{os.getpid()}.tmp"
+        cube.to_parquet(temporary_path, index=False)
+        os.replace(temporary_path, output_path)
+        record_write(output_path, rows=len(cube), schema=cube.dtypes)
+        logger.info("Saved ENCO cube to %s", output_path)
+    except Exception as e:
+        logger.error("Error saving ENCO cube: %s", e)
+
+@lru_cache(maxsize=4)
+def load_cube(path=cube_path):
+    """Load the cube once per process; later queries reuse the in-memory copy."""
+    return pd.read_parquet(path)
+
+def query_cube(by, filters=None, cube=None, measure='n'):
+    """Roll the cube up to `by` (plus question and response) and compute response shares.
+
+    `filters` maps a dimension to a value or a list of values, e.g.
+    query_cube(['region', 'year'], {'question': 'p1'}) gives p1 shares by region and year.
+    """
+    if cube is None:
+        cube = load_cube()
+    if filters:
+        mask = pd.Series(True, index=cube.index)
+        for dim, values in filters.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            mask &= cube[dim].isin(values)
+        cube = cube[mask]
+
+    keys = [dim for dim in by if dim not in ('question', 'response')] + ['question', 'response']
+    # Missing months (unparseable fch_def) and municipalities are groups of their own, as in the cube
+    result = cube.groupby(keys, observed=True, dropna=False)[MEASURES].sum().reset_index()
+    totals = result.groupby(keys[:-1], observed=True, dropna=False)[measure].transform('sum')
+    result['Porcentaje'] = result[measure] / totals * 100
+    return result
+
+if __name__ == "__main__":
+    setup_logging("enco_cube")
+    columnas = ['ent', 'mpio', 'fch_def', 'year'] + preguntas
+    input_path = os.path.join(processed_enco_path, "enco_processed_tidy.csv")
+    with Stage("enco_cube"):
+        df_enco = pd.read_csv(input_path, usecols=columnas, low_memory=False)
+        record_read(input_path, rows=len(df_enco), schema=df_enco.dtypes)
+        cube = build_cube(df_enco)
+        if cube is not None:
+            save_cube(cube)
+
+    logger.info("ENCO cube process completed.")
@@ -2,32 +2,36 @@ import requests
 import zipfile
 import os
 import sys
+import fnmatch
+import argparse
 from io import BytesIO
 from tqdm import tqdm
-from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 import logging
 import time
+import shutil
 
 # Add the project root directory to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 sys.path.append(project_root)
 
 # Import entire dictionaries from config
-from modules.config import data_paths, urls, years, BASE_URL_ENCO, LOGS_FOLDER
+from modules.config import data_paths, urls, years, BASE_URL_ENCO, BASE_RAW_DATA_PATH, RAW_ZIP_MODE, RAW_ZIP_MEMBERS
+from modules.instrumentation import Stage, record_read, record_write
+from modules.logging_config import setup_logging
+from modules.releases import enco_catalog, make_session
 
-# Ensure logs directory exist
-os.makedirs(LOGS_FOLDER, exist_ok=True)
-
-# Setup logging configuration
-logging.basicConfig(filename=f"logs/data_downloader_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log", level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s', filemode='w')
+# Logs go to the run folder once the entry point calls setup_logging
+logger = logging.getLogger(__name__)
 
 # Function to clean the directory except for .gitkeep files
 def clean_directory(directory_path, preserve_files=None):
     """
     Remove all files and subfolders in the directory except those in the preserve_files list.
 
+    The directory is renamed out of the way and recreated empty before anything is deleted, so
+    readers see either the old contents or an empty folder, never a half deleted one.
+
     Args:
         directory_path (str): The path to the directory to clean.
         preserve_files (list): List of file names to preserve (e.g., ['.gitkeep']).
@@ -36,23 +40,47 @@ def clean_directory(directory_path, preserve_files=None):
         preserve_files = []
 
     try:
-        for root, dirs, files in os.walk(directory_path, topdown=False):
-            # Remove all files except those to preserve
+        if not os.path.isdir(directory_path):
+            return
+        trash_path = f"{directory_path.rstrip(os.sep)}.{os.getpid()}.trash"
+        os.replace(directory_path, trash_path)
+        os.makedirs(directory_path)
+        # Move the preserved files back into the new directory
+        for root, dirs, files in os.walk(trash_path):
             for file in files:
-                if file not in preserve_files:
-                    file_path = os.path.join(root, file)
-                    os.remove(file_path)
-                    logging.info(f"Deleted file: {file_path}")
-            # Remove empty directories
-            for dir_ in dirs:
-                dir_path = os.path.join(root, dir_)
-                os.rmdir(dir_path)
-                logging.info(f"Deleted directory: {dir_path}")
+                if file in preserve_files:
+                    target = os.path.join(directory_path, os.path.relpath(os.path.join(root, file), trash_path))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(os.path.join(root, file), target)
+        shutil.rmtree(trash_path)
+        logger.info("Deleted the contents of %s", directory_path)
     except Exception as e:
-        logging.error(f"Error cleaning directory {directory_path}: {e}")
+        logger.error("Error cleaning directory %s: %s", directory_path, e)
+
+def store_archive(archive, buffer, url, extract_path, mode="extract", members=None):
+    """Store a downloaded archive in its raw folder and return the bytes written to disk.
+
+    "zip" saves the archive as is (the cleaners read it through modules/raw_files.py),
+    "members" extracts the members matching the glob patterns and "extract" every member.
+    """
+    os.makedirs(extract_path, exist_ok=True)
+    if mode == "zip":
+        archive_path = os.path.join(extract_path, os.path.basename(url.split("?")[0]))
+        with open(archive_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        return buffer.getbuffer().nbytes
+    if mode == "members" and members:
+        selected = [info for info in archive.infolist()
+                    if any(fnmatch.fnmatch(info.filename.lower(), pattern.lower()) for pattern in members)]
+        archive.extractall(extract_path, members=selected)
+        logger.info("Extracted %s of %s members from %s", len(selected), len(archive.infolist()), url)
+        return sum(info.file_size for info in selected)
+    archive.extractall(extract_path)
+    return sum(info.file_size for info in archive.infolist())
 
 # Function for downloading and extracting ZIP files with retry logic and progress bar
-def download_and_extract_zip(url, extract_path, retries=3, backoff_factor=2):
+def download_and_extract_zip(url, extract_path, retries=3, backoff_factor=2, mode="extract", members=None,
+                             session=None):
     attempt = 0
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
@@ -61,13 +89,13 @@ def download_and_extract_zip(url, extract_path, retries=3, backoff_factor=2):
     while attempt < retries:
         try:
             # Get the file with redirection allowed and browser-like headers
-            with requests.get(url, stream=True, allow_redirects=True, headers=headers) as r:
+            with (session or requests).get(url, stream=True, allow_redirects=True, headers=headers) as r:
                 r.raise_for_status()  # Check for HTTP errors
 
                 # Verify Content-Type
                 content_type = r.headers.get('Content-Type', '')
                 if 'zip' not in content_type:
-                    logging.warning(f"Expected a ZIP file from {url}, got {content_type}. URL may be incorrect.")
+                    logger.warning("Expected a ZIP file from %s, got %s. URL may be incorrect.", url, content_type)
                     return  # Exit if not receiving a ZIP file
 
                 # Track download progress
@@ -83,22 +111,24 @@ def download_and_extract_zip(url, extract_path, retries=3, backoff_factor=2):
                 buffer.seek(0)
                 if zipfile.is_zipfile(buffer):
                     with zipfile.ZipFile(buffer) as z:
-                        z.extractall(extract_path)
-                        logging.info(f"Files successfully extracted from {url} to {extract_path}")
+                        written = store_archive(z, buffer, url, extract_path, mode, members)
+                        record_read(url, nbytes=buffer.getbuffer().nbytes)
+                        record_write(extract_path, nbytes=written)
+                        logger.info("Files successfully stored from %s to %s (%s)", url, extract_path, mode)
                         return  # Exit function if successful
                 else:
-                    logging.error(f"The downloaded file from {url} is not a valid ZIP archive.")
+                    logger.error("The downloaded file from %s is not a valid ZIP archive.", url)
                     return  # Exit if file is not a valid ZIP archive
 
         except requests.exceptions.RequestException as e:
-            logging.error(f"Download error for {url}: {e}. Retrying in {backoff_factor ** attempt} seconds.")
+            logger.error("Download error for %s: %s. Retrying in %s seconds.", url, e, backoff_factor ** attempt)
             time.sleep(backoff_factor ** attempt)  # Exponential backoff for retries
             attempt += 1
         except zipfile.BadZipFile:
-            logging.error(f"Bad ZIP file encountered at {url}. Exiting download attempts.")
+            logger.error("Bad ZIP file encountered at %s. Exiting download attempts.", url)
             return  # Exit if ZIP extraction fails with a BadZipFile error
 
-    logging.error(f"Failed to download {url} after {retries} attempts.")
+    logger.error("Failed to download %s after %s attempts.", url, retries)
 
 def build_url(year, month, info):
     if "exceptions" in info and month in info["exceptions"]:
@@ -109,11 +139,33 @@ def build_url(year, month, info):
         filename = info["pattern"].format(month=month)
     return BASE_URL_ENCO.format(year=year, filename=filename)
 
+def enco_raw_path(year):
+    """Raw folder of an ENCO year, also for discovered years that are not processed yet."""
+    return data_paths['enco'][year]['raw'] if year in data_paths['enco'] else os.path.join(BASE_RAW_DATA_PATH, "enco", str(year))
+
+def enco_release_urls(session=None, refresh=False):
+    """{year: {month: url}} of the ENCO releases to download, discovered or built from the config patterns."""
+    try:
+        catalog = enco_catalog(refresh, session=session)
+    except RuntimeError as e:
+        # Only the configured years are cleaned and downloaded then, so no local month is lost
+        logger.error("ENCO release discovery failed: %s", e)
+        catalog = None
+    if catalog:
+        return catalog
+    logger.warning("ENCO release discovery found nothing; falling back to the configured file name patterns")
+    return {year: {month: build_url(year, month, info) for month in [str(i).zfill(2) for i in range(1, 13)]
+                   if build_url(year, month, info)} for year, info in years.items()}
+
 # Parallel downloads using ThreadPoolExecutor
-def download_data():
+def download_data(refresh_catalog=False):
+    # Pooled connections shared by the release discovery and the ENCO downloads
+    session = make_session()
+    enco_urls = enco_release_urls(session, refresh_catalog)
+
     # Clean directories for each dataset and year
-    for year in years.keys():
-        enco_path = data_paths['enco'][year]['raw']
+    for year in enco_urls:
+        enco_path = enco_raw_path(year)
         clean_directory(enco_path, preserve_files=['.gitkeep'])
         os.makedirs(enco_path, exist_ok=True)
     clean_directory(data_paths['enigh'][2018]['raw'], preserve_files=['.gitkeep'])
@@ -122,106 +174,34 @@ def download_data():
     clean_directory(data_paths['censo']['raw'], preserve_files=['.gitkeep'])
     clean_directory(data_paths['shp']['raw'], preserve_files=['.gitkeep'])
 
-    # Download ENCO datasets using the `years` dictionary
-    for year, info in years.items():
-        enco_path = data_paths['enco'][year]['raw']
-        
-        for month in [str(i).zfill(2) for i in range(1, 13)]:
-            url = build_url(year, month, info)
-            if url:  # Skip months without a file
-                download_and_extract_zip(url, enco_path)          
+    # Download the ENCO releases of the catalog (only published months are listed)
+    for year, months in enco_urls.items():
+        for month, url in sorted(months.items()):
+            download_and_extract_zip(url, enco_raw_path(year), mode=RAW_ZIP_MODE, members=RAW_ZIP_MEMBERS["enco"],
+                                     session=session)
 
     with ThreadPoolExecutor(max_workers=4) as executor:
         # Download CENSO datasets in parallel
-        executor.map(lambda url: download_and_extract_zip(url, data_paths['censo']['raw']), urls['censo'])
-        # Download SHP datasets in parallel
+        executor.map(lambda url: download_and_extract_zip(url, data_paths['censo']['raw'], mode=RAW_ZIP_MODE,
+                                                          members=RAW_ZIP_MEMBERS["censo"]), urls['censo'])
+        # Download SHP datasets in parallel (always extracted: the shapefile readers need the sidecar files)
         executor.map(lambda url: download_and_extract_zip(url, data_paths['shp']['raw']), urls['shp'])
 
     # Download ENIGH datasets after ENCO downloads
     for year in [2018, 2020, 2022]:
-        download_and_extract_zip(urls['enigh'][year], extract_path=data_paths['enigh'][year]['raw'])
-
-
-# Function to list only files in a directory and capture their metadata
-def list_files_and_folders(directory_path):
-    file_info = []
-    try:
-        for root, dirs, files in os.walk(directory_path):
-            relative_dir = os.path.relpath(root, directory_path)
-            if relative_dir == ".":
-                relative_dir = ""  # Root directory
+        download_and_extract_zip(urls['enigh'][year], extract_path=data_paths['enigh'][year]['raw'],
+                                 mode=RAW_ZIP_MODE, members=RAW_ZIP_MEMBERS["enigh"])
 
-            # Add directory information
-            if dirs:
-                file_info.append(f"Directory: {relative_dir}")
-
-            # Add file information
-            for file in files:
-                file_path = os.path.join(root, file)
-                file_size = os.path.getsize(file_path)
-                file_info.append(f"File: {os.path.join(relative_dir, file)}, Size: {file_size} bytes")
-
-        return file_info
-    except Exception as e:
-        logging.error(f"Error listing files and folders in {directory_path}: {e}")
-        return []
-
-
-# Function to create enriched metadata
-def create_metadata():
-    metadata_file = os.path.abspath(os.path.join("data", "metadata", "data_sources_description.txt"))
-    with open(metadata_file, 'w') as f:
-        f.write("Description of the downloaded data sources:\n\n")
-
-        # ENCO Metadata for 2022
-        f.write("Source: ENCO 2022\n")
-        f.write(f"URLs: {', '.join(urls['enco'][2022])}\n")
-        f.write(f"Download date: {datetime.now()}\n")
-        f.write("Description: National Consumer Confidence Survey (ENCO) for the year 2022.\n")
-        enco_info = list_files_and_folders(data_paths['enco'][2022]['raw'])
-        if enco_info:
-            for info in enco_info:
-                f.write(f"{info}\n")
-        else:
-            f.write("No files or directories found in the ENCO folder.\n")
-
-        # ENIGH Metadata for 2022
-        f.write("\nSource: ENIGH 2022\n")
-        f.write(f"URL: {urls['enigh'][2022]}\n")
-        enigh_info = list_files_and_folders(data_paths['enigh'][2022]['raw'])
-        if enigh_info:
-            for info in enigh_info:
-                f.write(f"{info}\n")
-        else:
-            f.write("No files or directories found in the ENIGH folder.\n")
-        
-        # CENSO Metadata for 2020
-        f.write("Source: INEGI 2020\n")
-        f.write(f"URLs: {', '.join(urls['censo'])}\n")
-        f.write(f"Download date: {datetime.now()}\n")
-        f.write("Description: Population and Housing Census for the year 2020.\n")
-        censo_info = list_files_and_folders(data_paths['censo']['raw'])
-        if censo_info:
-            for info in censo_info:
-                f.write(f"{info}\n")
-        else:
-            f.write("No files or directories found in the CENSO folder.\n")
-
-        # SHP Metadata for 2020
-        f.write("Source: INEGI 2020\n")
-        f.write(f"URLs: {', '.join(urls['shp'])}\n")
-        f.write(f"Download date: {datetime.now()}\n")
-        f.write("Description: Shapefile of mexico by entity and municipality for the year 2020.\n")
-        shp_info = list_files_and_folders(data_paths['shp']['raw'])
-        if shp_info:
-            for info in shp_info:
-                f.write(f"{info}\n")
-        else:
-            f.write("No files or directories found in the SHP folder.\n")
 
 # Main script execution
 if __name__ == "__main__":
-    logging.info("Starting download process...")
-    download_data()
-    create_metadata()
-    logging.info("Process completed.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download the raw ENCO, ENIGH, census and SHP data.")
+    parser.add_argument("--refresh-catalog", action="store_true",
+                        help="Discover the ENCO releases again even if the cached catalog is fresh")
+    args = parser.parse_args()
+
+    setup_logging("download")
+    logger.info("Starting download process...")
+    with Stage("download"):
+        download_data(args.refresh_catalog)
+    logger.info("Process completed.")
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+import sys
+import hashlib
+import pandas as pd
+import geopandas as gpd
+import logging
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(project_root)
+
+# Import configurations
+from modules.config import data_paths, codigos_estados
+from modules.logging_config import setup_logging
+
+# Ensure output path exists
+processed_data_path_geo = data_paths["geo"]["processed"]
+os.makedirs(processed_data_path_geo, exist_ok=True)
+
+# Logs go to the run folder once the entry point calls setup_logging
+logger = logging.getLogger(__name__)
+
+# Merged results and processed SHP layer joined for each geographic level
+GEO_LEVELS = {
+    "estatales": {
+        "merged": os.path.join(data_paths["dashboard"], "resultados_estatales_merged.csv"),
+        "shp": os.path.join(data_paths["shp"]["processed"], "shp_ent_tidy_data.parquet")
+    },
+    "municipales": {
+        "merged": os.path.join(data_paths["dashboard"], "resultados_municipales_merged.csv"),
+        "shp": os.path.join(data_paths["shp"]["processed"], "shp_mun_tidy_data.parquet")
+    }
+}
+
+def geo_output_path(level, year):
+    """Path of the geometry-plus-metrics GeoParquet for a level and year."""
+    return os.path.join(processed_data_path_geo, f"geo_{level}_{year}.parquet")
+
+def source_stamp(input_paths):
+    """Digest of the name, size and modification time of the inputs an output is built from."""
+    digest = hashlib.sha256()
+    for path in input_paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        digest.update(f"{os.path.basename(path)}:{stat and stat.st_size}:{stat and stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def stamp_path(output_path):
+    """Side file holding the source stamp of an output."""
+    return f"{output_path}.sources"
+
+def is_up_to_date(output_path, input_paths):
+    """Check whether an output exists and was written from its inputs as they are now.
+
+    The inputs are compared with the stamp recorded next to the output rather than by being older
+    than it: a rollback of a publication puts back older inputs with their older mtimes.
+    """
+    if not os.path.exists(output_path):
+        return False
+    try:
+        with open(stamp_path(output_path)) as f:
+            return f.read() == source_stamp(input_paths)
+    except FileNotFoundError:
+        return False
+
+def replace_output(temporary_path, output_path, stamp):
+    """Move a fully written output into place and record the stamp of the inputs it was written from."""
+    os.replace(temporary_path, output_path)
+    temporary_stamp = f"{stamp_path(output_path)}.{os.getpid()}.tmp"
+    with open(temporary_stamp, 'w') as f:
+        f.write(stamp)
+    os.replace(temporary_stamp, stamp_path(output_path))
+
+def add_cvegeo_key(data, level):
+    """Add the integer cvegeo key (ent or ent * 1000 + mun) to the merged results."""
+    data = data.copy()
+    entidad = data['estado'].str.strip().str.upper().map(codigos_estados)
+    if entidad.isnull().any():
+        logger.warning("States without code in %s: %s", level, sorted(data.loc[entidad.isnull(), 'estado'].unique()))
+    if level == "municipales":
+        data['cvegeo'] = entidad * 1000 + data['municipio']
+    else:
+        data['cvegeo'] = entidad
+    return data.dropna(subset=['cvegeo']).astype({'cvegeo': int})
+
+def load_geometry(shp_path):
+    """Load a processed SHP layer with its cvegeo key as integer."""
+    geometry = gpd.read_parquet(shp_path)
+    geometry['cvegeo'] = geometry['cvegeo'].astype(int)
+    return geometry
+
+def join_geo_metrics(geometry, metrics, level):
+    """Join merged results to their polygons on the integer cvegeo key."""
+    try:
+        joined = geometry.merge(metrics.drop(columns=['estado'], errors='ignore'), on='cvegeo', how='inner')
+        unmatched = set(metrics['cvegeo']) - set(joined['cvegeo'])
+        if unmatched:
+            logger.warning("%s %s keys without geometry: %s", len(unmatched), level, sorted(unmatched)[:20])
+        logger.info("Joined %s data shape: %s", level, joined.shape)
+        return joined
+    except Exception as e:
+        logger.error("Error joining %s data: %s", level, e)
+        return None
+
+def build_geo_level(level, force=False):
+    """Build the GeoParquet of every year of a level, skipping the ones already up to date."""
+    inputs = GEO_LEVELS[level]
+    # Taken before reading, so inputs replaced during the build leave the outputs stale
+    stamp = source_stamp([inputs["merged"], inputs["shp"]])
+    try:
+        metrics = add_cvegeo_key(pd.read_csv(inputs["merged"]), level)
+    except Exception as e:
+        logger.error("Error loading merged results from %s: %s", inputs['merged'], e)
+        return []
+
+    geometry = None
+    outputs = []
+    for year, year_metrics in metrics.groupby('year'):
+        output_path = geo_output_path(level, year)
+        if not force and is_up_to_date(output_path, [inputs["merged"], inputs["shp"]]):
+            logger.info("%s is up to date, skipping.", output_path)
+            outputs.append(output_path)
+            continue
+
+        # Geometry is only loaded when at least one year has to be rebuilt
+        if geometry is None:
+            geometry = load_geometry(inputs["shp"])
+        joined = join_geo_metrics(geometry, year_metrics, level)
+        if joined is not None:
+            # Written aside and renamed, so an interrupted write never leaves a truncated file in place
+            temporary_path = f"{output_path}.{os.getpid()}.tmp"
+            joined.to_parquet(temporary_path, index=False, write_covering_bbox=True)
+            replace_output(temporary_path, output_path, stamp)
+            logger.info("Saved %s %s geo data to %s", level, year, output_path)
+            outputs.append(output_path)
+    return outputs
+
+def load_geo_metrics(level, year, columns=None):
+    """Load the ready-to-map data of a level and year, building it first if needed."""
+    output_path = geo_output_path(level, year)
+    if not is_up_to_date(output_path, GEO_LEVELS[level].values()):
+        build_geo_level(level)
+    if columns is not None and 'geometry' not in columns:
+        # Metrics only: skip decoding the geometry column entirely
+        return pd.read_parquet(output_path, columns=columns)
+    return gpd.read_parquet(output_path, columns=columns)
+
+if __name__ == "__main__":
+    setup_logging("join_geo")
+    for level in GEO_LEVELS:
+        build_geo_level(level)
+
+    logger.info("Geo join process completed.")
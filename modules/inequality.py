@@ -0,0 +1,190 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import (INEQUALITY_QUANTILES, ATKINSON_EPSILONS, INEQUALITY_BOOTSTRAP_REPLICATES,
+                            INEQUALITY_WORKERS)
+from modules.shared_arrays import SharedArrays, map_shared, balanced_ranges
+
+# Rows below which the bootstrap runs in-process instead of starting a pool
+PARALLEL_MIN_ROWS = 200000
+# Replicates drawn at once per group (bounds the replicates x households index matrix)
+BOOTSTRAP_BATCH = 25
+
+def quantile_column(q):
+    """Column name of a quantile: 0.1 -> p10, 0.995 -> p99.5."""
+    return f"p{q * 100:g}"
+
+class _SortedGroups:
+    """Incomes and weights sorted by group and income once, with the cumulative sums every metric reads.
+
+    order, when given, already sorts the rows by group and income (see inequality_metrics_by_level).
+    """
+
+    def __init__(self, codes, income, weight, order=None):
+        if order is None:
+            order = np.lexsort((income, codes))
+        self.codes = codes[order]
+        self.income = income[order]
+        self.weight = weight[order]
+        self.starts = np.flatnonzero(np.r_[True, self.codes[1:] != self.codes[:-1]])
+        self.ends = np.r_[self.starts[1:], len(self.codes)]
+        self.cum_weight = np.cumsum(self.weight)
+        self.cum_income = np.cumsum(self.weight * self.income)
+        # Cumulative sums up to the start of every group
+        self.weight_before = np.r_[0, self.cum_weight][self.starts]
+        self.income_before = np.r_[0, self.cum_income][self.starts]
+        self.total_weight = self.cum_weight[self.ends - 1] - self.weight_before
+        self.total_income = self.cum_income[self.ends - 1] - self.income_before
+
+    def _position(self, p):
+        """Index of the household holding the weighted population share p of every group."""
+        target = self.weight_before + p * self.total_weight
+        position = np.searchsorted(self.cum_weight, target, side='left')
+        return np.clip(position, self.starts, self.ends - 1), target
+
+    def quantile(self, q):
+        """Weighted quantile: income of the first household whose cumulative weight reaches q of the group."""
+        position, _ = self._position(q)
+        return self.income[position]
+
+    def lorenz(self, p):
+        """Income held by the poorest share p of every group, splitting the weight of the boundary household."""
+        position, target = self._position(p)
+        weight_below = np.r_[0, self.cum_weight][position]
+        income_below = np.r_[0, self.cum_income][position]
+        return income_below - self.income_before + (target - weight_below) * self.income[position]
+
+    def reduce(self, values, mask=None):
+        """Weighted sum of values in every group, only over the rows in mask."""
+        weights = self.weight if mask is None else np.where(mask, self.weight, 0)
+        return np.add.reduceat(weights * values, self.starts)
+
+def _gini_theil(income, weight):
+    """Weighted Gini and Theil T of every row of sorted (replicates x households) income and weight matrices.
+
+    As in the point estimates, the Gini uses every household and the Theil T those with positive income.
+    """
+    total_weight = weight.sum(axis=1, keepdims=True)
+    total_income = (weight * income).sum(axis=1, keepdims=True)
+    lorenz = np.cumsum(weight * income, axis=1) / total_income
+    lorenz_before = np.concatenate([np.zeros((len(income), 1)), lorenz[:, :-1]], axis=1)
+    gini = 1 - (weight * (lorenz + lorenz_before)).sum(axis=1) / total_weight[:, 0]
+    positive_weight = np.where(income > 0, weight, 0)
+    positive_total = positive_weight.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = income * positive_total / (positive_weight * income).sum(axis=1, keepdims=True)
+        theil = np.where(income > 0, positive_weight * ratio * np.log(ratio), 0).sum(axis=1) / positive_total[:, 0]
+    return gini, theil
+
+def _bootstrap_groups(arrays, first, last, replicates, seed):
+    """Bootstrap standard errors of the Gini and Theil T of groups first..last-1 of the sorted arrays.
+
+    Households are resampled with replacement within each group; every group has its own seeded
+    generator, so the result does not depend on how groups are split between workers.
+    """
+    income, weight, starts, ends = arrays['income'], arrays['weight'], arrays['starts'], arrays['ends']
+    errors = np.full((last - first, 2), np.nan)
+    for i, group in enumerate(range(first, last)):
+        y = np.asarray(income[starts[group]:ends[group]])
+        w = np.asarray(weight[starts[group]:ends[group]])
+        if len(y) < 2:
+            continue
+        rng = np.random.default_rng([seed, group])
+        estimates = []
+        for batch in range(0, replicates, BOOTSTRAP_BATCH):
+            # Incomes are sorted, so sorting the drawn positions sorts every replicate
+            draws = np.sort(rng.integers(0, len(y), (min(BOOTSTRAP_BATCH, replicates - batch), len(y))), axis=1)
+            estimates.append(np.column_stack(_gini_theil(y[draws], w[draws])))
+        errors[i] = np.concatenate(estimates).std(axis=0, ddof=1)
+    return errors
+
+def bootstrap_errors(groups, replicates, workers=INEQUALITY_WORKERS, seed=0):
+    """Standard errors of the Gini and Theil T of every group, from the already sorted microdata.
+
+    Large inputs are spread over a process pool: the sorted columns and group offsets go to shared
+    memory once and every task is just a range of group numbers.
+    """
+    arrays = {'income': groups.income, 'weight': groups.weight, 'starts': groups.starts, 'ends': groups.ends}
+    if workers == 1 or len(groups.income) < PARALLEL_MIN_ROWS:
+        return _bootstrap_groups(arrays, 0, len(groups.starts), replicates, seed)
+    workers = workers or os.cpu_count()
+    with SharedArrays(arrays) as shared:
+        tasks = [(first, last, replicates, seed) for first, last in balanced_ranges(groups.starts, groups.ends, workers * 4)]
+        return np.concatenate(map_shared(_bootstrap_groups, shared, tasks, workers))
+
+def inequality_metrics(df, group_cols, income='ing_cor', weight='factor', quantiles=INEQUALITY_QUANTILES,
+                       epsilons=ATKINSON_EPSILONS, replicates=INEQUALITY_BOOTSTRAP_REPLICATES):
+    """Weighted quantiles, Theil T and L, Atkinson indices, Palma and S80/S20 of every group in one pass.
+
+    The microdata is sorted once by group and income; every metric of every group is then read from
+    the sorted arrays and their cumulative sums. Rows without income or weight are left out, and
+    Theil and Atkinson use the households with positive income only (logs and negative powers are
+    undefined at zero). With replicates > 0, bootstrap standard errors of the microdata Gini and
+    Theil T are added. Returns one row per group, with the group columns first.
+    """
+    return inequality_metrics_by_level(df, [group_cols], income, weight, quantiles, epsilons, replicates)[0]
+
+def inequality_metrics_by_level(df, levels, income='ing_cor', weight='factor', quantiles=INEQUALITY_QUANTILES,
+                                epsilons=ATKINSON_EPSILONS, replicates=INEQUALITY_BOOTSTRAP_REPLICATES):
+    """inequality_metrics of several groupings (e.g. year, year and state, year and municipality) of the same rows.
+
+    The rows are sorted by income once. Each level then only needs a stable sort of its integer group
+    codes (a linear radix sort in NumPy), which keeps the income order within every group.
+    """
+    group_cols = list(dict.fromkeys(col for cols in levels for col in cols))
+    data = df[group_cols + [income, weight]]
+    data = data[data[income].notna() & data[weight].notna() & (data[weight] > 0)]
+    incomes = data[income].to_numpy(np.float64)
+    weights = data[weight].to_numpy(np.float64)
+    by_income = np.argsort(incomes, kind='stable')
+
+    results = []
+    for cols in levels:
+        valid = data[cols].notna().all(axis=1).to_numpy()
+        grouped = data[valid].groupby(cols, sort=True, observed=True)
+        # Rows with a missing group column keep code -1 and are left out of the order
+        codes = np.full(len(data), -1)
+        codes[valid] = grouped.ngroup().to_numpy()
+        order = by_income[codes[by_income] >= 0]
+        order = order[np.argsort(codes[order], kind='stable')]
+        groups = _SortedGroups(codes, incomes, weights, order)
+        keys = grouped.size().index.to_frame(index=False)
+        results.append(pd.concat([keys, _group_metrics(groups, quantiles, epsilons, replicates)], axis=1))
+    return results
+
+def _group_metrics(groups, quantiles, epsilons, replicates):
+    result = pd.DataFrame(index=pd.RangeIndex(len(groups.starts)))
+    for q in quantiles:
+        result[quantile_column(q)] = groups.quantile(q)
+
+    # Palma: top 10% over bottom 40% of the income; S80/S20: top 20% over bottom 20%
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['palma'] = (groups.total_income - groups.lorenz(0.9)) / groups.lorenz(0.4)
+        result['s80_s20'] = (groups.total_income - groups.lorenz(0.8)) / groups.lorenz(0.2)
+
+        positive = groups.income > 0
+        safe_income = np.where(positive, groups.income, 1.0)
+        positive_weight = groups.reduce(1.0, positive)
+        mean = groups.reduce(safe_income, positive) / positive_weight
+        ratio = safe_income / np.repeat(mean, groups.ends - groups.starts)
+        log_ratio = np.log(ratio)
+        result['theil_t'] = groups.reduce(ratio * log_ratio, positive) / positive_weight
+        result['theil_l'] = -groups.reduce(log_ratio, positive) / positive_weight
+        for epsilon in epsilons:
+            if epsilon == 1:
+                atkinson = 1 - np.exp(groups.reduce(log_ratio, positive) / positive_weight)
+            else:
+                atkinson = 1 - (groups.reduce(ratio ** (1 - epsilon), positive) / positive_weight) ** (1 / (1 - epsilon))
+            result[f'atkinson_{epsilon:g}'] = atkinson
+
+    if replicates:
+        errors = bootstrap_errors(groups, replicates)
+        result['gini_micro_se'] = errors[:, 0]
+        result['theil_t_se'] = errors[:, 1]
+    return result.replace([np.inf, -np.inf], np.nan)
@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import functools
+from datetime import datetime
+import psutil
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import LOGS_FOLDER
+from modules.manifest import save_manifest
+
+logger = logging.getLogger(__name__)
+
+# Every process of a pipeline run shares the run id through the environment (set by tasks.py)
+RUNS_FOLDER = os.path.join(LOGS_FOLDER, "runs")
+RUN_ID = os.environ.setdefault("INEQMX_RUN_ID", datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+# Seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Memory budget of the heavy stages, e.g. INEQMX_MAX_MEMORY=4G (set by --max-memory); unset runs fully in memory
+MEMORY_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+def parse_memory_size(text):
+    """Bytes of a size such as 4G, 512M, 1.5GB or 1000000."""
+    value = str(text).strip().upper().removesuffix("B").removesuffix("I")
+    unit = value[-1] if value and value[-1] in MEMORY_UNITS else ""
+    try:
+        return int(float(value[:len(value) - len(unit)]) * MEMORY_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid memory size: {text!r}") from None
+
+def memory_budget():
+    """Memory budget of this run in bytes, or None when the stages may use as much memory as they need."""
+    budget = os.environ.get("INEQMX_MAX_MEMORY")
+    return parse_memory_size(budget) if budget else None
+
+def set_memory_budget(text):
+    """Set the budget for this process and the pipeline scripts it starts."""
+    if text:
+        parse_memory_size(text)
+        os.environ["INEQMX_MAX_MEMORY"] = text
+
+def rows_per_chunk(row_bytes, fraction=0.1, budget=None):
+    """Rows of a chunk taking the given fraction of the budget, with row_bytes bytes per row in memory."""
+    budget = budget or memory_budget()
+    return max(1000, int(budget * fraction // max(row_bytes, 1)))
+
+def path_size(path):
+    """Size in bytes of a file, or of every file below a directory."""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+class _PeakRSS(threading.Thread):
+    """Background thread sampling the resident memory of the current process."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.interval = interval
+        self.start_rss = self.peak = self.process.memory_info().rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return self.peak
+
+class Stage:
+    """Wall time, CPU time, peak RSS, rows and bytes of one pipeline stage.
+
+    Use it as a context manager (``with Stage("clean_enco") as etapa:``) or call
+    start() and stop() around script-style code. Loaders and writers report their
+    work with record_read() and record_write(), which count toward every running stage.
+    A stage that raised ends with status "error", one that logged errors with status
+    "failed". When the outermost stage of a process ends with neither, the files it
+    recorded are saved as its manifest (modules/manifest.py).
+    """
+
+    _running = []
+    _lock = threading.Lock()
+
+    def __init__(self, name, run_id=None):
+        self.name = name
+        self.run_id = run_id or RUN_ID
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.status = "ok"
+        # Error records logged while the stage ran
+        self.errors = 0
+        # {path: (rows, dtypes)} of the recorded files, for the manifest
+        self.inputs = {}
+        self.outputs = {}
+
+    def start(self):
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._sampler = _PeakRSS()
+        self._sampler.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        # setup_logging replaces the handlers of the root logger, so the counter is added here
+        root = logging.getLogger()
+        if _error_counter not in root.handlers:
+            root.addHandler(_error_counter)
+        Stage._running.append(self)
+        return self
+
+    def stop(self):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        peak = self._sampler.stop()
+        if self in Stage._running:
+            Stage._running.remove(self)
+        if self.status == "ok" and self.errors:
+            self.status = "failed"
+
+        record = {
+            "run_id": self.run_id,
+            "stage": self.name,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "status": self.status,
+            "errors": self.errors,
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "peak_rss_mb": round(peak / 2**20, 1),
+            # Memory the stage itself added on top of what the process already held
+            "rss_growth_mb": round((peak - self._sampler.start_rss) / 2**20, 1),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written
+        }
+        budget = memory_budget()
+        if budget:
+            record["memory_budget_mb"] = round(budget / 2**20, 1)
+            if peak > budget:
+                logger.warning("Stage %s peaked at %s MB, over its %s MB memory budget", self.name,
+                               record["peak_rss_mb"], record["memory_budget_mb"])
+        save_stage_record(record)
+        logger.info("Stage %s: %s s wall, %s s CPU, %s MB peak, %s rows in, %s rows out", self.name,
+                    record['wall_s'], record['cpu_s'], record['peak_rss_mb'], self.rows_in, self.rows_out,
+                    extra={"stage_record": record})
+
+        # Sections of a script count toward its stage, which writes the manifest of all of them
+        if self.status == "ok" and not Stage._running and (self.inputs or self.outputs):
+            try:
+                save_manifest(self.name, self.run_id, self.inputs, self.outputs)
+            except Exception as e:
+                logger.error("Error saving the manifest of %s: %s", self.name, e)
+        return record
+
+    def record_files(self, inputs=None, outputs=None):
+        """Add files to the manifest; a path recorded again without rows or schema keeps what it had."""
+        with Stage._lock:
+            for files, recorded in [(inputs or {}, self.inputs), (outputs or {}, self.outputs)]:
+                for path, details in files.items():
+                    if path not in recorded or any(detail is not None for detail in details):
+                        recorded[path] = details
+
+    def add(self, rows_in=0, rows_out=0, bytes_read=0, bytes_written=0):
+        with Stage._lock:
+            self.rows_in += rows_in
+            self.rows_out += rows_out
+            self.bytes_read += bytes_read
+            self.bytes_written += bytes_written
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.status = "error"
+        self.stop()
+        return False
+
+def current_stage():
+    """Innermost running stage of this process, or None."""
+    return Stage._running[-1] if Stage._running else None
+
+class _ErrorCounter(logging.Handler):
+    """Counts the errors logged in this process toward the running stages.
+
+    The loaders and writers of the stages report a failure by logging an error and returning None
+    rather than raising, so an error record is what tells a failed stage from a complete one.
+    """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+
+    def emit(self, record):
+        for stage in list(Stage._running):
+            stage.errors += 1
+
+_error_counter = _ErrorCounter()
+
+def record_read(path, rows=None, nbytes=None, schema=None):
+    """Count a file (or directory) and its rows as input of the running stages.
+
+    schema (e.g. df.dtypes) gives the column types listed in the manifest.
+    """
+    if Stage._running:
+        nbytes = path_size(path) if nbytes is None else nbytes
+        # Nested stages (sections of a script) also count toward the stages around them
+        for stage in list(Stage._running):
+            stage.add(rows_in=rows or 0, bytes_read=nbytes)
+            stage.record_files(inputs={path: (rows, schema)})
+
+def record_write(path, rows=None, nbytes=None, schema=None):
+    """Count a written file (or directory) and its rows as output of the running stages."""
+    if Stage._running:
+        nbytes = path_size(path) if nbytes is None else nbytes
+        for stage in list(Stage._running):
+            stage.add(rows_out=rows or 0, bytes_written=nbytes)
+            stage.record_files(outputs={path: (rows, schema)})
+
+def instrumented(name):
+    """Decorator running a function inside a Stage of the given name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def run_folder(run_id=None):
+    return os.path.join(RUNS_FOLDER, run_id or RUN_ID)
+
+def save_stage_record(record):
+    """Append a stage record to the stages.jsonl file of its run."""
+    folder = run_folder(record["run_id"])
+    os.makedirs(folder, exist_ok=True)
+    # One write per line, so stages finishing in parallel processes do not interleave
+    with open(os.path.join(folder, "stages.jsonl"), 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+def load_stage_records(run_id):
+    path = os.path.join(run_folder(run_id), "stages.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def list_runs():
+    """Run ids with stage records, oldest first."""
+    if not os.path.isdir(RUNS_FOLDER):
+        return []
+    started = {}
+    for run in os.listdir(RUNS_FOLDER):
+        records = load_stage_records(run)
+        if records:
+            started[run] = min(record["started_at"] for record in records)
+    return sorted(started, key=started.get)
+
+def summarize_stages(records):
+    """Aggregate the records of a run by stage name (a stage may run in several processes)."""
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(record["stage"], {
+            "runs": 0, "status": "ok", "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+            "rows_in": 0, "rows_out": 0, "bytes_read": 0, "bytes_written": 0
+        })
+        stage["runs"] += 1
+        if record["status"] != "ok":
+            stage["status"] = record["status"]
+        for key in ["wall_s", "cpu_s", "rows_in", "rows_out", "bytes_read", "bytes_written"]:
+            stage[key] += record[key]
+        stage["peak_rss_mb"] = max(stage["peak_rss_mb"], record["peak_rss_mb"])
+        if record.get("memory_budget_mb"):
+            stage["memory_budget_mb"] = record["memory_budget_mb"]
+    return stages
+
+def build_run_report(run_id=None, previous_run_id=None):
+    """Write report.json for a run, compared with the previous run, and return it."""
+    run_id = run_id or RUN_ID
+    if previous_run_id is None:
+        runs = list_runs()
+        earlier = runs[:runs.index(run_id)] if run_id in runs else runs
+        previous_run_id = earlier[-1] if earlier else None
+
+    report = {
+        "run_id": run_id,
+        "previous_run_id": previous_run_id,
+        "stages": summarize_stages(load_stage_records(run_id)),
+        "previous_stages": summarize_stages(load_stage_records(previous_run_id)) if previous_run_id else {}
+    }
+    with open(os.path.join(run_folder(run_id), "report.json"), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def _change(current, previous):
+    if not previous:
+        return ""
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+def format_run_report(report):
+    """Human-readable table of a run report, with wall time and peak memory changes."""
+    lines = [f"Run {report['run_id']}" +
+             (f" (compared with {report['previous_run_id']})" if report['previous_run_id'] else "")]
+    header = f"{'stage':<24}{'wall s':>9}{'cpu s':>9}{'peak MB':>9}{'rows in':>12}{'rows out':>12}" \
+             f"{'MB read':>9}{'MB out':>9}{'Δ wall':>8}{'Δ peak':>8}"
+    lines += [header, "-" * len(header)]
+    for name, stage in report["stages"].items():
+        previous = report["previous_stages"].get(name, {})
+        lines.append(
+            f"{name:<24}{stage['wall_s']:>9.1f}{stage['cpu_s']:>9.1f}{stage['peak_rss_mb']:>9.0f}"
+            f"{stage['rows_in']:>12,}{stage['rows_out']:>12,}"
+            f"{stage['bytes_read'] / 2**20:>9.1f}{stage['bytes_written'] / 2**20:>9.1f}"
+            f"{_change(stage['wall_s'], previous.get('wall_s')):>8}"
+            f"{_change(stage['peak_rss_mb'], previous.get('peak_rss_mb')):>8}"
+            + ("" if stage["status"] == "ok" else f"  [{stage['status']}]")
+            + ("  [over budget]" if stage['peak_rss_mb'] > stage.get('memory_budget_mb', float('inf')) else "")
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the stage measurements of a pipeline run.")
+    parser.add_argument("run_id", nargs="?", help="Run to report (default: the latest one)")
+    parser.add_argument("--compare", help="Run to compare with (default: the run before it)")
+    args = parser.parse_args()
+
+    # Default to the run of the calling pipeline (INEQMX_RUN_ID), else the latest recorded one
+    runs = list_runs()
+    run_id = args.run_id or (RUN_ID if RUN_ID in runs else (runs[-1] if runs else None))
+    if run_id is None:
+        sys.exit(f"No runs recorded in {RUNS_FOLDER}")
+    report = build_run_report(run_id, args.compare)
+    summary = format_run_report(report)
+    with open(os.path.join(run_folder(run_id), "summary.txt"), 'w') as f:
+        f.write(summary + "\n")
+    print(summary)
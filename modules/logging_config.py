@@ -0,0 +1,157 @@
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.instrumentation import RUN_ID, run_folder
+
+# Level of every process of a run, e.g. INEQMX_LOG_LEVEL=DEBUG for the per-column dumps
+LOG_LEVEL = os.environ.get("INEQMX_LOG_LEVEL", "INFO")
+
+# Each log file rotates at LOG_MAX_BYTES and keeps LOG_BACKUP_COUNT older files
+LOG_MAX_BYTES = 5 * 2**20
+LOG_BACKUP_COUNT = 3
+
+# Records below WARNING with the same message template are kept this many times per logger
+# and stage, then dropped
+LOG_REPEAT_LIMIT = 50
+
+# Attributes every LogRecord has; anything else was passed through extra= and goes to the JSON record
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_log_path = None
+_log_queue = None
+_repeat_filter = None
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the time, level, origin, run id, message and extra fields."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "run_id": RUN_ID,
+            "pid": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class RepeatFilter(logging.Filter):
+    """Drop records whose message template was already logged LOG_REPEAT_LIMIT times by the same logger.
+
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, limit=LOG_REPEAT_LIMIT):
+        super().__init__()
+        self.limit = limit
+        self.counts = {}
+
+    def reset(self):
+        self.counts.clear()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else type(record.msg))
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count == self.limit:
+            record.suppressed = f"further '{key[2]}' messages are dropped"
+        return count <= self.limit
+
+class _QueueHandler(QueueHandler):
+    """Queue handler that renders the message in the calling thread but keeps the traceback apart."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+class lazy:
+    """Defer an expensive log argument (e.g. lazy(df.describe)) until the record is actually emitted."""
+
+    def __init__(self, func, *args, **kwargs):
+        self.func, self.args, self.kwargs = func, args, kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+def log_path(name, run_id=None):
+    """JSON lines log file of a pipeline script within its run folder."""
+    return os.path.join(run_folder(run_id), f"{name}.log.jsonl")
+
+def _start_listener(log_queue, path):
+    """Listener thread writing the queued records to a rotating JSON lines file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def setup_logging(name, level=None):
+    """Send the logs of this process to the run folder through a background queue listener.
+
+    Only the entry point of a process calls this (modules just use logging.getLogger(__name__)),
+    so importing several pipeline modules in one process no longer fights over the root logger.
+    Calling it again with the same name returns the same file; another name (the next stage of
+    a chained modules.cli run) flushes the records so far and sends the following ones to its file,
+    with the repeated-message counts starting over. Every call sets the level.
+    """
+    global _listener, _log_path, _log_queue, _repeat_filter
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+    path = log_path(name)
+    if _listener is not None:
+        if path != _log_path:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _repeat_filter.reset()
+            _listener = _start_listener(_log_queue, path)
+            _log_path = path
+        return _log_path
+
+    # Callers only enqueue the record; formatting and file writes happen in the listener thread
+    _log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(_log_queue)
+    _repeat_filter = RepeatFilter()
+    queue_handler.addFilter(_repeat_filter)
+
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # Third-party libraries stay at warnings even when the pipeline runs at DEBUG
+    for library in ["urllib3", "fiona", "pyogrio", "matplotlib", "asyncio"]:
+        logging.getLogger(library).setLevel(logging.WARNING)
+
+    _listener = _start_listener(_log_queue, path)
+    _log_path = path
+    atexit.register(shutdown_logging)
+    return _log_path
+
+def shutdown_logging():
+    """Flush the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,259 @@
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import MANIFEST_PATH, MANIFEST_HASH_WORKERS, PUBLISH_VERSIONS_PATH
+from modules.raw_files import INDEX_FILE, find_member, open_raw, raw_sha256
+
+logger = logging.getLogger(__name__)
+
+# Files of a recorded directory that are not data
+IGNORED_FILES = {".gitkeep", INDEX_FILE}
+
+def manifest_path(name):
+    return os.path.join(MANIFEST_PATH, f"{name}.json")
+
+def load_manifest(name):
+    try:
+        with open(manifest_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_manifests():
+    """Manifests of every stage, oldest first."""
+    if not os.path.isdir(MANIFEST_PATH):
+        return []
+    manifests = [load_manifest(f[:-len(".json")]) for f in os.listdir(MANIFEST_PATH) if f.endswith(".json")]
+    return sorted((m for m in manifests if m), key=lambda m: m["created"])
+
+def live_path(path):
+    """Path relative to the working directory; a file in a publication's staging folder maps to its live path."""
+    if path.startswith(("http://", "https://")):
+        return path
+    parts = os.path.relpath(os.path.abspath(path), PUBLISH_VERSIONS_PATH).split(os.sep)
+    # <versions>/<stage>/<version>[.staging]/<live path>
+    if parts[0] != os.pardir and len(parts) > 2:
+        return os.path.join(*parts[2:])
+    return os.path.relpath(os.path.abspath(path))
+
+def _location(path):
+    """(size, mtime_ns, archive) of a file, extracted or stored in a downloaded archive, or None."""
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns, None
+    found = find_member(path)
+    if found is None:
+        return None
+    archive, _, size = found
+    return size, os.stat(archive).st_mtime_ns, os.path.relpath(archive)
+
+def _schema(path, dtypes=None):
+    """Column types recorded by the stage, else read from the file: Parquet types, CSV header names."""
+    if dtypes is not None:
+        return {str(column): str(dtype) for column, dtype in dtypes.items()}
+    try:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            return {field.name: str(field.type) for field in pq.read_schema(path)}
+        if path.lower().endswith(".csv"):
+            with open_raw(path) as f:
+                header = f.readline().decode("utf-8", errors="replace").lstrip("\ufeff")
+            return {column: None for column in next(csv.reader([header]), [])}
+    except Exception as e:
+        logger.debug("No schema for %s: %s", path, e)
+    return None
+
+def describe(path, rows=None, dtypes=None):
+    """Manifest entries of a recorded path (one per file below a directory), without their hashes."""
+    if path.startswith(("http://", "https://")):
+        return [{"path": path}]
+    path = live_path(path)
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names if f not in IGNORED_FILES)
+        return [entry for f in files for entry in describe(f)]
+    location = _location(path)
+    if location is None:
+        return [{"path": path, "missing": True}]
+    size, mtime_ns, archive = location
+    entry = {"path": path, "size": size, "mtime_ns": mtime_ns, "rows": rows,
+             "schema": _schema(path, dtypes)}
+    if archive:
+        entry["archive"] = archive
+    return [entry]
+
+def _known_hashes(manifests):
+    """{(path, size, mtime_ns): sha256} of every file listed in the manifests."""
+    known = {}
+    for manifest in manifests:
+        for entry in manifest["inputs"] + manifest["outputs"]:
+            if entry.get("sha256"):
+                known[(entry["path"], entry.get("size"), entry.get("mtime_ns"))] = entry["sha256"]
+    return known
+
+def file_sha256(path):
+    """SHA-256 of a file, taken from a manifest when one lists the file with its current size and mtime."""
+    location = _location(path)
+    if location is not None:
+        sha = _known_hashes(load_manifests()).get((live_path(path), location[0], location[1]))
+        if sha:
+            return sha
+    return raw_sha256(path)
+
+def hash_entries(entries, known=None, workers=MANIFEST_HASH_WORKERS):
+    """Add the SHA-256 of every file entry, reusing known hashes of unchanged files.
+
+    The remaining files are streamed in chunks on a thread pool; hashlib releases the GIL while
+    hashing, so the threads hash different files in parallel.
+    """
+    known = known or {}
+    pending = {}
+    for entry in entries:
+        if "size" not in entry:
+            continue
+        key = (entry["path"], entry["size"], entry["mtime_ns"])
+        if key in known:
+            entry["sha256"] = known[key]
+        else:
+            pending.setdefault(key, []).append(entry)
+    if pending:
+        keys = list(pending)
+        with ThreadPoolExecutor(workers) as pool:
+            for key, digest in zip(keys, pool.map(raw_sha256, [key[0] for key in keys])):
+                for entry in pending[key]:
+                    entry["sha256"] = digest
+    return len(pending)
+
+def build_manifest(name, run_id, inputs, outputs):
+    """Manifest of a stage run from its recorded {path: (rows, dtypes)} inputs and outputs."""
+    manifests = load_manifests()
+    input_entries = [entry for path, (rows, dtypes) in inputs.items() for entry in describe(path, rows, dtypes)]
+    output_entries = [entry for path, (rows, dtypes) in outputs.items() for entry in describe(path, rows, dtypes)]
+    hashed = hash_entries(input_entries + output_entries, _known_hashes(manifests))
+
+    # The stage that last wrote each input (for a file inside an archive, the stage that wrote the archive)
+    producers = {}
+    for manifest in manifests:
+        if manifest["stage"] != name:
+            for entry in manifest["outputs"]:
+                producers[entry["path"]] = (manifest, entry)
+    for entry in input_entries:
+        found = producers.get(entry["path"]) or producers.get(entry.get("archive"))
+        if found:
+            manifest, produced = found
+            entry["upstream"] = {"stage": manifest["stage"], "run_id": manifest["run_id"],
+                                 "path": produced["path"], "sha256": produced.get("sha256")}
+
+    # Files an earlier run of the stage recorded and this one did not touch (months an incremental
+    # run skipped, archives already downloaded) are still part of the stage while they are unchanged
+    previous = load_manifest(name) or {"inputs": [], "outputs": []}
+    for kind, entries in [("inputs", input_entries), ("outputs", output_entries)]:
+        # Rows of a file recorded without them (e.g. read inside a memoized function that hit the cache)
+        earlier = {(entry["path"], entry.get("size"), entry.get("mtime_ns")): entry for entry in previous[kind]}
+        for entry in entries:
+            match = earlier.get((entry["path"], entry.get("size"), entry.get("mtime_ns")))
+            if match and entry.get("rows") is None:
+                entry["rows"] = match.get("rows")
+        recorded = {entry["path"] for entry in entries}
+        entries.extend(entry for entry in previous[kind] if entry["path"] not in recorded
+                       and "size" in entry and not _changed_on_disk(entry))
+    upstream_runs = {}
+    for entry in input_entries:
+        if "upstream" in entry:
+            upstream_runs.setdefault(entry["upstream"]["stage"], set()).add(entry["upstream"]["run_id"])
+
+    manifest = {
+        "stage": name,
+        "run_id": run_id,
+        "created": datetime.now().isoformat(timespec='seconds'),
+        # Runs of the stages that produced the inputs, e.g. {"clean_enigh": ["20240105_101500"]}
+        "upstream_runs": {stage: sorted(runs) for stage, runs in sorted(upstream_runs.items())},
+        "inputs": input_entries,
+        "outputs": output_entries
+    }
+    return manifest, hashed
+
+def save_manifest(name, run_id, inputs, outputs):
+    """Write the manifest of a stage run, replacing the previous one of the stage."""
+    manifest, hashed = build_manifest(name, run_id, inputs, outputs)
+    os.makedirs(MANIFEST_PATH, exist_ok=True)
+    temporary_path = f"{manifest_path(name)}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporary_path, manifest_path(name))
+    logger.info("Manifest of %s saved at %s (%s inputs, %s outputs, %s files hashed)", name, manifest_path(name),
+                len(manifest["inputs"]), len(manifest["outputs"]), hashed)
+    return manifest
+
+def _changed_on_disk(entry):
+    location = _location(entry["path"])
+    return location is None or (location[0], location[1]) != (entry["size"], entry["mtime_ns"])
+
+def stale_reasons(name):
+    """Why the outputs of a stage are out of date, from the manifests alone; empty when they are fresh.
+
+    An input is stale when the manifest of the stage that produced it now lists another hash for
+    it, or when the file no longer matches the size and modification time that manifest lists;
+    a rerun writing the same content keeps the stages below it fresh. Inputs no stage produced
+    are compared by size and modification time. An output is stale when it was replaced or
+    removed since the stage wrote it (e.g. by a rollback).
+    """
+    manifest = load_manifest(name)
+    if manifest is None:
+        return [(name, "no manifest")]
+    reasons = []
+    for entry in manifest["inputs"]:
+        if entry.get("missing") or "size" not in entry:
+            continue
+        upstream = entry.get("upstream")
+        if upstream:
+            producer = load_manifest(upstream["stage"]) or {"outputs": []}
+            current = next((o for o in producer["outputs"] if o["path"] == upstream["path"]), None)
+            if current is None:
+                reasons.append((entry["path"], f"no longer produced by {upstream['stage']}"))
+            elif current.get("sha256") != upstream["sha256"]:
+                reasons.append((entry["path"], f"changed by {upstream['stage']} run {producer['run_id']}"))
+            elif _changed_on_disk(current):
+                reasons.append((entry["path"], f"replaced since {upstream['stage']} wrote it"))
+        elif _changed_on_disk(entry):
+            reasons.append((entry["path"], "changed on disk"))
+    for entry in manifest["outputs"]:
+        if not entry.get("missing") and _changed_on_disk(entry):
+            reasons.append((entry["path"], "output replaced or removed"))
+    return reasons
+
+def is_fresh(name):
+    return not stale_reasons(name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the data manifests of the pipeline stages or check their freshness.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show", help="Print the manifest of a stage")
+    show_parser.add_argument("stage")
+    check_parser = subparsers.add_parser("check", help="Whether the outputs of every stage (or the given ones) are up to date")
+    check_parser.add_argument("stages", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        manifest = load_manifest(args.stage)
+        if manifest is None:
+            sys.exit(f"No manifest for {args.stage} in {MANIFEST_PATH}")
+        print(json.dumps(manifest, indent=2))
+    else:
+        stale = False
+        for name in args.stages or [manifest["stage"] for manifest in load_manifests()]:
+            reasons = stale_reasons(name)
+            stale = stale or bool(reasons)
+            print(f"{name}: {'stale' if reasons else 'fresh'}")
+            for path, reason in reasons:
+                print(f"  {path}: {reason}")
+        sys.exit(1 if stale else 0)
@@ -0,0 +1,383 @@
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import logging
+import argparse
+import functools
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import MEMO_CACHE_PATH, MEMO_MAX_BYTES
+from modules.manifest import file_sha256
+from modules.instrumentation import current_stage
+
+logger = logging.getLogger(__name__)
+
+def memo_enabled():
+    """INEQMX_MEMO=0 turns every memoized function back into a plain call."""
+    return os.environ.get("INEQMX_MEMO", "1") != "0"
+
+def _update_values(digest, series):
+    """Feed the values of a column to the digest; geometries as WKB, unhashable objects pickled."""
+    if series.dtype.name == 'geometry':
+        import shapely
+        for wkb in shapely.to_wkb(np.asarray(series.values)):
+            digest.update(wkb or b"")
+        return
+    try:
+        digest.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    except TypeError:
+        digest.update(pickle.dumps(series.to_numpy(), protocol=4))
+
+def _update_index(digest, index):
+    digest.update(repr((type(index).__name__, list(index.names), str(index.dtype))).encode())
+    if isinstance(index, pd.RangeIndex):
+        digest.update(repr((index.start, index.stop, index.step)).encode())
+    else:
+        digest.update(pd.util.hash_pandas_object(index).to_numpy().tobytes())
+
+def update_fingerprint(digest, value):
+    """Feed the content of an argument to the digest.
+
+    DataFrames and Series are hashed by value (index, column names, dtypes, values and the CRS of
+    geographic frames), so an equal copy read again from disk gives the same fingerprint. Other
+    values go by their repr, which is enough for the strings, numbers and lists functions take as
+    parameters.
+    """
+    if isinstance(value, pd.DataFrame):
+        # WKT, because str() of a CRS read back from GeoParquet is PROJJSON rather than the EPSG code it was set with
+        crs = getattr(value, 'crs', None)
+        digest.update(repr((type(value).__name__, [(str(column), str(dtype)) for column, dtype in value.dtypes.items()],
+                            crs.to_wkt() if crs is not None else None)).encode())
+        _update_index(digest, value.index)
+        for position in range(value.shape[1]):
+            _update_values(digest, value.iloc[:, position])
+    elif isinstance(value, pd.Series):
+        digest.update(repr(("Series", str(value.name), str(value.dtype))).encode())
+        _update_index(digest, value.index)
+        _update_values(digest, value)
+    elif isinstance(value, pd.Index):
+        _update_index(digest, value)
+    elif isinstance(value, np.ndarray):
+        digest.update(repr(("ndarray", str(value.dtype), value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else pickle.dumps(value, protocol=4))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}".encode())
+        for item in value:
+            update_fingerprint(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        update_fingerprint(digest, sorted(value, key=repr))
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}".encode())
+        for key in sorted(value, key=repr):
+            digest.update(repr(key).encode())
+            update_fingerprint(digest, value[key])
+    else:
+        digest.update(f"{type(value).__name__}:{value!r}".encode())
+
+def fingerprint(value):
+    """SHA-256 of the content of a value, as used in the cache keys."""
+    digest = hashlib.sha256()
+    update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+def _function_name(func):
+    """module.function, with the module as its file name so a script run directly and imported match."""
+    module = func.__module__
+    if module == "__main__":
+        try:
+            module = os.path.splitext(os.path.basename(inspect.getfile(func)))[0]
+        except TypeError:
+            pass
+    return f"{module.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+def _source(func):
+    """Source code of a function, or its bytecode when the source is not available."""
+    try:
+        return inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        return func.__code__.co_code + repr(func.__code__.co_consts).encode()
+
+def _code_objects(code):
+    """A code object and the ones nested in its constants (comprehensions, lambdas, inner functions)."""
+    yield code
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            yield from _code_objects(const)
+
+def _global_names(func):
+    return sorted({name for code in _code_objects(func.__code__) for name in code.co_names})
+
+def _is_project_function(value, func):
+    """Whether value is a plain function of the same module as func or of a project module."""
+    if not inspect.isfunction(value):
+        return False
+    if value.__module__ == func.__module__:
+        return True
+    try:
+        path = os.path.abspath(inspect.getfile(value))
+    except TypeError:
+        return False
+    return path.startswith(project_root + os.sep) and "site-packages" not in path
+
+def _dependencies(func):
+    """{name: function} of the project functions a function calls, directly or through the ones it calls."""
+    found = {}
+    pending = [func]
+    while pending:
+        current = pending.pop()
+        for name in _global_names(current):
+            value = current.__globals__.get(name)
+            if not _is_project_function(value, func):
+                continue
+            # A memoized helper counts by the function it wraps
+            value = inspect.unwrap(value)
+            dependency = _function_name(value)
+            if value is not func and dependency not in found:
+                found[dependency] = value
+                pending.append(value)
+    return found
+
+# Types of the module-level constants (column lists, mappings, CRS names...) that count as part of a function
+_CONSTANT_TYPES = (str, int, float, bool, tuple, list, dict, set, frozenset, type(None))
+
+def _constants(func):
+    """Module-level constants a function reads, which change its result as much as its source does."""
+    return {name: func.__globals__[name] for name in _global_names(func)
+            if name in func.__globals__ and isinstance(func.__globals__[name], _CONSTANT_TYPES)}
+
+def cache_key(name, func, arguments, files=(), version=None):
+    """Key of a call: the function name, source and constants and the fingerprint of every argument.
+
+    The source and constants of the project functions it calls (e.g. a helper defined next to it)
+    are part of the key too, as is version, which callers bump for changes the key cannot see
+    (attributes of modules, methods of objects). Arguments named in files are paths, fingerprinted
+    by the SHA-256 of the file content (read from the data manifests when one lists the file
+    unchanged).
+    """
+    digest = hashlib.sha256()
+    digest.update(name.encode())
+    digest.update(repr(version).encode())
+    digest.update(_source(func))
+    update_fingerprint(digest, _constants(func))
+    for dependency, dependency_func in sorted(_dependencies(func).items()):
+        digest.update(dependency.encode())
+        digest.update(_source(dependency_func))
+        update_fingerprint(digest, _constants(dependency_func))
+    for parameter, value in arguments.items():
+        digest.update(parameter.encode())
+        if parameter in files:
+            digest.update(file_sha256(value).encode() if os.path.exists(value) else b"missing")
+        else:
+            update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+class DiskCache:
+    """Results of memoized calls, one entry per key, evicted least recently used first.
+
+    An entry is <key>.json (function, creation time, size and parts) plus one file per part of the
+    result: DataFrames are written as Parquet (GeoParquet for GeoDataFrames) and anything Parquet
+    cannot hold is pickled. Tuples and lists are stored part by part. The modification time of the
+    JSON file is the last use of the entry. Files are written under temporary names and renamed,
+    so concurrent processes sharing the folder never read half an entry.
+    """
+
+    def __init__(self, folder=MEMO_CACHE_PATH, max_bytes=MEMO_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def _meta_path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _write_part(self, value, base):
+        temporary = f"{base}.{os.getpid()}.tmp"
+        if isinstance(value, pd.DataFrame):
+            try:
+                value.to_parquet(temporary)
+                os.replace(temporary, base + ".parquet")
+                return {"file": os.path.basename(base) + ".parquet",
+                        "format": "geoparquet" if type(value).__name__ == "GeoDataFrame" else "parquet"}
+            except Exception as e:
+                # e.g. non-string column names or mixed-type object columns
+                logger.debug("Parquet cannot hold %s (%s), pickling it", base, e)
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+        with open(temporary, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, base + ".pkl")
+        return {"file": os.path.basename(base) + ".pkl", "format": "pickle"}
+
+    def _read_part(self, part):
+        path = os.path.join(self.folder, part["file"])
+        if part["format"] == "geoparquet":
+            import geopandas as gpd
+            return gpd.read_parquet(path)
+        if part["format"] == "parquet":
+            return pd.read_parquet(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def get(self, key):
+        """(True, value) of a stored entry, marking it as just used, or (False, None)."""
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            parts = [self._read_part(part) for part in meta["parts"]]
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logger.warning("Dropping unreadable cache entry %s: %s", key, e)
+            self.remove(key)
+            return False, None
+        os.utime(meta_path)
+        if meta["container"] is None:
+            return True, parts[0]
+        return True, tuple(parts) if meta["container"] == "tuple" else parts
+
+    def put(self, key, value, name):
+        """Store the result of a call, then evict old entries beyond the size limit."""
+        os.makedirs(self.folder, exist_ok=True)
+        base = os.path.join(self.folder, key)
+        if isinstance(value, (tuple, list)):
+            container = type(value).__name__
+            parts = [self._write_part(part, f"{base}.{i}") for i, part in enumerate(value)]
+        else:
+            container = None
+            parts = [self._write_part(value, base)]
+        size = sum(os.path.getsize(os.path.join(self.folder, part["file"])) for part in parts)
+        meta = {"name": name, "created": datetime.now().isoformat(timespec='seconds'), "size": size,
+                "container": container, "parts": parts}
+        temporary = f"{self._meta_path(key)}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temporary, self._meta_path(key))
+        self.evict()
+
+    def remove(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                files = [part["file"] for part in json.load(f)["parts"]]
+        except (OSError, ValueError, KeyError):
+            files = [name for name in os.listdir(self.folder) if name.startswith(key + ".")]
+        for name in files + [f"{key}.json"]:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        """Metadata of every entry with its key and last use, least recently used first."""
+        if not os.path.isdir(self.folder):
+            return []
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+                meta["last_used"] = os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue
+            meta["key"] = name[:-len(".json")]
+            entries.append(meta)
+        return sorted(entries, key=lambda meta: meta["last_used"])
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(meta["size"] for meta in entries)
+        for meta in entries:
+            if total <= self.max_bytes:
+                break
+            logger.info("Evicting cached %s (%.1f MB, last used %s)", meta["name"], meta["size"] / 2**20,
+                        datetime.fromtimestamp(meta["last_used"]).isoformat(timespec='seconds'))
+            self.remove(meta["key"])
+            total -= meta["size"]
+
+    def purge(self, name=None, older_than_days=None):
+        """Remove the entries of one function (or all) last used more than older_than_days ago (or any)."""
+        removed = []
+        for meta in self.entries():
+            if name is not None and meta["name"] != name:
+                continue
+            if older_than_days is not None and time.time() - meta["last_used"] < older_than_days * 86400:
+                continue
+            self.remove(meta["key"])
+            removed.append(meta)
+        return removed
+
+def memoize(name=None, files=(), cache=None, version=None):
+    """Cache the results of a function on disk, keyed by its source and the content of its arguments.
+
+    A call with the same source code (its own and that of the project functions it calls) and equal
+    arguments (DataFrames are compared by content) loads the stored result instead of running the
+    function, across runs and between the pipeline and the notebooks. Parameters listed in files are
+    file paths, compared by the content of the file. Changing version drops the stored results.
+    Results that are None (the pipeline's way of reporting a failure) are not stored, nor are those of
+    a call that logged an error in the running stage.
+    """
+    def decorator(func):
+        function_name = name or _function_name(func)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not memo_enabled():
+                return func(*args, **kwargs)
+            store = cache or DiskCache()
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            started = time.perf_counter()
+            key = cache_key(function_name, func, arguments.arguments, files, version)
+            found, value = store.get(key)
+            if found:
+                logger.info("%s loaded from the cache in %.2f s (key %s)", function_name,
+                            time.perf_counter() - started, key[:12])
+                return value
+            stage = current_stage()
+            errors = stage.errors if stage is not None else 0
+            value = func(*args, **kwargs)
+            if value is not None and (stage is None or stage.errors == errors):
+                store.put(key, value, function_name)
+            return value
+
+        return wrapper
+    return decorator
+
+def format_entries(entries):
+    lines = [f"{'last used':<20}{'MB':>9}  {'key':<13}function"]
+    for meta in entries:
+        lines.append(f"{datetime.fromtimestamp(meta['last_used']).isoformat(sep=' ', timespec='seconds'):<20}"
+                     f"{meta['size'] / 2**20:>9.1f}  {meta['key'][:12]:<13}{meta['name']}")
+    lines.append(f"{len(entries)} entries, {sum(meta['size'] for meta in entries) / 2**20:.1f} MB")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or purge the disk cache of memoized pipeline functions.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="Entries, least recently used first")
+    list_parser.add_argument("--name", help="Only the entries of this function, e.g. data_clean_censo.transform_censo_data")
+    purge_parser = subparsers.add_parser("purge", help="Remove entries (all of them without filters)")
+    purge_parser.add_argument("--name", help="Only the entries of this function")
+    purge_parser.add_argument("--older-than", type=float, help="Only entries not used in this many days")
+    args = parser.parse_args()
+
+    disk_cache = DiskCache()
+    if args.command == "list":
+        print(f"Cache at {disk_cache.folder} (limit {disk_cache.max_bytes / 2**20:.0f} MB)")
+        print(format_entries([meta for meta in disk_cache.entries() if args.name in (None, meta["name"])]))
+    else:
+        removed = disk_cache.purge(args.name, args.older_than)
+        print(f"Removed {len(removed)} entries, {sum(meta['size'] for meta in removed) / 2**20:.1f} MB")
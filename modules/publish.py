@@ -0,0 +1,275 @@
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+from datetime import datetime
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import PUBLISH_VERSIONS_PATH, PUBLISH_KEEP_VERSIONS
+from modules.instrumentation import RUN_ID, Stage
+
+logger = logging.getLogger(__name__)
+
+# Inside every version folder: the stage, run id, creation time and files of the version
+VERSION_FILE = "version.json"
+
+def stage_folder(name):
+    return os.path.join(PUBLISH_VERSIONS_PATH, name)
+
+def remove_tree(path):
+    """Delete a folder by renaming it out of the way first, so nobody sees it half deleted."""
+    if not os.path.exists(path):
+        return
+    trash = f"{path}.{os.getpid()}.trash"
+    os.replace(path, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+
+def _atomic_write(path, text):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+def _copy(source, target):
+    """Replace target by a copy of source (same size and modification time) in one rename.
+
+    A copy rather than a hard link: code writing the live file in place (a notebook's to_csv, a
+    cleaner function called outside a publication) must not change the retained version too.
+    """
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.publish"
+    shutil.copy2(source, temporary)
+    os.replace(temporary, target)
+
+def list_versions(name):
+    """Metadata of the versions of a stage, oldest first."""
+    folder = stage_folder(name)
+    if not os.path.isdir(folder):
+        return []
+    versions = []
+    for version in os.listdir(folder):
+        try:
+            with open(os.path.join(folder, version, VERSION_FILE)) as f:
+                versions.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(versions, key=lambda meta: (meta["created"], meta["version"]))
+
+def current_version(name):
+    try:
+        with open(os.path.join(stage_folder(name), "current")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _publish(name, version, sources):
+    """Copy the files of the given versions to the live paths, then record version as current.
+
+    A marker file lists the copies while they are being made, so a publication interrupted halfway
+    is completed by the next publication of the stage (see recover()).
+    """
+    marker = os.path.join(stage_folder(name), "activating")
+    _atomic_write(marker, json.dumps({"version": version, "sources": sources}))
+    for path, source in sources.items():
+        _copy(os.path.join(stage_folder(name), source, path), path)
+    _atomic_write(os.path.join(stage_folder(name), "current"), version)
+    os.remove(marker)
+
+def activate(name, version, files=None):
+    """Make the live files copies of the files of a version."""
+    if files is None:
+        with open(os.path.join(stage_folder(name), version, VERSION_FILE)) as f:
+            files = json.load(f)["files"]
+    _publish(name, version, {path: version for path in files})
+
+def recover(name):
+    """Finish a publication or rollback left halfway by a crash."""
+    marker = os.path.join(stage_folder(name), "activating")
+    if os.path.exists(marker):
+        with open(marker) as f:
+            pending = json.load(f)
+        logger.warning("Completing the interrupted publication of %s version %s", name, pending["version"])
+        _publish(name, pending["version"], pending["sources"])
+
+def prune(name, keep=PUBLISH_KEEP_VERSIONS):
+    """Delete the oldest versions of a stage beyond keep, never the current one."""
+    current = current_version(name)
+    versions = [meta["version"] for meta in list_versions(name)]
+    for version in versions[:max(len(versions) - keep, 0)]:
+        if version != current:
+            remove_tree(os.path.join(stage_folder(name), version))
+            logger.info("Removed %s version %s (keeping %s)", name, version, keep)
+
+def rollback(name, version=None):
+    """Publish an earlier version of a stage again, by default the one before the current version.
+
+    Every file written by a newer version goes back to the copy of the latest version up to the
+    target one that has it; files no retained version had before are left as they are.
+    """
+    versions = list_versions(name)
+    names = [meta["version"] for meta in versions]
+    current = current_version(name)
+    if version is None:
+        position = names.index(current) if current in names else len(names)
+        if position == 0:
+            raise ValueError(f"{name} has no version before {current}")
+        version = names[position - 1]
+    if version not in names:
+        raise ValueError(f"{name} has no version {version} (available: {', '.join(names)})")
+
+    target = names.index(version)
+    restored = {}
+    for meta in versions[:target + 1]:
+        for path in meta["files"]:
+            restored[path] = meta["version"]
+    for meta in versions[target + 1:]:
+        for path in meta["files"]:
+            if path not in restored:
+                logger.warning("No version of %s up to %s keeps %s; leaving it as it is", name, version, path)
+
+    recover(name)
+    _publish(name, version, restored)
+    logger.info("Rolled %s back to version %s", name, version)
+    return version
+
+class Publication:
+    """Outputs of one stage, written to a staging folder and published together as a version of the run.
+
+    While the publication is running, staged(path) gives the stage the path to write each output
+    to. commit() renames the staging folder to data/versions/<stage>/<run id> and then replaces
+    every live file by a copy of its new version with an atomic rename, so readers see the
+    previous complete file or the new one, never a partial write. A failed stage publishes
+    nothing: the publication is discarded when the stage raises, and commit() discards it when
+    the running stages logged errors (the loaders and writers log and return None instead of
+    raising). The previous PUBLISH_KEEP_VERSIONS versions are kept for rollback(). Use it as a
+    context manager, or call start() and commit() around script-style code.
+    """
+
+    _running = []
+
+    def __init__(self, name, run_id=None, keep=PUBLISH_KEEP_VERSIONS):
+        self.name = name
+        self.run_id = run_id or RUN_ID
+        self.keep = keep
+        self.files = set()
+        self.callbacks = []
+
+    def start(self):
+        recover(self.name)
+        os.makedirs(stage_folder(self.name), exist_ok=True)
+        # Staging folders of earlier runs that never committed
+        for entry in os.listdir(stage_folder(self.name)):
+            if entry.endswith(".staging"):
+                remove_tree(os.path.join(stage_folder(self.name), entry))
+        self.version = self.run_id
+        suffix = 1
+        while os.path.exists(os.path.join(stage_folder(self.name), self.version)):
+            suffix += 1
+            self.version = f"{self.run_id}.{suffix}"
+        self.staging = os.path.join(stage_folder(self.name), f"{self.version}.staging")
+        os.makedirs(self.staging)
+        Publication._running.append(self)
+        return self
+
+    def path(self, path, existing=False):
+        """Staging path of an output; with existing=True it starts as a copy of the live file (for appends)."""
+        relative = os.path.relpath(os.path.abspath(path))
+        if relative.startswith(os.pardir):
+            raise ValueError(f"{path} is outside the working directory and cannot be published")
+        staged_path = os.path.join(self.staging, relative)
+        os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+        if existing and relative not in self.files and os.path.exists(relative):
+            shutil.copyfile(relative, staged_path)
+        self.files.add(relative)
+        return staged_path
+
+    def commit(self):
+        """Publish the staged files and return the new version, or None if nothing was written or the stage failed."""
+        failed = [stage.name for stage in Stage._running if stage.errors]
+        if failed:
+            logger.warning("Errors were logged during %s", ", ".join(failed))
+            self.discard()
+            return None
+        self._stop()
+        files = sorted(os.path.relpath(os.path.join(root, f), self.staging)
+                       for root, _, names in os.walk(self.staging) for f in names)
+        if not files:
+            remove_tree(self.staging)
+            logger.info("%s wrote no outputs; nothing to publish", self.name)
+            return None
+        _atomic_write(os.path.join(self.staging, VERSION_FILE), json.dumps({
+            "stage": self.name, "version": self.version, "run_id": self.run_id,
+            "created": datetime.now().isoformat(timespec='seconds'), "files": files}, indent=2))
+        version_folder = os.path.join(stage_folder(self.name), self.version)
+        os.replace(self.staging, version_folder)
+        activate(self.name, self.version, files)
+        logger.info("Published %s version %s (%s files)", self.name, self.version, len(files))
+        for callback in self.callbacks:
+            callback()
+        prune(self.name, self.keep)
+        return self.version
+
+    def discard(self):
+        self._stop()
+        remove_tree(self.staging)
+        logger.warning("%s failed; its outputs were not published", self.name)
+
+    def _stop(self):
+        if self in Publication._running:
+            Publication._running.remove(self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+def staged(path, existing=False):
+    """Path to write an output to: in the staging folder of the running publication, else path itself."""
+    if Publication._running:
+        return Publication._running[-1].path(path, existing)
+    return path
+
+def on_commit(callback):
+    """Run callback once the running publication has made its outputs live, or now if none is running.
+
+    For state that describes the published files (e.g. the partition state of the incremental
+    ENCO cleaning), which must not be saved when the outputs are discarded.
+    """
+    if Publication._running:
+        Publication._running[-1].callbacks.append(callback)
+    else:
+        callback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or roll back the published versions of the pipeline stages.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="Versions of every stage (or one), oldest first")
+    list_parser.add_argument("stage", nargs="?")
+    rollback_parser = subparsers.add_parser("rollback", help="Publish an earlier version of a stage again")
+    rollback_parser.add_argument("stage")
+    rollback_parser.add_argument("--to", help="Version to publish (default: the one before the current)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        if args.stage:
+            stages = [args.stage]
+        else:
+            stages = sorted(os.listdir(PUBLISH_VERSIONS_PATH)) if os.path.isdir(PUBLISH_VERSIONS_PATH) else []
+        for name in stages:
+            current = current_version(name)
+            print(name)
+            for meta in list_versions(name):
+                mark = "*" if meta["version"] == current else " "
+                print(f"  {mark} {meta['version']:<22}{meta['created']:<22}{len(meta['files'])} files")
+    else:
+        print(f"{args.stage} is now at version {rollback(args.stage, args.to)}")
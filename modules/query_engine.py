@@ -0,0 +1,126 @@
+import os
+import sys
+import glob
+import duckdb
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import BASE_PROCESSED_DATA_PATH
+
+# Project tables by name, as paths relative to the data directory and without extension.
+# A Parquet file (or a directory of Parquet partitions) is preferred over the CSV when both exist,
+# as long as it was materialized from the current CSV.
+TABLES = {
+    "enco": "processed/enco/enco_processed_tidy",
+    "enco_grouped": "processed/enco/enco_grouped",
+    "enco_cube": "processed/enco/enco_cube",
+    "enigh": "processed/enigh/enigh_processed_tidy",
+    "censo": "processed/censo/censo_tidy_data",
+    "censo_ent": "processed/censo/censo_ent_tidy_data",
+    "censo_mun": "processed/censo/censo_mun_tidy_data",
+    "geo_estatales": "processed/geo/geo_estatales_*",
+    "geo_municipales": "processed/geo/geo_municipales_*",
+    "resultados_nacionales_enigh": "external/resultados_nacionales_enigh",
+    "resultados_estatales_enigh": "external/resultados_estatales_enigh",
+    "resultados_municipales_enigh": "external/resultados_municipales_enigh",
+    "resultados_nacionales_enco": "external/resultados_nacionales_enco",
+    "resultados_estatales_enco": "external/resultados_estatales_enco",
+    "resultados_municipales_enco": "external/resultados_municipales_enco",
+    "resultados_nacionales_merged": "external/dashboard/resultados_nacionales_merged",
+    "resultados_estatales_merged": "external/dashboard/resultados_estatales_merged",
+    "resultados_municipales_merged": "external/dashboard/resultados_municipales_merged",
+}
+
+# Data directory (data/) the table paths are relative to
+DATA_ROOT = os.path.dirname(BASE_PROCESSED_DATA_PATH)
+
+def _sql_string(value):
+    """Quote a value as a SQL string literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _csv_stamp(csv_path):
+    """Size and modification time of a CSV, as recorded in the Parquet copy made from it."""
+    stat = os.stat(csv_path)
+    return {"source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)}
+
+def _is_copy_of(parquet_path, csv_path):
+    """Check whether a Parquet file was materialized from the CSV as it is now.
+
+    The CSV's stamp is compared instead of the mtimes, since a rollback of a publication
+    puts back an older CSV with its older mtime behind a newer Parquet copy.
+    """
+    import pyarrow.parquet as pq
+    metadata = pq.read_metadata(parquet_path).metadata or {}
+    stamp = {key.decode(): value.decode() for key, value in metadata.items() if key.startswith(b"source_")}
+    return stamp == _csv_stamp(csv_path)
+
+def table_source(name, data_root=DATA_ROOT):
+    """Return the DuckDB table function reading a project table, or None if it has no data yet."""
+    base = os.path.join(data_root, TABLES[name])
+    if os.path.isdir(base):
+        # Partitioned Parquet directory (e.g. year=2022/month=01/...)
+        pattern = os.path.join(base, "**", "*.parquet")
+        return f"read_parquet({_sql_string(pattern)}, hive_partitioning = true, union_by_name = true)"
+    if "*" in base:
+        # One Parquet file per year (geo tables); the file name is exposed as a column
+        if glob.glob(base + ".parquet"):
+            return f"read_parquet({_sql_string(base + '.parquet')}, filename = true, union_by_name = true)"
+        return None
+    parquet_path, csv_path = base + ".parquet", base + ".csv"
+    if os.path.exists(parquet_path) and (not os.path.exists(csv_path) or _is_copy_of(parquet_path, csv_path)):
+        return f"read_parquet({_sql_string(parquet_path)})"
+    if os.path.exists(csv_path):
+        # Stale or missing Parquet copy: read the CSV until materialize_parquet is run again
+        return f"read_csv_auto({_sql_string(csv_path)}, sample_size = -1)"
+    return None
+
+def connect(database=":memory:", tables=None, data_root=DATA_ROOT):
+    """Open a DuckDB connection with the project tables registered as views.
+
+    Views read the files lazily, so column projections and WHERE filters in a query
+    are pushed down to the Parquet readers instead of loading whole tables.
+    """
+    con = duckdb.connect(database)
+    for name in tables or TABLES:
+        source = table_source(name, data_root)
+        if source is not None:
+            con.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM {source}")
+    return con
+
+def available_tables(con):
+    """List the project tables registered on a connection."""
+    return [row[0] for row in con.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()]
+
+def query(sql, params=None, con=None):
+    """Run a SQL query over the project tables and return the result as a DataFrame.
+
+    Without a connection, one is opened for the query and closed once the result is fetched.
+    """
+    if con is None:
+        with connect() as con:
+            return con.execute(sql, params or []).df()
+    return con.execute(sql, params or []).df()
+
+def materialize_parquet(tables=None, data_root=DATA_ROOT, compression="zstd"):
+    """Convert the CSV-only project tables to Parquet next to their CSV files."""
+    written = []
+    with duckdb.connect() as con:
+        for name in tables or TABLES:
+            base = os.path.join(data_root, TABLES[name])
+            if "*" in base or not os.path.exists(base + ".csv"):
+                continue
+            if os.path.exists(base + ".parquet") and _is_copy_of(base + ".parquet", base + ".csv"):
+                continue
+            stamp = ", ".join(f"{key}: {_sql_string(value)}" for key, value in _csv_stamp(base + ".csv").items())
+            con.execute(
+                f"COPY (SELECT * FROM read_csv_auto({_sql_string(base + '.csv')}, sample_size = -1)) "
+                f"TO {_sql_string(base + '.parquet')} (FORMAT PARQUET, COMPRESSION {compression}, KV_METADATA {{{stamp}}})"
+            )
+            written.append(base + ".parquet")
+    return written
+
+if __name__ == "__main__":
+    for path in materialize_parquet():
+        print(f"Saved {path}")
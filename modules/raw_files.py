@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import hashlib
+import zipfile
+import threading
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import BASE_RAW_DATA_PATH
+
+# Member list of the archives of a raw folder, so each ZIP central directory is read only once
+INDEX_FILE = ".zip_index.json"
+
+_indexes = {}
+_lock = threading.Lock()
+
+def _build_index(folder):
+    """Index the ZIP archives of a folder, reusing the entries of unchanged archives."""
+    index_path = os.path.join(folder, INDEX_FILE)
+    try:
+        with open(index_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    index, changed = {}, False
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".zip"):
+            continue
+        stat = os.stat(os.path.join(folder, name))
+        entry = previous.get(name)
+        if not entry or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            with zipfile.ZipFile(os.path.join(folder, name)) as archive:
+                members = {info.filename: info.file_size for info in archive.infolist() if not info.is_dir()}
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "members": members}
+            changed = True
+        index[name] = entry
+
+    if changed or set(index) != set(previous):
+        temporary_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temporary_path, index_path)
+    return index
+
+def archive_index(folder):
+    """{archive name: {member: uncompressed size}} of the ZIP archives stored in a folder."""
+    with _lock:
+        if folder not in _indexes:
+            _indexes[folder] = _build_index(folder) if os.path.isdir(folder) else {}
+        return {name: entry["members"] for name, entry in _indexes[folder].items()}
+
+def forget_indexes():
+    """Drop the in-process indexes (after archives were added or replaced)."""
+    with _lock:
+        _indexes.clear()
+
+def find_member(path):
+    """(archive path, member name, size) holding a raw file that was not extracted, or None.
+
+    Archives are looked up in the folders between the file and the raw data root, with the
+    member name relative to the archive folder: the path extractall() would have written.
+    """
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    root = os.path.abspath(BASE_RAW_DATA_PATH)
+    while True:
+        member = os.path.relpath(path, folder).replace(os.sep, "/")
+        for archive, members in archive_index(folder).items():
+            # Exact name first; INEGI archives are not consistent about the .csv/.CSV case
+            match = member if member in members else next(
+                (name for name in members if name.lower() == member.lower()), None)
+            if match is not None:
+                return os.path.join(folder, archive), match, members[match]
+        if folder == root or os.path.dirname(folder) == folder or not folder.startswith(root):
+            return None
+        folder = os.path.dirname(folder)
+
+def raw_exists(path):
+    """Whether a raw file exists on disk or inside one of the downloaded archives."""
+    return os.path.exists(path) or find_member(path) is not None
+
+def raw_size(path):
+    """Uncompressed size in bytes of a raw file, extracted or not."""
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    found = find_member(path)
+    return found[2] if found else 0
+
+def open_raw(path):
+    """Open a raw file for binary reading, streaming it from its archive when it was not extracted."""
+    if os.path.exists(path):
+        return open(path, 'rb')
+    found = find_member(path)
+    if found is None:
+        raise FileNotFoundError(path)
+    archive_path, member, _ = found
+    archive = zipfile.ZipFile(archive_path)
+    handle = archive.open(member)
+    # The member handle keeps the archive file open until it is closed itself
+    archive.close()
+    return handle
+
+def raw_signature(path):
+    """(location, size, mtime) of a raw file; it changes whenever the file or its archive is replaced."""
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    found = find_member(path)
+    if found is None:
+        return None
+    archive_path, member, _ = found
+    stat = os.stat(archive_path)
+    return [f"{archive_path}!{member}", stat.st_size, stat.st_mtime_ns]
+
+def raw_sha256(path, chunk_size=2**20):
+    """SHA-256 of the content of a raw file, streamed in chunks."""
+    sha = hashlib.sha256()
+    with open_raw(path) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def list_raw_dir(path):
+    """Names of the files directly inside a raw folder, extracted or inside an archive."""
+    names = set(os.listdir(path)) if os.path.isdir(path) else set()
+    names.discard(INDEX_FILE)
+    path = os.path.abspath(path)
+    folder = path
+    root = os.path.abspath(BASE_RAW_DATA_PATH)
+    while folder.startswith(root):
+        prefix = os.path.relpath(path, folder).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix + "/"
+        for members in archive_index(folder).values():
+            for member in members:
+                if member.startswith(prefix) and "/" not in member[len(prefix):]:
+                    names.add(member[len(prefix):])
+        if folder == root:
+            break
+        folder = os.path.dirname(folder)
+    return sorted(names)
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+from modules.config import (years, BASE_URL_ENCO, ENCO_DISCOVERY_YEARS, ENCO_RELEASE_CANDIDATES,
+                            ENCO_DISCOVERY_WORKERS, ENCO_CATALOG_PATH, ENCO_CATALOG_TTL_HOURS)
+from modules.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+MONTH_NAMES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre",
+               "octubre", "noviembre", "diciembre"]
+
+# Seconds to wait for the headers of a probe
+PROBE_TIMEOUT = 10
+
+# Statuses meaning a file was not published; any other failure leaves the month undecided
+UNPUBLISHED_STATUSES = (404, 410)
+
+def make_session(pool_size=ENCO_DISCOVERY_WORKERS):
+    """HTTP session keeping up to pool_size connections alive, retrying transient server errors."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["HEAD", "GET"])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def candidate_filenames(year, month):
+    """File names a monthly release may have, the known name of the month (from config.years) first."""
+    known = years.get(year, {}).get("exceptions", {}).get(month)
+    fields = {"year": year, "yy": f"{year % 100:02d}", "month": month, "month_name": MONTH_NAMES[int(month) - 1]}
+    names = [known] if known else []
+    for pattern in ENCO_RELEASE_CANDIDATES:
+        name = pattern.format(**fields)
+        if name not in names:
+            names.append(name)
+    return names
+
+def probe(session, url, timeout=PROBE_TIMEOUT):
+    """Headers of a ZIP file at url, or None if there is none; costs one round trip and no body.
+
+    Only a 404/410 or a response that is not a ZIP file means there is none. Timeouts, connection
+    errors and other error statuses (5xx after the session's retries) raise a RequestException.
+    """
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code in (403, 405, 501):
+        # Servers that refuse HEAD: read the headers of a GET and drop the connection before the body
+        with session.get(url, allow_redirects=True, timeout=timeout, stream=True) as response:
+            pass
+    if response.status_code in UNPUBLISHED_STATUSES:
+        return None
+    response.raise_for_status()
+    if 'zip' not in response.headers.get('Content-Type', ''):
+        return None
+    return {"url": response.url, "size": int(response.headers.get('Content-Length', 0)),
+            "last_modified": response.headers.get('Last-Modified')}
+
+def discover_month(session, year, month, base_url=BASE_URL_ENCO):
+    """First candidate URL of a month that serves a ZIP file, or None if the month was not published.
+
+    Raises the last probe error when no candidate serves a ZIP file and some probe failed, since
+    the month may then be published under the name that could not be checked.
+    """
+    error = None
+    for filename in candidate_filenames(year, month):
+        url = base_url.format(year=year, filename=filename)
+        try:
+            release = probe(session, url)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Probe of %s failed: %s", url, e)
+            error = e
+            continue
+        if release:
+            return release
+    if error is not None:
+        raise error
+    return None
+
+def configured_release(year, month, base_url=BASE_URL_ENCO):
+    """Release of a month as config.years names it, None if it lists the month as missing.
+
+    Raises KeyError for years config.years does not know.
+    """
+    info = years[year]
+    filename = info.get("exceptions", {}).get(month, info.get("pattern", "").format(month=month) or None)
+    if filename is None:
+        return None
+    return {"url": base_url.format(year=year, filename=filename), "configured": True}
+
+def discover_enco_releases(discovery_years=ENCO_DISCOVERY_YEARS, base_url=BASE_URL_ENCO,
+                           workers=ENCO_DISCOVERY_WORKERS, session=None):
+    """Probe every month of the given years concurrently and return the catalog of published releases.
+
+    A month whose probes failed falls back to the file name config.years gives it and is listed
+    under "failed"; if config.years does not know its year, the discovery raises a RuntimeError
+    rather than leave the month out of the catalog.
+    """
+    session = session or make_session(workers)
+    months = [(year, f"{i:02d}") for year in discovery_years for i in range(1, 13)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(discover_month, session, year, month, base_url=base_url) for year, month in months]
+
+    releases = {}
+    failed = []
+    for (year, month), future in zip(months, futures):
+        try:
+            release = future.result()
+        except requests.exceptions.RequestException as e:
+            if year not in years:
+                raise RuntimeError(f"Could not tell whether the ENCO release of {year}-{month} is published: {e}") from e
+            release = configured_release(year, month, base_url)
+            failed.append(f"{year}-{month}")
+        if release:
+            releases.setdefault(str(year), {})[month] = release
+    if failed:
+        logger.warning("Probes failed for %s; using the configured file names for them", ", ".join(failed))
+    logger.info("Discovered %s ENCO releases in %s months of %s years in %.1f s", sum(map(len, releases.values())),
+                len(months), len(discovery_years), time.perf_counter() - started)
+    return {"discovered_at": datetime.now().isoformat(timespec='seconds'), "base_url": base_url,
+            "years": [int(year) for year in discovery_years], "releases": releases, "failed": failed}
+
+def load_catalog(path=ENCO_CATALOG_PATH, ttl_hours=ENCO_CATALOG_TTL_HOURS, discovery_years=ENCO_DISCOVERY_YEARS,
+                 base_url=BASE_URL_ENCO):
+    """Cached catalog if it is younger than the TTL and covers the same years and base URL, else None."""
+    try:
+        with open(path) as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    age = datetime.now() - datetime.fromisoformat(catalog["discovered_at"])
+    if (age.total_seconds() > ttl_hours * 3600 or catalog.get("base_url") != base_url
+            or catalog.get("years") != [int(year) for year in discovery_years]):
+        return None
+    return catalog
+
+def save_catalog(catalog, path=ENCO_CATALOG_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(temporary_path, path)
+
+def enco_catalog(refresh=False, session=None, **kwargs):
+    """{year: {month: url}} of the published ENCO releases, from the cache or a new discovery.
+
+    A discovery that finds nothing or had failed probes is not cached, so the next call probes again.
+    """
+    catalog = None if refresh else load_catalog(**kwargs)
+    if catalog is None:
+        discovery = {key: kwargs[key] for key in ("discovery_years", "base_url") if key in kwargs}
+        catalog = discover_enco_releases(session=session, **discovery)
+        if catalog["releases"] and not catalog["failed"]:
+            save_catalog(catalog, kwargs.get("path", ENCO_CATALOG_PATH))
+    else:
+        logger.info("Using the ENCO release catalog discovered at %s", catalog["discovered_at"])
+    return {int(year): {month: release["url"] for month, release in months.items()}
+            for year, months in catalog["releases"].items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discover the published ENCO monthly releases.")
+    parser.add_argument("--refresh", action="store_true", help="Probe again even if the cached catalog is fresh")
+    args = parser.parse_args()
+
+    setup_logging("discover_releases")
+    for year, months in sorted(enco_catalog(args.refresh).items()):
+        print(f"{year}: {len(months)} months ({', '.join(sorted(months))})")
@@ -1,42 +1,136 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
 import pandas as pd
-from ydata_profiling import ProfileReport
+from concurrent.futures import ProcessPoolExecutor
 #import sweetviz as sv
 
-# Load transformed data from the interim directory for ENCO
-df_enco = pd.read_csv('data/processed/enco/enco_interim_tidy.csv')  # Replace with the correct interim file
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(project_root)
 
-# Generate the profiling report using ydata-profiling
-profile_enco_ydata = ProfileReport(df_enco, title="ENCO YData Profiling Report", explorative=True)
+from modules.instrumentation import Stage, record_read, record_write
 
-# Save the ydata-profiling report to the MkDocs 'docs/assets/' directory
-profile_enco_ydata.to_file('docs/assets/processed_enco_profiling_report.html')
+# Profiling reports to generate: input data, output HTML and the columns used to stratify samples
+REPORTS = {
+    "enco": {
+        "title": "ENCO YData Profiling Report",
+        "input": 'data/processed/enco/enco_processed_tidy.csv',
+        "output": 'docs/assets/processed_enco_profiling_report.html',
+        "strata": ['year', 'ent']
+    },
+    "enigh": {
+        "title": "ENIGH YData Profiling Report",
+        "input": 'data/processed/enigh/enigh_processed_tidy.csv',
+        "output": 'docs/assets/processed_enigh_profiling_report.html',
+        "strata": ['year', 'entidad']
+    }
+}
 
-print("YData profiling report for ENCO saved to docs/assets/processed_enco_profiling_report.html")
+# Hash of the input and settings of the last generated report, to skip unchanged ones
+REPORT_HASHES_FILE = 'docs/assets/.profiling_report_hashes.json'
 
-# Generate the Sweetviz report for ENCO
-#profile_enco_sweetviz = sv.analyze(df_enco)
+MODES = ["minimal", "sampled", "full"]
+DEFAULT_SAMPLE_SIZE = 100000
+DEFAULT_SEED = 42
 
-# Save the Sweetviz report to the MkDocs 'docs/assets/' directory
-#profile_enco_sweetviz.show_html('docs/assets/interim_enco_sweetviz_report.html')
+def hash_report_inputs(input_path, settings, chunk_size=1024 * 1024):
+    """Hash the input file contents together with the report settings."""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    with open(input_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-#print("Sweetviz report for ENCO saved to docs/assets/interim_enco_sweetviz_report.html")
+def load_report_hashes():
+    """Load the hashes of the previously generated reports."""
+    if not os.path.exists(REPORT_HASHES_FILE):
+        return {}
+    with open(REPORT_HASHES_FILE) as f:
+        return json.load(f)
 
+def stratified_sample(df, strata, sample_size, seed):
+    """Sample the same fraction of every stratum (e.g. year and state) with a fixed seed."""
+    if len(df) <= sample_size:
+        return df
+    strata = [col for col in strata if col in df.columns]
+    frac = sample_size / len(df)
+    if not strata:
+        return df.sample(frac=frac, random_state=seed)
+    return df.groupby(strata, group_keys=False, dropna=False).sample(frac=frac, random_state=seed)
 
-# Load transformed data from the interim directory for ENIGH
-df_enigh = pd.read_csv('data/processed/enigh/enigh_processed_tidy.csv')  # Replace with the correct interim file
+def build_report(name, mode="sampled", columns=None, sample_size=DEFAULT_SAMPLE_SIZE, seed=DEFAULT_SEED, previous_hash=None):
+    """Generate one profiling report, returning its input hash or None if it was skipped."""
+    report = REPORTS[name]
+    settings = {"mode": mode, "columns": columns, "sample_size": sample_size, "seed": seed}
+    input_hash = hash_report_inputs(report["input"], settings)
+    if input_hash == previous_hash and os.path.exists(report["output"]):
+        print(f"{name.upper()} report is up to date, skipping.")
+        return None
 
-# Generate the profiling report using ydata-profiling
-profile_enigh_ydata = ProfileReport(df_enigh, title="ENIGH YData Profiling Report", explorative=True)
+    with Stage(f"report_{name}"):
+        # Imported here so that skipped runs never pay for loading ydata-profiling
+        from ydata_profiling import ProfileReport
 
-# Save the ydata-profiling report to the MkDocs 'docs/assets/' directory
-profile_enigh_ydata.to_file('docs/assets/processed_enigh_profiling_report.html')
+        usecols = None
+        if columns is not None:
+            # The strata are read only to draw the sample, not profiled unless requested
+            wanted = set(columns) | (set(report["strata"]) if mode == "sampled" else set())
+            usecols = lambda col: col in wanted
+        df = pd.read_csv(report["input"], usecols=usecols, low_memory=False)
+        record_read(report["input"], rows=len(df), schema=df.dtypes)
 
-print("YData profiling report for ENIGH saved to docs/assets/processed_enigh_profiling_report.html")
+        if mode == "minimal":
+            profile = ProfileReport(df, title=report["title"], minimal=True)
+        elif mode == "sampled":
+            df = stratified_sample(df, report["strata"], sample_size, seed)
+            if columns is not None:
+                df = df[[col for col in df.columns if col in columns]]
+            profile = ProfileReport(df, title=f"{report['title']} (sample of {len(df)} rows)", explorative=True)
+        else:
+            profile = ProfileReport(df, title=report["title"], explorative=True)
 
-# Generate the Sweetviz report for ENIGH
-#profile_enigh_sweetviz = sv.analyze(df_enigh)
+        # Save the ydata-profiling report to the MkDocs 'docs/assets/' directory
+        profile.to_file(report["output"])
+        record_write(report["output"])
+        print(f"YData profiling report for {name.upper()} saved to {report['output']}")
+    return input_hash
 
-# Save the Sweetviz report to the MkDocs 'docs/assets/' directory
-#profile_enigh_sweetviz.show_html('docs/assets/interim_enigh_sweetviz_report.html')
+def generate_reports(names, mode="sampled", columns=None, sample_size=DEFAULT_SAMPLE_SIZE, seed=DEFAULT_SEED, force=False):
+    """Generate the requested reports in parallel processes and record their input hashes."""
+    hashes = load_report_hashes()
+    with ProcessPoolExecutor(max_workers=len(names)) as executor:
+        futures = {
+            name: executor.submit(build_report, name, mode, columns, sample_size, seed,
+                                  None if force else hashes.get(name))
+            for name in names
+        }
+        for name, future in futures.items():
+            input_hash = future.result()
+            if input_hash is not None:
+                hashes[name] = input_hash
 
-#print("Sweetviz report for ENIGH saved to docs/assets/processed_enigh_sweetviz_report.html")
\ No newline at end of file
+    with open(REPORT_HASHES_FILE, 'w') as f:
+        json.dump(hashes, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate ydata-profiling reports for the processed data.")
+    parser.add_argument("reports", nargs="*", default=list(REPORTS), help=f"Any of {list(REPORTS)} (default: all)")
+    parser.add_argument("--mode", choices=MODES, default="sampled",
+                        help="minimal: no correlations/interactions; sampled: stratified sample; full: all rows")
+    parser.add_argument("--columns", help="Comma-separated subset of columns to profile")
+    parser.add_argument("--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--force", action="store_true", help="Regenerate reports even if their input is unchanged")
+    args = parser.parse_args()
+    if set(args.reports) - set(REPORTS):
+        parser.error(f"unknown reports: {sorted(set(args.reports) - set(REPORTS))}")
+
+    columns = args.columns.split(",") if args.columns else None
+    generate_reports(args.reports, args.mode, columns, args.sample_size, args.seed, args.force)
+
+    # Sweetviz reports (docs/assets/interim_*_sweetviz_report.html) are disabled:
+    #profile_enco_sweetviz = sv.analyze(df_enco)
+    #profile_enco_sweetviz.show_html('docs/assets/interim_enco_sweetviz_report.html')
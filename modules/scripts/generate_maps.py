@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+from string import Template
+import pandas as pd
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(project_root)
+
+from modules.config import data_paths, years
+from modules.logging_config import setup_logging
+from modules.dataset_modules.data_clean_shp import select_web_layer
+from modules.dataset_modules.data_join_geo import (GEO_LEVELS, load_geo_metrics, is_up_to_date, source_stamp,
+                                                   replace_output)
+
+logger = logging.getLogger(__name__)
+
+# Maps published in docs/visualization_maps.md
+MAPS = {
+    "ent": {
+        "level": "estatales",
+        "layer": "ent",
+        "output": 'docs/assets/interactive_ent_map.html',
+        "title": "Entities by Gini value",
+        "label": "Entity",
+        "censo": os.path.join(data_paths["censo"]["processed"], "censo_ent_tidy_data.csv"),
+        "top_n": None
+    },
+    "mun": {
+        "level": "municipales",
+        "layer": "mun",
+        "output": 'docs/assets/top_3_municipalities_map.html',
+        "title": "Top 3 municipalities of each entity by Gini value",
+        "label": "Municipality",
+        "censo": os.path.join(data_paths["censo"]["processed"], "censo_mun_tidy_data.csv"),
+        "top_n": 3
+    }
+}
+
+# Shared geometry and per-year metric files, fetched by the map pages on demand
+MAPS_ASSETS_PATH = 'docs/assets/maps'
+MAP_YEARS = sorted(years)
+
+# Light and dark end of the color ramp of each year (Reds, Blues and Greens, as in the notebook maps)
+YEAR_COLORS = {
+    2018: ["#fee0d2", "#a50f15"],
+    2020: ["#deebf7", "#08519c"],
+    2022: ["#e5f5e0", "#006d2c"]
+}
+
+MAP_TEMPLATE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>$title</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>
+html, body, #map { height: 100%; margin: 0; }
+.map-box { background: white; border: 2px solid grey; padding: 8px; font: 12px sans-serif; }
+.map-box .ramp { width: 180px; height: 10px; margin: 4px 0; }
+</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var config = $config;
+var map = L.map('map').setView([23.6345, -102.5528], 5);
+L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    attribution: '&copy; OpenStreetMap contributors'
+}).addTo(map);
+
+var geometry = null, metrics = {}, layer = null;
+
+function getJSON(url) {
+    return fetch(url).then(function (response) { return response.json(); });
+}
+
+function loadYear(year) {
+    if (metrics[year]) { return Promise.resolve(metrics[year]); }
+    return getJSON(config.years[year].file).then(function (data) { metrics[year] = data; return data; });
+}
+
+function hexToRgb(hex) {
+    return [1, 3, 5].map(function (i) { return parseInt(hex.substr(i, 2), 16); });
+}
+
+function rampColor(colors, t) {
+    var a = hexToRgb(colors[0]), b = hexToRgb(colors[1]);
+    return 'rgb(' + a.map(function (v, i) { return Math.round(v + (b[i] - v) * t); }).join(',') + ')';
+}
+
+function formatNumber(value) {
+    return value === null ? 'n/a' : value.toLocaleString();
+}
+
+var legend = L.control({position: 'bottomleft'});
+legend.onAdd = function () { this._div = L.DomUtil.create('div', 'map-box'); return this._div; };
+legend.update = function (year, data) {
+    var colors = config.years[year].colors;
+    this._div.innerHTML = '<b>Gini ' + year + '</b>' +
+        '<div class="ramp" style="background: linear-gradient(to right, ' + colors[0] + ', ' + colors[1] + ')"></div>' +
+        data.vmin.toFixed(3) + ' &ndash; ' + data.vmax.toFixed(3);
+};
+legend.addTo(map);
+
+function showYear(year) {
+    Promise.all([geometry, loadYear(year)]).then(function (results) {
+        var data = results[1], colors = config.years[year].colors;
+        var span = (data.vmax - data.vmin) || 1;
+        if (layer) { map.removeLayer(layer); }
+        layer = L.geoJSON(results[0], {
+            filter: function (feature) { return !config.onlyWithData || feature.properties.cvegeo in data.values; },
+            style: function (feature) {
+                var row = data.values[feature.properties.cvegeo];
+                var gini = row ? row[0] : null;
+                return {
+                    fillColor: gini === null ? 'gray' : rampColor(colors, (gini - data.vmin) / span),
+                    color: 'black', weight: 1, fillOpacity: 0.5
+                };
+            }
+        }).bindTooltip(function (item) {
+            var props = item.feature.properties, row = data.values[props.cvegeo] || [null, null, null];
+            return '<b>' + config.label + ':</b> ' + props.nom_geo +
+                '<br><b>Population:</b> ' + formatNumber(row[1]) +
+                '<br><b>Male per 100 Female:</b> ' + formatNumber(row[2]) +
+                '<br><b>Gini (' + year + '):</b> ' + (row[0] === null ? 'n/a' : row[0].toFixed(4));
+        }).addTo(map);
+        legend.update(year, data);
+    });
+}
+
+// One empty base layer per year: the layer control then allows a single selected year
+var yearLayers = {};
+Object.keys(config.years).forEach(function (year) { yearLayers['Year ' + year] = L.layerGroup(); });
+L.control.layers(yearLayers, null, {collapsed: false}).addTo(map);
+map.on('baselayerchange', function (event) { showYear(event.name.replace('Year ', '')); });
+
+geometry = getJSON(config.geometry);
+var firstYear = Object.keys(config.years)[0];
+yearLayers['Year ' + firstYear].addTo(map);
+showYear(firstYear);
+</script>
+</body>
+</html>
+""")
+
+def copy_geometry_asset(layer, assets_path=MAPS_ASSETS_PATH):
+    """Copy the selected simplified web level of a layer next to the maps, once."""
+    source = select_web_layer(layer)
+    target = os.path.join(assets_path, os.path.basename(source))
+    if not is_up_to_date(target, [source]):
+        os.makedirs(assets_path, exist_ok=True)
+        stamp = source_stamp([source])
+        temporary_path = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(source, temporary_path)
+        replace_output(temporary_path, target, stamp)
+        logger.info("Copied geometry %s to %s", source, target)
+    return target
+
+def load_map_metrics(name, year):
+    """Load the Gini of a map and year with the censo population of every area."""
+    spec = MAPS[name]
+    metrics = load_geo_metrics(spec["level"], year, columns=['cvegeo', 'gini'])
+    censo = pd.read_csv(spec["censo"], usecols=['cvegeo', 'pob_tot', 'rel_h_m'])
+    return metrics.merge(censo.astype({'cvegeo': int}), on='cvegeo', how='left')
+
+def write_metric_layer(metrics, layer, output_path, stamp, top_n=None):
+    """Write a compact {cvegeo: [gini, pob_tot, rel_h_m]} JSON file with the color range of the year.
+
+    The file is written aside and renamed into place with the stamp of the inputs the metrics were read from.
+    """
+    width = 2 if layer == "ent" else 5
+    # The color range covers every area of the year, even when only the top ones are drawn
+    vmin, vmax = float(metrics['gini'].min()), float(metrics['gini'].max())
+    if top_n:
+        # Top municipalities of each entity (cvegeo // 1000) by Gini
+        metrics = metrics.sort_values('gini', ascending=False).groupby(metrics['cvegeo'] // 1000).head(top_n)
+    values = {
+        str(row.cvegeo).zfill(width): [
+            None if pd.isna(row.gini) else round(float(row.gini), 4),
+            None if pd.isna(row.pob_tot) else int(row.pob_tot),
+            None if pd.isna(row.rel_h_m) else float(row.rel_h_m)
+        ]
+        for row in metrics.itertuples(index=False)
+    }
+    data = {"vmin": vmin, "vmax": vmax, "values": values}
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temporary_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    replace_output(temporary_path, output_path, stamp)
+    logger.info("Saved metric layer to %s (%s bytes)", output_path, os.path.getsize(output_path))
+
+def render_map(name, geometry_path, year_files):
+    """Write the Leaflet page of a map, referencing its assets relative to the page."""
+    spec = MAPS[name]
+    page_dir = os.path.dirname(spec["output"])
+    config = {
+        "geometry": os.path.relpath(geometry_path, page_dir).replace(os.sep, '/'),
+        "years": {
+            str(year): {"file": os.path.relpath(path, page_dir).replace(os.sep, '/'), "colors": YEAR_COLORS[year]}
+            for year, path in year_files.items()
+        },
+        "label": spec["label"],
+        "onlyWithData": bool(spec["top_n"])
+    }
+    with open(spec["output"], 'w', encoding='utf-8') as f:
+        f.write(MAP_TEMPLATE.substitute(title=spec["title"], config=json.dumps(config)))
+    logger.info("Saved %s map to %s", name, spec['output'])
+
+def generate_map(name, force=False):
+    """Build the geometry asset, metric side files and page of one map."""
+    spec = MAPS[name]
+    try:
+        geometry_path = copy_geometry_asset(spec["layer"])
+        year_files = {}
+        for year in MAP_YEARS:
+            output_path = os.path.join(MAPS_ASSETS_PATH, f"{name}_gini_{year}.json")
+            inputs = [spec["censo"]] + list(GEO_LEVELS[spec["level"]].values())
+            if not force and is_up_to_date(output_path, inputs):
+                year_files[year] = output_path
+                continue
+            stamp = source_stamp(inputs)
+            try:
+                metrics = load_map_metrics(name, year)
+            except Exception as e:
+                logger.warning("No %s metrics for %s, skipping the year: %s", name, year, e)
+                continue
+            write_metric_layer(metrics, spec["layer"], output_path, stamp, spec["top_n"])
+            year_files[year] = output_path
+        render_map(name, geometry_path, year_files)
+        print(f"Map {name} saved to {spec['output']}")
+    except Exception as e:
+        logger.error("Error generating %s map: %s", name, e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the interactive Gini maps for the documentation.")
+    parser.add_argument("maps", nargs="*", default=list(MAPS), help=f"Any of {list(MAPS)} (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rewrite the metric files even if they are up to date")
+    args = parser.parse_args()
+    setup_logging("generate_maps")
+    if set(args.maps) - set(MAPS):
+        parser.error(f"unknown maps: {sorted(set(args.maps) - set(MAPS))}")
+
+    for name in args.maps:
+        generate_map(name, args.force)
+
+    logger.info("Map generation completed.")
@@ -0,0 +1,73 @@
+import os
+import sys
+import shutil
+import tempfile
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+# RAM-backed when available, so the arrays are shared memory pages rather than disk files
+SHARED_ARRAYS_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+class SharedArrays:
+    """Numeric arrays written once to memory-mapped .npy files that pool workers attach to without copying.
+
+    Only the small spec (array name -> file path) is pickled to the workers, so memory stays near
+    one copy of the data whatever the number of workers. Use it as a context manager; the files
+    are removed on exit.
+    """
+
+    def __init__(self, arrays, folder=SHARED_ARRAYS_DIR):
+        self.folder = tempfile.mkdtemp(prefix="ineqmx_shared_", dir=folder)
+        self.spec = {}
+        for name, array in arrays.items():
+            path = os.path.join(self.folder, f"{name}.npy")
+            np.save(path, np.ascontiguousarray(array))
+            self.spec[name] = path
+
+    def arrays(self):
+        return attach(self.spec)
+
+    def close(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+def attach(spec):
+    """Read-only views of the shared arrays described by a spec."""
+    return {name: np.load(path, mmap_mode='r') for name, path in spec.items()}
+
+# Arrays of the current worker process, attached once by the pool initializer
+_worker_arrays = None
+
+def _attach_worker(spec):
+    global _worker_arrays
+    _worker_arrays = attach(spec)
+
+def _run_task(func, task):
+    return func(_worker_arrays, *task)
+
+def map_shared(func, shared, tasks, workers=None):
+    """Run func(arrays, *task) for every task in a process pool whose workers attach to the shared arrays.
+
+    func must be a module-level function; tasks should be small tuples such as offset ranges.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker, initargs=(shared.spec,)) as executor:
+        return list(executor.map(functools.partial(_run_task, func), tasks))
+
+def balanced_ranges(starts, ends, parts):
+    """Split consecutive groups (row offsets starts/ends) into at most `parts` ranges of similar row counts."""
+    if len(starts) == 0:
+        return []
+    bounds = np.searchsorted(ends, np.linspace(0, ends[-1], parts + 1)[1:-1], side='left') + 1
+    edges = np.unique(np.r_[0, np.minimum(bounds, len(starts)), len(starts)])
+    return [(int(first), int(last)) for first, last in zip(edges[:-1], edges[1:])]
@@ -1,6 +1,11 @@
 from invoke import task 
+import os
 import shutil
 import pathlib
+from datetime import datetime
+
+# Every stage runs through the command line in modules/cli.py; chained stages share one process
+CLI = "python -m modules.cli"
 
 @task
 def requirements(c):
@@ -8,17 +13,28 @@ def requirements(c):
     c.run("python -m pip install -r requirements.txt")
 
 @task
-def download_data(c):
+def download_data(c, refresh_catalog=False):
     print(">>> Downloading raw data...")
-    c.run("python modules/dataset_modules/data_downloader.py")
+    # The ENCO release catalog is reused for a day unless refreshed
+    c.run(f"{CLI} download" + (" --refresh-catalog" if refresh_catalog else ""))
 
 @task
-def transform_data(c):
+def transform_data(c, max_memory=None, incremental=False):
     print(">>> Transforming raw data...")
-    c.run("python modules/dataset_modules/data_clean_enco.py")
-    c.run("python modules/dataset_modules/data_clean_enigh.py")
-    c.run("python modules/dataset_modules/data_clean_shp.py")
-    c.run("python modules/dataset_modules/data_clean_censo.py")
+    # Heavy stages switch to chunked processing to stay under max_memory (e.g. 4G);
+    # incremental ENCO only processes the months whose raw files are new or changed
+    c.run(f"{CLI}" + (f" --max-memory {max_memory}" if max_memory else "") + " clean"
+          + (" --incremental" if incremental else ""))
+
+@task
+def build_enco_cube(c):
+    print(">>> Building ENCO aggregate cube...")
+    c.run("python modules/dataset_modules/data_cube_enco.py")
+
+@task
+def join_geo_data(c):
+    print(">>> Joining results to geographic layers...")
+    c.run("python modules/dataset_modules/data_join_geo.py")
 
 @task
 def clean_data(c):
@@ -32,14 +48,12 @@ def clean_data(c):
         path = pathlib.Path(main_dir)
 
         # Target each subdirectory within the main directory (e.g., data/raw/enigh, data/raw/enco)
-        for subdir in path.iterdir():
-            if subdir.is_dir():
-                # Delete all files and subdirectories within this subdir
-                for item in subdir.rglob('*'):
-                    if item.is_file():
-                        item.unlink()  # Delete file
-                    elif item.is_dir():
-                        shutil.rmtree(item)  # Recursively delete subdirectory if it has contents
+        for subdir in [item for item in path.iterdir() if item.is_dir() and not item.name.endswith('.trash')]:
+            # Swap the subdir for an empty one first, then delete the old tree out of sight
+            trash = subdir.with_name(f"{subdir.name}.{os.getpid()}.trash")
+            subdir.rename(trash)
+            subdir.mkdir()
+            shutil.rmtree(trash)
 
     print(">>> Clean up complete!")
 
@@ -61,10 +75,49 @@ def lint(c):
 def format(c):
     c.run("black --config pyproject.toml proyecto_ic_mcd")
 
+@task
+def test(c):
+    print(">>> Running the tests...")
+    c.run("python -m pytest tests")
+
 @task
 def generate_data_vis(c):
     print(">>> Generating visualizations...")
-    c.run("python modules/scripts/generate_data_vis.py")
+    c.run(f"{CLI} vis")
+
+@task
+def generate_maps(c):
+    print(">>> Generating interactive maps...")
+    c.run(f"{CLI} maps")
+
+@task
+def benchmark(c, scales="1,10"):
+    print(">>> Running benchmarks on synthetic data...")
+    c.run(f"python benchmarks/run_benchmarks.py --scales {scales}")
+
+@task
+def cache(c, purge=False, name=None):
+    # Results of the memoized functions, shared by the pipeline and the notebooks
+    command = "purge" if purge else "list"
+    print(f">>> Cache of memoized results ({command})...")
+    c.run(f"python modules/memo.py {command}" + (f" --name {name}" if name else ""))
+
+@task
+def versions(c, stage=None):
+    print(">>> Published versions of the stage outputs...")
+    c.run("python modules/publish.py list" + (f" {stage}" if stage else ""))
+
+@task
+def rollback(c, stage, to=None):
+    # Publish an earlier version of a stage's outputs again (default: the one before the current)
+    print(f">>> Rolling back {stage}...")
+    c.run(f"python modules/publish.py rollback {stage}" + (f" --to {to}" if to else ""))
+
+@task
+def manifest(c, stage=None):
+    # Freshness of the stage outputs, decided from the data manifests without reading the data
+    print(">>> Checking the data manifests...")
+    c.run("python modules/manifest.py check" + (f" {stage}" if stage else ""), warn=True)
 
 @task
 def build_docs(c):
@@ -77,12 +130,20 @@ def deploy_docs(c):
     c.run("mkdocs gh-deploy --force")
 
 @task
-def full_pipeline(c):
-    download_data(c)
-    transform_data(c)
-    generate_data_vis(c)
+def run_report(c):
+    print(">>> Summarizing stage timings and memory...")
+    c.run(f"{CLI} report")
+
+@task
+def full_pipeline(c, max_memory=None, incremental=False):
+    print(">>> Running the full pipeline...")
+    # One process for every stage, all recording their measurements under the same run id
+    os.environ.setdefault("INEQMX_RUN_ID", datetime.now().strftime('%Y%m%d_%H%M%S'))
+    c.run(f"{CLI}" + (f" --max-memory {max_memory}" if max_memory else "") + " download clean"
+          + (" --incremental" if incremental else "") + " vis maps report")
 
 @task
 def deploy(c):
     generate_data_vis(c)
+    generate_maps(c)
     deploy_docs(c)
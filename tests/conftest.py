@@ -0,0 +1,15 @@
+import os
+import sys
+import importlib.util
+
+# Add the project root directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+sys.path.append(project_root)
+
+def load_script(name, path):
+    """Import a script by path (e.g. from INEQMX-ENCO-2022, which is not an importable package name)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(project_root, path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
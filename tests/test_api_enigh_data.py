@@ -0,0 +1,189 @@
+import os
+import csv
+import time
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+
+import pandas as pd
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from conftest import load_script
+
+api = load_script("api_enigh_data", "INEQMX-ENCO-2022/api_enigh_data.py")
+
+INDICADOR = "6207048662"
+
+def respuesta(area):
+    return {"Series": [{"INDICADOR": INDICADOR, "UNIT": "Pesos",
+                        "OBSERVATIONS": [{"TIME_PERIOD": "2022", "OBS_VALUE": "1.5", "COBER_GEO": area},
+                                         {"TIME_PERIOD": "2023", "OBS_VALUE": "2.5", "COBER_GEO": area}]}]}
+
+class ServidorINEGI:
+    """Local stand-in of the indicators API answering with the statuses queued for each area."""
+
+    def __init__(self, estados=None, retry_after=None):
+        self.estados = estados or {}
+        self.retry_after = retry_after
+        self.respuesta = respuesta
+        self.solicitudes = []  # (area, monotonic time, status)
+
+    async def handler(self, request):
+        # /INDICATOR/ + <ids>/<idioma>/<area>/<recientes>/<fuente>/<version>/<token>
+        area = request.match_info["tail"].split("/")[2]
+        cola = self.estados.get(area, [])
+        status = cola.pop(0) if cola else 200
+        self.solicitudes.append((area, time.monotonic(), status))
+        if status == 200:
+            return web.json_response(self.respuesta(area))
+        headers = {"Retry-After": str(self.retry_after)} if status == 429 and self.retry_after else {}
+        return web.Response(status=status, headers=headers)
+
+    @asynccontextmanager
+    async def iniciar(self):
+        app = web.Application()
+        app.router.add_get("/INDICATOR/{tail:.*}", self.handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            yield str(server.make_url("/INDICATOR"))
+        finally:
+            await server.close()
+
+    def de(self, area):
+        return [s for s in self.solicitudes if s[0] == area]
+
+def obtener(servidor, tmp_path, areas, token="token", **opciones):
+    async def run():
+        async with servidor.iniciar() as url:
+            async with api.ClienteINEGI(token, url_base=url, directorio_cache=str(tmp_path / "cache"),
+                                        espera_base=0.05, **opciones) as cliente:
+                return await cliente.obtener_datos_estados(areas)
+    return dict(asyncio.run(run()))
+
+def test_retries_server_errors_with_exponential_backoff(tmp_path):
+    servidor = ServidorINEGI({"0100": [503, 502]})
+    series = obtener(servidor, tmp_path, ["0100"])
+
+    assert series["0100"] == respuesta("0100")["Series"]
+    tiempos = [t for _, t, _ in servidor.de("0100")]
+    assert [s for _, _, s in servidor.de("0100")] == [503, 502, 200]
+    # 0.05 s after the first failure, 0.1 s after the second
+    assert tiempos[1] - tiempos[0] >= 0.05
+    assert tiempos[2] - tiempos[1] >= 0.1
+
+def test_gives_up_after_the_last_retry_and_on_client_errors(tmp_path):
+    servidor = ServidorINEGI({"0100": [500] * 10, "0200": [404]})
+    series = obtener(servidor, tmp_path, ["0100", "0200"], reintentos=3)
+
+    assert series == {"0100": [], "0200": []}
+    assert len(servidor.de("0100")) == 3
+    # A 404 is not retried
+    assert len(servidor.de("0200")) == 1
+    # Failures are not cached
+    assert not (tmp_path / "cache").exists() or not os.listdir(tmp_path / "cache")
+
+def test_429_pauses_every_request_for_retry_after(tmp_path):
+    servidor = ServidorINEGI({"0100": [429]}, retry_after=1)
+    series = obtener(servidor, tmp_path, ["0100", "0200", "0300"], max_concurrencia=1)
+
+    assert all(series[area] for area in ["0100", "0200", "0300"])
+    limitada = servidor.de("0100")[0][1]
+    despues = [t for area, t, _ in servidor.solicitudes if t > limitada]
+    assert len(despues) == 3
+    # No request reaches the server before Retry-After has passed, whichever area it is for
+    assert min(despues) - limitada >= 0.95
+
+def test_cache_hit_and_ttl_expiry(tmp_path):
+    servidor = ServidorINEGI()
+    obtener(servidor, tmp_path, ["0100"], ttl=60)
+    # Another token asking the same query within the TTL is answered from the cache
+    series = obtener(servidor, tmp_path, ["0100"], token="otro", ttl=60)
+    assert series["0100"] == respuesta("0100")["Series"]
+    assert len(servidor.de("0100")) == 1
+
+    # Older than the TTL: asked again and the cache file refreshed
+    ruta = api.ruta_cache(api.ID_INDICADORES, "0100", "2.0", directorio_cache=str(tmp_path / "cache"))
+    antes = time.time() - 120
+    os.utime(ruta, (antes, antes))
+    obtener(servidor, tmp_path, ["0100"], ttl=60)
+    assert len(servidor.de("0100")) == 2
+    assert os.path.getmtime(ruta) > antes
+
+def test_recent_observations_have_their_own_cache_entry(tmp_path):
+    directorio = str(tmp_path)
+    assert api.ruta_cache("1", "0100", "2.0", False, directorio) != api.ruta_cache("1", "0100", "2.0", True, directorio)
+
+def test_csv_streams_every_state_through_one_writer(tmp_path, monkeypatch):
+    servidor = ServidorINEGI({"0200": [404]})
+    archivo_salida = tmp_path / "enigh_api.csv"
+
+    async def run():
+        async with servidor.iniciar() as url:
+            monkeypatch.setattr(api, "ClienteINEGI", functools.partial(
+                api.ClienteINEGI, url_base=url, directorio_cache=str(tmp_path / "cache"), espera_base=0.05))
+            await api.descargar_estados(["0100", "0200", "0300"], "token", str(archivo_salida))
+    asyncio.run(run())
+
+    with open(archivo_salida, newline='', encoding='utf-8') as file:
+        filas = list(csv.reader(file))
+    assert filas[0] == api.COLUMNAS
+    # One header, then the rows of each state in order; the state that failed adds none
+    assert [fila[0] for fila in filas[1:]] == ["0100", "0100", "0300", "0300"]
+    assert filas[1] == ["0100", INDICADOR, "2022", "1.5", "Pesos", "0100"]
+
+def test_csv_writer_consumes_a_generator(tmp_path):
+    consumidas = []
+
+    def filas():
+        for i in range(3):
+            consumidas.append(i)
+            yield ["0100", INDICADOR, str(2020 + i), str(i), "Pesos", "0100"]
+
+    archivo_salida = tmp_path / "sub" / "salida.csv"
+    api.guardar_datos_en_csv(filas(), str(archivo_salida))
+
+    assert consumidas == [0, 1, 2]
+    with open(archivo_salida, newline='', encoding='utf-8') as file:
+        assert len(list(csv.reader(file))) == 4
+
+@pytest.mark.parametrize("header, esperado", [("7", 7), (None, 0.2), ("Wed, 21 Oct 2015 07:28:00 GMT", 0.2)])
+def test_retry_after_header_or_backoff(header, esperado):
+    class Respuesta:
+        headers = {"Retry-After": header} if header else {}
+
+    cliente = api.ClienteINEGI("token", espera_base=0.05)
+    assert cliente._tiempo_espera(Respuesta(), 2) == esperado
+
+def test_incremental_sync_keeps_revisions_of_the_last_period(tmp_path, monkeypatch):
+    servidor = ServidorINEGI()
+    archivo_tabla, archivo_estado = str(tmp_path / "enigh_api.parquet"), str(tmp_path / "sync_state.json")
+
+    def sincronizar():
+        async def run():
+            async with servidor.iniciar() as url:
+                # A new client per run, with its own cache so every run asks the stand-in
+                monkeypatch.setattr(api, "ClienteINEGI", functools.partial(
+                    api.ClienteINEGI, url_base=url, directorio_cache=str(tmp_path / f"cache{len(servidor.solicitudes)}")))
+                await api.sincronizar_estados(["0100"], "token", INDICADOR, archivo_tabla, archivo_estado)
+        asyncio.run(run())
+        return pd.read_parquet(archivo_tabla).set_index("PERIODO")["VALOR"].to_dict()
+
+    assert sincronizar() == {"2022": "1.5", "2023": "2.5"}
+    assert api.leer_estado_sync(archivo_estado) == {"0100": {INDICADOR: "2023"}}
+
+    # INEGI revises the last period already seen
+    def revisada(area):
+        datos = respuesta(area)
+        datos["Series"][0]["OBSERVATIONS"][1]["OBS_VALUE"] = "2.7"
+        return datos
+    servidor.respuesta = revisada
+    assert sincronizar() == {"2022": "1.5", "2023": "2.7"}
+
+    # Nothing changed: the table is not rewritten
+    modificada = os.path.getmtime(archivo_tabla)
+    assert sincronizar() == {"2022": "1.5", "2023": "2.7"}
+    assert os.path.getmtime(archivo_tabla) == modificada
+    assert len(servidor.solicitudes) == 3
@@ -0,0 +1,134 @@
+import os
+import shutil
+import logging
+
+import numpy as np
+import pytest
+
+from conftest import load_script
+from modules import publish
+from modules.dataset_modules import data_clean_enco as clean_enco
+
+synthetic = load_script("synthetic_data", "benchmarks/synthetic_data.py")
+
+YEARS = [2022, 2023]
+
+@pytest.fixture
+def enco(tmp_path, monkeypatch):
+    """Incremental ENCO cleaning over a raw folder of synthetic months, with every output under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(publish, "PUBLISH_VERSIONS_PATH", str(tmp_path / "data" / "versions"))
+    for year in YEARS:
+        monkeypatch.setitem(clean_enco.data_paths["enco"], year, {
+            "raw": str(tmp_path / "data" / "raw" / "enco" / str(year)),
+            "interim": str(tmp_path / "data" / "interim" / "enco" / str(year))})
+        os.makedirs(clean_enco.data_paths["enco"][year]["interim"])
+    monkeypatch.setattr(clean_enco, "years", YEARS)
+    monkeypatch.setattr(clean_enco, "BASE_INTERIM_DATA_PATH", str(tmp_path / "data" / "interim"))
+    monkeypatch.setattr(clean_enco, "processed_enco_path", str(tmp_path / "data" / "processed" / "enco"))
+    monkeypatch.setattr(clean_enco, "estado_particiones_path", str(tmp_path / "data" / "interim" / "particiones.pkl"))
+    os.makedirs(tmp_path / "data" / "processed" / "enco")
+    return tmp_path
+
+def write_month(year, month, seed=0, households=40, change=None):
+    """Write the raw cs, viv and cb files of a synthetic month, after change(tables) if given."""
+    tables = synthetic.generar_enco_mes(np.random.default_rng([year, month, seed]), year, month, households)
+    if change:
+        change(tables)
+    for kind, table in tables.items():
+        path = clean_enco.ruta_esperada(year, month, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table.to_csv(path, index=False)
+
+def outputs():
+    """Content of the combined and grouped tables."""
+    contents = {}
+    for name in ["enco_processed_tidy.csv", "enco_grouped.csv"]:
+        with open(os.path.join(clean_enco.processed_enco_path, name)) as f:
+            contents[name] = f.read()
+    return contents
+
+def full_rebuild():
+    """Outputs of procesar_datos over the same raw files, leaving the incremental outputs as they were."""
+    saved = os.path.join(clean_enco.processed_enco_path, "incremental")
+    shutil.copytree(clean_enco.processed_enco_path, saved)
+    clean_enco.procesar_datos()
+    rebuilt = outputs()
+    # Copied back with their mtimes, which the next incremental run checks
+    for name in rebuilt:
+        shutil.copy2(os.path.join(saved, name), os.path.join(clean_enco.processed_enco_path, name))
+    shutil.rmtree(saved)
+    return rebuilt
+
+def publish_incremental(run_id):
+    with publish.Publication("clean_enco", run_id=run_id):
+        clean_enco.procesar_incremental()
+
+def test_rolled_back_outputs_are_rewritten_by_the_next_run(enco):
+    write_month(2022, 1)
+    publish_incremental("run1")
+    write_month(2022, 2)
+    publish_incremental("run2")
+    expected = outputs()
+
+    publish.rollback("clean_enco", "run1")
+    assert outputs() != expected
+    # No raw file changed since run2, but the live outputs are those of run1
+    publish_incremental("run3")
+    assert outputs() == expected
+    assert publish.current_version("clean_enco") == "run3"
+
+def test_state_is_saved_only_when_the_outputs_are_published(enco):
+    write_month(2022, 1)
+    publish_incremental("run1")
+    write_month(2022, 2)
+
+    with pytest.raises(RuntimeError):
+        with publish.Publication("clean_enco", run_id="run2"):
+            clean_enco.procesar_incremental()
+            raise RuntimeError("interrupted before the commit")
+
+    assert clean_enco.cargar_estado()["particiones"].keys() == {(2022, 1)}
+    publish_incremental("run3")
+    assert outputs() == full_rebuild()
+
+def incremental(caplog):
+    """Run procesar_incremental outside a publication and return how it wrote the combined table."""
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger=clean_enco.__name__):
+        clean_enco.procesar_incremental()
+    return next(record.args[0] for record in caplog.records if record.msg.startswith("Combined processed data"))
+
+def test_added_months_are_appended_like_a_full_rebuild(enco, caplog):
+    write_month(2022, 11)
+    write_month(2022, 12)
+    assert incremental(caplog) == "rewritten"
+    assert outputs() == full_rebuild()
+
+    # A later month, in the next year
+    write_month(2023, 1)
+    assert incremental(caplog) == "appended"
+    assert outputs() == full_rebuild()
+
+def test_changed_past_month_is_replaced_like_a_full_rebuild(enco, caplog):
+    for year, month in [(2022, 11), (2022, 12), (2023, 1)]:
+        write_month(year, month)
+    incremental(caplog)
+
+    # A corrected release of a month already processed: its old contribution to enco_grouped is subtracted
+    write_month(2022, 11, seed=1, households=30)
+    assert incremental(caplog) == "rewritten"
+    assert outputs() == full_rebuild()
+
+def test_month_changing_the_dtypes_dates_every_month_again_like_a_full_rebuild(enco, caplog):
+    write_month(2022, 11)
+    write_month(2022, 12)
+    incremental(caplog)
+
+    def without_municipality(tables):
+        # mpio becomes a float column in the concatenation of every month
+        tables['viv'].loc[:3, 'MPIO'] = np.nan
+
+    write_month(2023, 1, change=without_municipality)
+    assert incremental(caplog) == "rewritten"
+    assert outputs() == full_rebuild()
@@ -0,0 +1,97 @@
+import os
+import ast
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import project_root
+from modules.config import estados
+from modules.dataset_modules import data_cube_enco as cube_enco
+
+MERGE_SCRIPT = os.path.join(project_root, "modules", "dataset_modules", "data_merge_enco_enigh.py")
+
+def dashboard_shares():
+    """calcular_porcentajes_enco of the merge script, compiled on its own without its disk cache.
+
+    The script computes every result when it is imported, so only the function is taken from its source.
+    """
+    with open(MERGE_SCRIPT, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    function = next(node for node in ast.walk(tree)
+                    if isinstance(node, ast.FunctionDef) and node.name == "calcular_porcentajes_enco")
+    function.decorator_list = []
+    namespace = {"pd": pd, "estados": estados, "memory_budget": lambda: None,
+                 "record_read": lambda *args, **kwargs: None, "claves_municipio": ['year', 'estado_nombre', 'mpio']}
+    exec(compile(ast.Module(body=[function], type_ignores=[]), MERGE_SCRIPT, "exec"), namespace)
+    return namespace["calcular_porcentajes_enco"]
+
+def enco(n=600, seed=0, missing=False):
+    """Processed ENCO rows of two years, optionally with missing answers, municipalities and dates."""
+    rng = np.random.default_rng(seed)
+    year = rng.choice([2022, 2023], n)
+    df = pd.DataFrame({
+        'ent': rng.integers(1, 4, n),
+        'mpio': rng.integers(1, 4, n).astype(float),
+        'fch_def': [f"{day:02d}/{month:02d}/{y}" for day, month, y in zip(rng.integers(1, 29, n), rng.integers(1, 13, n), year)],
+        'year': year
+    })
+    for pregunta in cube_enco.preguntas:
+        df[pregunta] = rng.integers(1, 6, n).astype(float)
+    if missing:
+        df.loc[rng.random(n) < 0.1, 'p1'] = np.nan
+        df.loc[rng.random(n) < 0.1, 'mpio'] = np.nan
+        df.loc[rng.random(n) < 0.1, 'fch_def'] = "sin fecha"
+    return df
+
+@pytest.fixture
+def shares(tmp_path):
+    df = enco()
+    path = tmp_path / "enco_processed_tidy.csv"
+    df.to_csv(path, index=False)
+    return cube_enco.build_cube(df), dashboard_shares()(str(path), cube_enco.preguntas)
+
+def test_national_and_state_shares_match_the_dashboard(shares):
+    cube, (nacionales, estatales, _) = shares
+
+    result = cube_enco.query_cube(['year'], cube=cube)
+    expected = nacionales.rename(columns={'Pregunta': 'question', 'Año': 'year', 'Respuesta': 'response'})
+    merged = expected.merge(result.astype({'question': str}), on=['question', 'year', 'response'], validate='1:1')
+    assert len(merged) == len(expected) == len(result)
+    np.testing.assert_allclose(merged['Porcentaje_x'], merged['Porcentaje_y'])
+
+    result = cube_enco.query_cube(['year', 'ent'], cube=cube).assign(Estado=lambda r: r['ent'].map(estados))
+    expected = estatales.rename(columns={'Pregunta': 'question', 'Año': 'year', 'Respuesta': 'response'})
+    merged = expected.merge(result.astype({'question': str}), on=['question', 'year', 'Estado', 'response'], validate='1:1')
+    assert len(merged) == len(expected) == len(result)
+    np.testing.assert_allclose(merged['Porcentaje_x'], merged['Porcentaje_y'])
+
+def test_municipal_shares_match_the_dashboard(shares):
+    cube, (_, _, municipales) = shares
+    result = cube_enco.query_cube(['year', 'ent', 'mpio'], cube=cube).assign(Estado=lambda r: r['ent'].map(estados))
+    expected = municipales.rename(columns={'Pregunta': 'question', 'Año': 'year', 'Municipio': 'mpio', 'Respuesta': 'response'})
+    merged = expected.merge(result.astype({'question': str}), on=['question', 'year', 'Estado', 'mpio', 'response'],
+                            validate='1:1')
+    assert len(merged) == len(expected) == len(result)
+    np.testing.assert_allclose(merged['Porcentaje_x'], merged['Porcentaje_y'])
+
+def test_roll_ups_across_months_and_municipalities_keep_every_row():
+    df = enco(missing=True)
+    cube = cube_enco.build_cube(df)
+
+    by_month = cube_enco.query_cube(['year', 'month'], {'question': 'p1'}, cube=cube)
+    months = pd.to_datetime(df['fch_def'], format='%d/%m/%Y', errors='coerce').dt.month
+    expected = df.assign(month=months).groupby(['year', 'month'], dropna=False).size()
+    assert by_month.groupby(['year', 'month'], dropna=False)['n'].sum().sort_index().equals(expected.sort_index())
+    assert by_month['month'].isna().any()
+
+    by_mpio = cube_enco.query_cube(['ent', 'mpio'], {'question': 'p1'}, cube=cube)
+    expected = df.groupby(['ent', 'mpio'], dropna=False).size()
+    assert by_mpio.groupby(['ent', 'mpio'], dropna=False)['n'].sum().sort_index().equals(expected.sort_index())
+    # Missing answers are response 0, and the shares of every group add up to 100
+    assert (by_mpio['response'] == 0).any()
+    np.testing.assert_allclose(by_mpio.groupby(['ent', 'mpio'], dropna=False)['Porcentaje'].sum(), 100)
+
+    # Rolled up across months and municipalities, the state counts are those of the rows
+    by_ent = cube_enco.query_cube(['ent'], {'question': 'p1'}, cube=cube)
+    assert by_ent.groupby('ent')['n'].sum().equals(df.groupby('ent').size())
@@ -0,0 +1,40 @@
+import os
+import json
+import shutil
+
+import pandas as pd
+
+from modules.scripts import generate_maps
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def test_geometry_asset_follows_a_rolled_back_source(tmp_path, monkeypatch):
+    source = tmp_path / "shp_ent_web_0.geojson"
+    monkeypatch.setattr(generate_maps, "select_web_layer", lambda layer: str(source))
+    write(source, '{"features": []}')
+    shutil.copy2(source, tmp_path / "previous.geojson")
+    write(source, '{"features": [1]}')
+    target = generate_maps.copy_geometry_asset("ent", str(tmp_path / "assets"))
+
+    # A rollback puts back the previous layer with its older mtime
+    shutil.copy2(tmp_path / "previous.geojson", source)
+    assert generate_maps.copy_geometry_asset("ent", str(tmp_path / "assets")) == target
+    with open(target) as f:
+        assert f.read() == '{"features": []}'
+
+def test_metric_layer_is_replaced_whole_with_its_stamp(tmp_path):
+    censo = tmp_path / "censo.csv"
+    write(censo, "cvegeo,pob_tot\n1,10\n")
+    output_path = str(tmp_path / "assets" / "ent_gini_2022.json")
+    metrics = pd.DataFrame({"cvegeo": [1, 2], "gini": [0.4, 0.5], "pob_tot": [10, None], "rel_h_m": [95.0, 97.5]})
+
+    generate_maps.write_metric_layer(metrics, "ent", output_path, generate_maps.source_stamp([str(censo)]))
+
+    with open(output_path) as f:
+        assert json.load(f)["values"] == {"01": [0.4, 10, 95.0], "02": [0.5, None, 97.5]}
+    assert generate_maps.is_up_to_date(output_path, [str(censo)])
+    assert sorted(os.listdir(tmp_path / "assets")) == ["ent_gini_2022.json", "ent_gini_2022.json.sources"]
+    write(censo, "cvegeo,pob_tot\n1,11\n")
+    assert not generate_maps.is_up_to_date(output_path, [str(censo)])
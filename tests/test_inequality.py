@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from modules import inequality
+
+def households(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'year': rng.choice([2018, 2020, 2022], n),
+        'entidad': rng.integers(1, 33, n),
+        'municipio': rng.integers(1, 20, n).astype(float),
+        'ing_cor': np.round(rng.lognormal(9, 1, n), -2),
+        'factor': rng.integers(0, 300, n).astype(float)
+    })
+    df.loc[rng.random(n) < 0.02, 'municipio'] = np.nan
+    df.loc[rng.random(n) < 0.02, 'ing_cor'] = np.nan
+    df.loc[rng.random(n) < 0.05, 'ing_cor'] = 0
+    return df
+
+def test_levels_share_one_income_sort_with_the_same_results():
+    df = households()
+    levels = [['year'], ['year', 'entidad'], ['year', 'entidad', 'municipio']]
+    results = inequality.inequality_metrics_by_level(df, levels, replicates=0)
+
+    for cols, result in zip(levels, results):
+        # Reference: the rows of the level sorted by group and income with lexsort
+        data = df[cols + ['ing_cor', 'factor']].dropna()
+        data = data[data['factor'] > 0]
+        codes = data.groupby(cols, sort=True, observed=True).ngroup().to_numpy()
+        groups = inequality._SortedGroups(codes, data['ing_cor'].to_numpy(), data['factor'].to_numpy())
+        expected = inequality._group_metrics(groups, inequality.INEQUALITY_QUANTILES, inequality.ATKINSON_EPSILONS, 0)
+        pd.testing.assert_frame_equal(result.drop(columns=cols), expected)
+
+def test_bootstrap_theil_uses_the_positive_incomes_like_the_point_estimate():
+    df = households(2000)
+    df = df[df['year'] == 2018].dropna(subset=['ing_cor'])
+    df = df[df['factor'] > 0].sort_values('ing_cor', kind='stable')
+    assert (df['ing_cor'] == 0).any()
+
+    _, theil = inequality._gini_theil(df['ing_cor'].to_numpy()[None, :], df['factor'].to_numpy()[None, :])
+    point = inequality.inequality_metrics(df, ['year'], replicates=0)
+    assert np.isclose(theil[0], point.loc[0, 'theil_t'])
@@ -0,0 +1,49 @@
+import os
+import shutil
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from modules.dataset_modules import data_join_geo as join_geo
+
+@pytest.fixture
+def level(tmp_path, monkeypatch):
+    """State level with its merged results and SHP layer under tmp_path."""
+    inputs = {"merged": str(tmp_path / "resultados_estatales_merged.csv"),
+              "shp": str(tmp_path / "shp_ent_tidy_data.parquet")}
+    monkeypatch.setattr(join_geo, "GEO_LEVELS", {"estatales": inputs})
+    monkeypatch.setattr(join_geo, "processed_data_path_geo", str(tmp_path / "geo"))
+    os.makedirs(tmp_path / "geo")
+    gpd.GeoDataFrame({"cvegeo": ["01", "02"], "nom_geo": ["Aguascalientes", "Baja California"]},
+                     geometry=[shapely.box(0, 0, 1, 1), shapely.box(1, 0, 2, 1)], crs=4326).to_parquet(inputs["shp"])
+    write_merged(inputs, 0.4)
+    return inputs
+
+def write_merged(inputs, gini):
+    pd.DataFrame({"estado": ["Aguascalientes", "Baja California"], "year": 2022,
+                  "gini": [gini, gini + 0.1]}).to_csv(inputs["merged"], index=False)
+
+def gini(year=2022):
+    return join_geo.load_geo_metrics("estatales", year, columns=["cvegeo", "gini"])["gini"].round(2).tolist()
+
+def test_inputs_rolled_back_to_older_files_rebuild_the_layer(level, tmp_path):
+    shutil.copy2(level["merged"], tmp_path / "previous.csv")
+    write_merged(level, 0.3)
+    assert gini() == [0.3, 0.4]
+
+    # A rollback puts back the previous results with their older mtime
+    shutil.copy2(tmp_path / "previous.csv", level["merged"])
+    assert os.path.getmtime(level["merged"]) < os.path.getmtime(join_geo.geo_output_path("estatales", 2022))
+    assert gini() == [0.4, 0.5]
+
+def test_an_output_left_without_its_stamp_is_rebuilt(level):
+    output_path = join_geo.geo_output_path("estatales", 2022)
+    # What an interrupted write used to leave behind
+    with open(output_path, 'wb') as f:
+        f.write(b"PAR1")
+    assert not join_geo.is_up_to_date(output_path, level.values())
+    assert gini() == [0.4, 0.5]
+    assert join_geo.is_up_to_date(output_path, level.values())
+    assert [name for name in os.listdir(os.path.dirname(output_path)) if name.endswith(".tmp")] == []
@@ -0,0 +1,50 @@
+import json
+import logging
+
+import pytest
+
+from modules import logging_config
+
+@pytest.fixture
+def log_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_config, "log_path", lambda name, run_id=None: str(tmp_path / f"{name}.log.jsonl"))
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield tmp_path
+    logging_config.shutdown_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+def read_messages(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)["message"] for line in f]
+
+def test_repeat_filter_drops_repeated_info_but_not_warnings():
+    repeat_filter = logging_config.RepeatFilter(limit=3)
+    logger = logging.getLogger("test_repeat")
+
+    def passes(level, msg):
+        return repeat_filter.filter(logger.makeRecord(logger.name, level, __file__, 0, msg, (1,), None))
+
+    assert [passes(logging.INFO, "row %s") for _ in range(5)] == [True] * 3 + [False] * 2
+    assert all(passes(logging.WARNING, "bad row %s") for _ in range(5))
+    assert all(passes(logging.ERROR, "failed row %s") for _ in range(5))
+
+    repeat_filter.reset()
+    assert passes(logging.INFO, "row %s")
+
+def test_stage_switch_resets_repeat_counts_and_sets_the_level(log_files):
+    logger = logging.getLogger("test_stages")
+    logging_config.setup_logging("first", level="INFO")
+    for i in range(logging_config.LOG_REPEAT_LIMIT + 5):
+        logger.info("row %s", i)
+    logger.debug("hidden")
+
+    logging_config.setup_logging("second", level="DEBUG")
+    assert logging.getLogger().level == logging.DEBUG
+    logger.info("row %s", 0)
+    logger.debug("shown")
+    logging_config.shutdown_logging()
+
+    assert len(read_messages(log_files / "first.log.jsonl")) == logging_config.LOG_REPEAT_LIMIT
+    assert read_messages(log_files / "second.log.jsonl") == ["row 0", "shown"]
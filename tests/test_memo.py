@@ -0,0 +1,68 @@
+import sys
+import logging
+import importlib
+
+import pandas as pd
+
+from modules import memo, instrumentation
+
+MODULE = '''
+FACTOR = {factor}
+
+def helper(df):
+    return df * {scale}
+
+def scaled(df):
+    return helper(df).apply(lambda column: column * FACTOR)
+'''
+
+def load(tmp_path, monkeypatch, factor=2, scale=3):
+    """Import a small module with a memoized function calling a helper, written with the given constants."""
+    (tmp_path / "memo_example.py").write_text(MODULE.format(factor=factor, scale=scale))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.modules.pop("memo_example", None)
+    importlib.invalidate_caches()
+    return importlib.import_module("memo_example")
+
+def key(module, df):
+    return memo.cache_key("scaled", module.scaled, {"df": df})
+
+def test_key_covers_called_helpers_and_constants_read_in_lambdas(tmp_path, monkeypatch):
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    original = key(load(tmp_path, monkeypatch), df)
+
+    assert key(load(tmp_path, monkeypatch), df) == original
+    # The helper's source changed, not the memoized function's
+    assert key(load(tmp_path, monkeypatch, scale=4), df) != original
+    # A constant read only inside the lambda
+    assert key(load(tmp_path, monkeypatch, factor=5), df) != original
+    assert "memo_example.helper" in memo._dependencies(load(tmp_path, monkeypatch).scaled)
+
+def test_memoized_call_reruns_when_a_helper_changes(tmp_path, monkeypatch):
+    cache = memo.DiskCache(str(tmp_path / "cache"))
+    df = pd.DataFrame({"a": [1, 2, 3]})
+
+    first = memo.memoize(cache=cache)(load(tmp_path, monkeypatch).scaled)
+    pd.testing.assert_frame_equal(first(df), df * 6)
+    changed = memo.memoize(cache=cache)(load(tmp_path, monkeypatch, scale=4).scaled)
+    pd.testing.assert_frame_equal(changed(df), df * 8)
+    assert len(cache.entries()) == 2
+
+def test_version_is_part_of_the_key(tmp_path, monkeypatch):
+    module = load(tmp_path, monkeypatch)
+    df = pd.DataFrame({"a": [1]})
+    assert (memo.cache_key("scaled", module.scaled, {"df": df}, version=1)
+            != memo.cache_key("scaled", module.scaled, {"df": df}, version=2))
+
+def test_result_of_a_call_that_logged_an_error_is_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, "save_stage_record", lambda record: None)
+    cache = memo.DiskCache(str(tmp_path / "cache"))
+
+    @memo.memoize(name="partial", cache=cache)
+    def partial(df):
+        logging.getLogger("tests").error("Error computing %s", "a column")
+        return df
+
+    with instrumentation.Stage("stage"):
+        partial(pd.DataFrame({"a": [1]}))
+    assert cache.entries() == []
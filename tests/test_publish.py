@@ -0,0 +1,60 @@
+import os
+import logging
+
+import pytest
+
+from modules import publish, instrumentation
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(publish, "PUBLISH_VERSIONS_PATH", str(tmp_path / "data" / "versions"))
+    return tmp_path
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+def publish_run(run_id, text, path="data/processed/table.csv"):
+    with publish.Publication("stage", run_id=run_id):
+        write(publish.staged(path), text)
+
+def test_writing_a_live_file_in_place_leaves_its_version_intact(workspace):
+    publish_run("run1", "a,b\n1,2\n")
+    version_file = os.path.join(publish.stage_folder("stage"), "run1", "data/processed/table.csv")
+
+    # A notebook or a cleaner function called outside a publication writes the live path directly
+    assert publish.staged("data/processed/table.csv") == "data/processed/table.csv"
+    with open("data/processed/table.csv", 'w') as f:
+        f.write("overwritten\n")
+
+    assert read(version_file) == "a,b\n1,2\n"
+    publish.rollback("stage", "run1")
+    assert read("data/processed/table.csv") == "a,b\n1,2\n"
+
+def test_live_file_keeps_the_size_and_mtime_of_its_version(workspace):
+    publish_run("run1", "a,b\n1,2\n")
+    version_file = os.path.join(publish.stage_folder("stage"), "run1", "data/processed/table.csv")
+    live, kept = os.stat("data/processed/table.csv"), os.stat(version_file)
+    assert (live.st_size, live.st_mtime_ns) == (kept.st_size, kept.st_mtime_ns)
+    assert live.st_ino != kept.st_ino
+
+def test_a_stage_that_logged_an_error_publishes_nothing(workspace, monkeypatch):
+    monkeypatch.setattr(instrumentation, "save_stage_record", lambda record: None)
+    monkeypatch.setattr(instrumentation, "save_manifest", lambda *args: pytest.fail("manifest of a failed stage"))
+    publish_run("run1", "complete\n")
+
+    with instrumentation.Stage("stage") as stage, publish.Publication("stage", run_id="run2"):
+        write(publish.staged("data/processed/table.csv"), "partial\n")
+        # What the loaders and writers do instead of raising
+        logging.getLogger("tests").error("Error loading data from %s", "raw.csv")
+
+    assert stage.status == "failed"
+    assert read("data/processed/table.csv") == "complete\n"
+    assert publish.current_version("stage") == "run1"
+    assert [meta["version"] for meta in publish.list_versions("stage")] == ["run1"]
@@ -0,0 +1,35 @@
+import os
+import shutil
+
+from modules import query_engine
+
+def write_table(data_root, text):
+    path = os.path.join(data_root, query_engine.TABLES["enco_grouped"] + ".csv")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+def test_parquet_copy_is_used_while_its_csv_is_unchanged(tmp_path):
+    write_table(tmp_path, "year,n\n2022,1\n")
+    assert query_engine.materialize_parquet(["enco_grouped"], data_root=tmp_path)
+    assert query_engine.table_source("enco_grouped", tmp_path).startswith("read_parquet(")
+    # Already up to date
+    assert query_engine.materialize_parquet(["enco_grouped"], data_root=tmp_path) == []
+
+def test_csv_rolled_back_behind_its_parquet_copy_is_read_instead(tmp_path):
+    csv_path = write_table(tmp_path, "year,n\n2022,1\n")
+    previous = str(tmp_path / "previous.csv")
+    shutil.copy2(csv_path, previous)
+    write_table(tmp_path, "year,n\n2022,2\n")
+    query_engine.materialize_parquet(["enco_grouped"], data_root=tmp_path)
+
+    # A rollback puts back the older CSV with its older mtime
+    shutil.copy2(previous, csv_path)
+    parquet_path = csv_path[:-len(".csv")] + ".parquet"
+    assert os.path.getmtime(parquet_path) > os.path.getmtime(csv_path)
+
+    with query_engine.connect(tables=["enco_grouped"], data_root=tmp_path) as con:
+        assert query_engine.query("SELECT n FROM enco_grouped", con=con)["n"].tolist() == [1]
+    query_engine.materialize_parquet(["enco_grouped"], data_root=tmp_path)
+    assert query_engine.table_source("enco_grouped", tmp_path).startswith("read_parquet(")
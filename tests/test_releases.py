@@ -0,0 +1,89 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from modules import releases
+
+def stand_in(routes):
+    """Local stand-in of the INEGI file server: {path: (status, content type)}, a 404 for anything else."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            status, content_type = routes.get(self.path, (404, "text/html"))
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", "1024")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def server():
+    routes = {}
+    server = stand_in(routes)
+    server.routes = routes
+    server.base_url = f"http://127.0.0.1:{server.server_port}/{{year}}/{{filename}}.zip"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def url(year, month):
+    return f"/{year}/conjunto_de_datos_enco_{year}_{month}_csv.zip"
+
+def discover(server, tmp_path, discovery_years=(2022,)):
+    return releases.enco_catalog(refresh=True, session=releases.make_session(4), discovery_years=list(discovery_years),
+                                 base_url=server.base_url, path=str(tmp_path / "catalog.json"))
+
+def test_only_zip_files_are_published(server, tmp_path):
+    server.routes[url(2022, "01")] = (200, "application/zip")
+    # An HTML page served with a 200 is not a release
+    server.routes[url(2022, "02")] = (200, "text/html")
+    server.routes[url(2022, "03")] = (410, "text/html")
+
+    catalog = discover(server, tmp_path)
+
+    assert catalog == {2022: {"01": server.base_url.format(year=2022, filename="conjunto_de_datos_enco_2022_01_csv")}}
+    with open(tmp_path / "catalog.json") as f:
+        assert json.load(f)["failed"] == []
+
+def test_failed_probes_fall_back_to_the_configured_name_and_are_not_cached(server, tmp_path):
+    server.routes[url(2022, "01")] = (200, "application/zip")
+    # Still failing after the session's retries
+    server.routes.update({f"/2022/{name}.zip": (503, "text/html") for name in releases.candidate_filenames(2022, "05")})
+
+    catalog = discover(server, tmp_path)
+
+    assert sorted(catalog[2022]) == ["01", "05"]
+    assert catalog[2022]["05"] == server.base_url.format(year=2022, filename="conjunto_de_datos_enco_2022_05_csv")
+    assert not (tmp_path / "catalog.json").exists()
+
+def test_failed_probes_in_an_unconfigured_year_fail_the_discovery(server, tmp_path):
+    server.routes[url(2030, "01")] = (500, "text/html")
+
+    with pytest.raises(RuntimeError, match="2030-01"):
+        discover(server, tmp_path, discovery_years=(2030,))
+    assert not (tmp_path / "catalog.json").exists()
+
+def test_connection_errors_are_not_unpublished_months():
+    # Nothing listens on the port once the server is closed
+    server = stand_in({})
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+
+    with pytest.raises(requests.exceptions.RequestException):
+        releases.probe(releases.make_session(1), f"http://127.0.0.1:{port}/2022/x.zip", timeout=1)
+
+def test_configured_release_follows_the_config_exceptions():
+    assert releases.configured_release(2020, "04") is None
+    assert releases.configured_release(2018, "06")["url"].endswith("/2018/conjunto_de_datos_enco0618_csv.zip")
+    with pytest.raises(KeyError):
+        releases.configured_release(2030, "01")